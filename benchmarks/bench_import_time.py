@@ -0,0 +1,111 @@
+"""
+Measures how long the Streamlit app takes to import its modules in a fresh
+interpreter and fails when startup regresses: either the import takes longer
+than `--max-seconds` or a module of the LLM or PDF stack is imported.
+
+Usage: python benchmarks/bench_import_time.py [--repeat 5] [--max-seconds 1.0]
+"""
+
+import argparse
+import ast
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+SRC_DIR: Path = Path(__file__).parents[1] / "src"
+APP_PATH: Path = SRC_DIR / "streamlit-app.py"
+# Only the analysis worker may import these.
+HEAVY_MODULES: tuple[str, ...] = (
+    "langchain",
+    "langchain_core",
+    "langchain_community",
+    "langsmith",
+    "openai",
+    "pdfplumber",
+)
+
+
+def get_startup_modules() -> list[str]:
+    """
+    Returns the modules of `src/` that the app imports at the top level.
+    """
+    tree: ast.Module = ast.parse(APP_PATH.read_text(encoding="utf-8"))
+    modules: list[str] = []
+    for node in tree.body:
+        if isinstance(node, ast.ImportFrom) and node.module:
+            modules.append(node.module)
+        elif isinstance(node, ast.Import):
+            modules.extend(alias.name for alias in node.names)
+    return [
+        module
+        for module in modules
+        if (SRC_DIR / f"{module.split('.')[0]}.py").exists()
+    ]
+
+
+def measure_import(modules: list[str]) -> tuple[float, dict[str, float], list[str]]:
+    """
+    Imports `modules` in a fresh interpreter. Returns the total time, the
+    cumulative time per module and the heavy modules that were imported.
+    """
+    script: str = (
+        "import sys, time\n"
+        "started = time.perf_counter()\n"
+        f"for module in {modules!r}:\n"
+        "    __import__(module)\n"
+        "print(time.perf_counter() - started)\n"
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-W", "ignore", "-c", script],
+        cwd=SRC_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    total, heavy = result.stdout.splitlines()[-2:]
+    module_times: dict[str, float] = {}
+    # Lines read "import time: self [us] | cumulative | <indented module>";
+    # modules first imported by another module are counted in that one.
+    for line in result.stderr.splitlines():
+        parts: list[str] = line.split("|")
+        if len(parts) == 3 and parts[2][1:] in modules:
+            module_times[parts[2][1:]] = int(parts[1]) / 1_000_000
+    return float(total), module_times, [module for module in heavy.split(",") if module]
+
+
+def main() -> None:
+    argument_parser = argparse.ArgumentParser()
+    argument_parser.add_argument("--repeat", type=int, default=5)
+    argument_parser.add_argument("--max-seconds", type=float, default=1.0)
+    args = argument_parser.parse_args()
+
+    modules: list[str] = get_startup_modules()
+    runs: list[tuple[float, dict[str, float], list[str]]] = [
+        measure_import(modules) for _ in range(args.repeat)
+    ]
+    median: float = statistics.median(total for total, _, _ in runs)
+    _, module_times, heavy_modules = min(runs, key=lambda run: run[0])
+
+    print(f"{'module':>20} {'time [s]':>10}")
+    for module, duration in sorted(
+        module_times.items(), key=lambda item: item[1], reverse=True
+    ):
+        print(f"{module:>20} {duration:>10.3f}")
+    print(f"{'total (median)':>20} {median:>10.3f}")
+
+    failures: list[str] = []
+    if heavy_modules:
+        failures.append(f"the app imports {', '.join(heavy_modules)} at startup")
+    if median > args.max_seconds:
+        failures.append(
+            f"the import took {median:.3f} s, more than {args.max_seconds:.3f} s"
+        )
+    if failures:
+        print(f"Startup regressed: {'; '.join(failures)}.", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+"""
+Runs the PDF extraction, both pipelines, the GAEB import and the XML export on
+a synthetic LV against a local fake chat model, so no OpenRouter key is needed.
+Results are written as JSON and can be compared with an earlier run.
+
+Usage: python benchmarks/bench_pipelines.py [--positions 200] [--compare old.json]
+"""
+
+import argparse
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable
+
+sys.path.insert(0, str(Path(__file__).parents[1] / "src"))
+
+from pydantic import BaseModel, Field  # noqa: E402
+
+from fake_llm import FakeChatModel  # noqa: E402
+from lib import generate_xml_export, read_pdf_content  # noqa: E402
+from llm import set_chat_model_factory  # noqa: E402
+from models import QuotationItems  # noqa: E402
+from pipelines import PipelineV1, PipelineV2  # noqa: E402
+from synthetic_lv import SyntheticLv, generate_lv, write_gaeb  # noqa: E402
+
+RESULTS_DIR: Path = Path(__file__).parent / "results"
+COMPARED_METRICS: list[str] = [
+    "wall_time",
+    "peak_memory_mib",
+    "llm_calls",
+    "prompt_tokens",
+    "completion_tokens",
+]
+
+
+class ItemAccuracy(BaseModel):
+    precision: float = Field(description="Share of returned items that are doors.")
+    recall: float = Field(description="Share of door positions that were returned.")
+    sku_accuracy: float = Field(description="Share of matched items with the SKU.")
+    quantity_accuracy: float = Field(
+        description="Share of matched items with quantity and unit."
+    )
+
+
+class StageResult(BaseModel):
+    name: str
+    wall_time: float = Field(description="Seconds.")
+    peak_memory_mib: float = Field(
+        description="Peak of the Python allocations traced in this process."
+    )
+    llm_calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    item_count: int | None = None
+    accuracy: ItemAccuracy | None = None
+
+
+class BenchmarkRun(BaseModel):
+    started_at: datetime
+    git_commit: str | None
+    settings: dict[str, Any]
+    page_count: int
+    position_count: int
+    door_position_count: int
+    stages: list[StageResult]
+
+
+def score_quotation_items(
+    quotation_items: QuotationItems, lv: SyntheticLv
+) -> ItemAccuracy:
+    expected = {
+        f"LV-POS. {position.ordnungszahl}": position for position in lv.door_positions
+    }
+    found = {item.commission: item for item in quotation_items.items}
+    matched: set[str] = expected.keys() & found.keys()
+    return ItemAccuracy(
+        precision=len(matched) / len(found) if found else 0.0,
+        recall=len(matched) / len(expected) if expected else 1.0,
+        sku_accuracy=(
+            sum(found[key].sku == expected[key].sku for key in matched) / len(matched)
+            if matched
+            else 0.0
+        ),
+        quantity_accuracy=(
+            sum(
+                found[key].quantity == expected[key].quantity
+                and found[key].quantity_unit == expected[key].quantity_unit
+                for key in matched
+            )
+            / len(matched)
+            if matched
+            else 0.0
+        ),
+    )
+
+
+def run_stage(
+    name: str, fake_model: FakeChatModel, function: Callable[[], Any]
+) -> tuple[StageResult, Any]:
+    fake_model.reset_usage()
+    started: float = time.perf_counter()
+    output: Any = function()
+    wall_time: float = time.perf_counter() - started
+    usage: dict[str, int] = fake_model.reset_usage()
+
+    # Tracing allocations slows the stage down, so memory is measured in a
+    # second run. It only covers this process, not the spawned PDF workers.
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    fake_model.reset_usage()
+
+    stage_result: StageResult = StageResult(
+        name=name, wall_time=wall_time, peak_memory_mib=peak / 2**20, **usage
+    )
+    print(
+        f"{name:20} {wall_time:8.2f} s {stage_result.peak_memory_mib:8.1f} MiB"
+        f" {stage_result.llm_calls:4} calls {stage_result.prompt_tokens:8} prompt"
+        f" {stage_result.completion_tokens:8} completion tokens",
+        file=sys.stderr,
+    )
+    return stage_result, output
+
+
+def get_git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_comparison(baseline: BenchmarkRun, run: BenchmarkRun) -> None:
+    baseline_stages: dict[str, StageResult] = {
+        stage.name: stage for stage in baseline.stages
+    }
+    print(f"\nCompared with {baseline.git_commit} ({baseline.started_at}):")
+    for stage in run.stages:
+        baseline_stage: StageResult | None = baseline_stages.get(stage.name)
+        if baseline_stage is None:
+            continue
+        changes: list[str] = []
+        for metric in COMPARED_METRICS:
+            old, new = getattr(baseline_stage, metric), getattr(stage, metric)
+            if old:
+                changes.append(f"{metric} {100 * (new - old) / old:+.1f}%")
+        if stage.accuracy and baseline_stage.accuracy:
+            changes.append(
+                f"recall {stage.accuracy.recall - baseline_stage.accuracy.recall:+.3f}"
+            )
+        print(f"{stage.name:20} " + ", ".join(changes))
+
+
+def main() -> None:
+    argument_parser = argparse.ArgumentParser()
+    argument_parser.add_argument("--positions", type=int, default=200)
+    argument_parser.add_argument("--header-lines", type=int, default=3)
+    argument_parser.add_argument("--footer-lines", type=int, default=2)
+    argument_parser.add_argument("--seed", type=int, default=0)
+    argument_parser.add_argument(
+        "--latency", type=float, default=0.5, help="Seconds per fake LLM request."
+    )
+    argument_parser.add_argument("--output", type=Path)
+    argument_parser.add_argument(
+        "--compare", type=Path, help="An earlier result file to compare with."
+    )
+    args = argument_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temporary_dir:
+        pdf_path: Path = Path(temporary_dir) / "lv.pdf"
+        lv: SyntheticLv = generate_lv(
+            pdf_path,
+            position_count=args.positions,
+            header_lines=args.header_lines,
+            footer_lines=args.footer_lines,
+            seed=args.seed,
+        )
+        gaeb_path: Path = Path(temporary_dir) / "lv.x83"
+        write_gaeb(lv, gaeb_path)
+        fake_model: FakeChatModel = FakeChatModel(
+            positions={position.ordnungszahl: position for position in lv.positions},
+            latency=args.latency,
+        )
+        set_chat_model_factory(lambda openrouter_api_key, model: fake_model)
+
+        stages: list[StageResult] = []
+        stage, pdf_content = run_stage(
+            "pdf_extraction", fake_model, lambda: read_pdf_content(pdf_path)
+        )
+        stages.append(stage)
+
+        quotation_items: QuotationItems | None = None
+        for name, extract in [
+            (
+                "pipeline_v1",
+                lambda: PipelineV1.extract_quotation_items_from_pdf(
+                    pdf_content.text, "offline"
+                ),
+            ),
+            (
+                "pipeline_v2",
+                lambda: PipelineV2.extract_quotation_items_from_pdf(
+                    pdf_content.text,
+                    "offline",
+                    quantity_lines=pdf_content.quantity_lines,
+                ),
+            ),
+            (
+                "pipeline_v2_chunked",
+                lambda: PipelineV2.extract_quotation_items_from_pdf(
+                    pdf_content.text,
+                    "offline",
+                    chunked=True,
+                    quantity_lines=pdf_content.quantity_lines,
+                ),
+            ),
+            (
+                "pipeline_v2_gaeb",
+                lambda: PipelineV2.extract_quotation_items_from_gaeb(
+                    gaeb_path, "offline"
+                ),
+            ),
+        ]:
+            stage, quotation_items = run_stage(name, fake_model, extract)
+            stage.item_count = len(quotation_items.items)
+            stage.accuracy = score_quotation_items(quotation_items, lv)
+            stages.append(stage)
+
+        stage, _ = run_stage(
+            "xml_export",
+            fake_model,
+            lambda: generate_xml_export(quotation_items=quotation_items),
+        )
+        stages.append(stage)
+
+    run: BenchmarkRun = BenchmarkRun(
+        started_at=datetime.now(),
+        git_commit=get_git_commit(),
+        settings=vars(args) | {"output": None, "compare": None},
+        page_count=lv.page_count,
+        position_count=len(lv.positions),
+        door_position_count=len(lv.door_positions),
+        stages=stages,
+    )
+    output_path: Path = args.output or (
+        RESULTS_DIR / f"{run.started_at.strftime('%Y-%m-%d-%H-%M-%S')}.json"
+    )
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    output_path.write_text(run.model_dump_json(indent=2), encoding="utf-8")
+    print(f"Results written to {output_path}", file=sys.stderr)
+
+    for stage in stages:
+        if stage.accuracy is not None:
+            print(
+                f"{stage.name:20} recall {stage.accuracy.recall:.3f}"
+                f" precision {stage.accuracy.precision:.3f}"
+                f" sku {stage.accuracy.sku_accuracy:.3f}"
+                f" quantity {stage.accuracy.quantity_accuracy:.3f}"
+            )
+    if args.compare:
+        print_comparison(
+            BenchmarkRun.model_validate_json(args.compare.read_text(encoding="utf-8")),
+            run,
+        )
+
+
+if __name__ == "__main__":
+    main()
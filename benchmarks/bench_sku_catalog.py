@@ -0,0 +1,110 @@
+"""
+Measures how long the SKU catalog takes to look up all positions of a
+synthetic LV and how many of them it assigns correctly.
+
+Usage: python benchmarks/bench_sku_catalog.py [--positions 1000 5000] [--entries 2000]
+       [--unique]
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parents[1] / "src"))
+
+from catalog import CatalogEntry, CatalogMatch, SkuCatalog  # noqa: E402
+from catalog import normalize_catalog_text  # noqa: E402
+from prefilter import SKU_KEYWORDS, SKU_NAMES  # noqa: E402
+from synthetic_lv import SyntheticLv, generate_lv  # noqa: E402
+
+
+def to_letters(number: int) -> str:
+    return "".join(chr(ord("a") + int(digit)) for digit in str(number))
+
+
+def build_catalog(lv: SyntheticLv, entry_count: int) -> SkuCatalog:
+    """
+    Confirms the first position of each template and pads the catalog with
+    distinct entries, as a catalog collected over many tenders would be.
+    """
+    catalog: SkuCatalog = SkuCatalog.from_keywords(SKU_KEYWORDS, SKU_NAMES)
+    confirmed: dict[str, CatalogEntry] = {}
+    for position in lv.door_positions:
+        confirmed.setdefault(
+            position.beschreibung.split("\n", 1)[0],
+            CatalogEntry(
+                text=normalize_catalog_text(position.beschreibung),
+                sku=position.sku,
+                name=position.beschreibung.split("\n", 1)[0],
+                is_door_product_confidence=0.95,
+            ),
+        )
+    catalog.add(confirmed.values())
+    # Digits are normalized away, so the padding entries differ in letters.
+    variants: list[str] = [
+        to_letters(i) for i in range(max(0, entry_count - len(catalog)))
+    ]
+    catalog.add(
+        CatalogEntry(
+            text=normalize_catalog_text(
+                f"Sonderelement {variant} Ausführung nach Plan {variant}"
+            ),
+            sku="620001",
+            name=f"Sonderelement {variant}",
+            is_door_product_confidence=0.9,
+        )
+        for variant in variants
+    )
+    return catalog
+
+
+def main() -> None:
+    argument_parser = argparse.ArgumentParser()
+    argument_parser.add_argument(
+        "--positions", type=int, nargs="+", default=[1_000, 5_000]
+    )
+    argument_parser.add_argument("--entries", type=int, default=2_000)
+    argument_parser.add_argument(
+        "--unique",
+        action="store_true",
+        help="Makes every position text distinct, so no lookup can be reused.",
+    )
+    args = argument_parser.parse_args()
+
+    print(
+        f"{'positions':>9} {'entries':>8} {'time [s]':>9} {'matched':>8} {'correct':>8}"
+    )
+    with tempfile.TemporaryDirectory() as temporary_dir:
+        for position_count in args.positions:
+            lv: SyntheticLv = generate_lv(
+                Path(temporary_dir) / "lv.pdf", position_count=position_count
+            )
+            catalog: SkuCatalog = build_catalog(lv, args.entries)
+            texts: list[str] = [
+                (
+                    f"{position.beschreibung} {to_letters(i)}"
+                    if args.unique
+                    else position.beschreibung
+                )
+                for i, position in enumerate(lv.positions)
+            ]
+            catalog.match(texts[:1])
+
+            started: float = time.perf_counter()
+            matches: list[CatalogMatch | None] = catalog.match(texts)
+            duration: float = time.perf_counter() - started
+            matched: int = sum(match is not None for match in matches)
+            correct: int = sum(
+                match is not None and match.entry.sku == position.sku
+                for position, match in zip(lv.positions, matches)
+            )
+            print(
+                f"{position_count:>9} {len(catalog):>8} {duration:>9.3f}"
+                f" {matched:>8} {correct:>8}"
+            )
+
+
+if __name__ == "__main__":
+    main()
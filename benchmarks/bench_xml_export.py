@@ -0,0 +1,112 @@
+"""
+Compares the streaming XML export with the former ElementTree + minidom
+implementation.
+
+Usage: python benchmarks/bench_xml_export.py [--sizes 1000 50000]
+"""
+
+import argparse
+import io
+import sys
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import Callable
+from xml.dom import minidom
+
+sys.path.insert(0, str(Path(__file__).parents[1] / "src"))
+
+from lib import XmlOrder, write_xml_order  # noqa: E402
+from models import QuotationItem, QuotationItems  # noqa: E402
+
+
+def legacy_generate_xml_export(
+    quotation_items: QuotationItems,
+    customer_id: str = "102736",
+    commission: str = "Cerdia Leitwarte",
+    type: str = "A",
+    shipping_condition_id: int = 2,
+) -> bytes:
+    order = ET.Element("order")
+    ET.SubElement(order, "customerId").text = str(customer_id)
+    ET.SubElement(order, "commission").text = commission
+    ET.SubElement(order, "type").text = type
+    ET.SubElement(order, "shippingConditionId").text = str(shipping_condition_id)
+
+    items = ET.SubElement(order, "items")
+    for quotation_item in quotation_items.items:
+        item = ET.SubElement(items, "item")
+        ET.SubElement(item, "sku").text = quotation_item.sku
+        ET.SubElement(item, "name").text = quotation_item.name
+        ET.SubElement(item, "text").text = quotation_item.text
+        ET.SubElement(item, "quantity").text = str(quotation_item.quantity)
+        ET.SubElement(item, "quantityUnit").text = quotation_item.quantity_unit
+        ET.SubElement(item, "price").text = "695.00"
+        ET.SubElement(item, "priceUnit").text = "€"
+        ET.SubElement(item, "purchasePrice").text = ""
+        ET.SubElement(item, "commission").text = quotation_item.commission
+
+    xml_bytes: bytes = ET.tostring(order, encoding="utf-8")
+    return minidom.parseString(xml_bytes).toprettyxml(indent="   ", encoding="utf-8")
+
+
+def streaming_generate_xml_export(quotation_items: QuotationItems) -> bytes:
+    output: io.BytesIO = io.BytesIO()
+    write_xml_order(output, XmlOrder(quotation_items=quotation_items))
+    return output.getvalue()
+
+
+def make_quotation_items(count: int) -> QuotationItems:
+    return QuotationItems(
+        items=[
+            QuotationItem(
+                sku="620001" if i % 3 else "670001",
+                name=f"Bürotür mit Stahl-U-Zarge (0,{76 + i % 20} x 2,135 m)",
+                text="Hörmann Stahlfutterzarge VarioFix<br/>- Drückerhöhe 1050 mm"
+                "<br/>- Türstärke ca. 40,7 mm & Dichtung",
+                quantity=1 + i % 5,
+                quantity_unit="Stk",
+                commission=f"LV-POS. {i // 100 + 1}.{i % 100 + 1}.10",
+                is_door_product_confidence=0.95,
+            )
+            for i in range(count)
+        ]
+    )
+
+
+def measure(
+    export: Callable[[QuotationItems], bytes], quotation_items: QuotationItems
+) -> tuple[float, float]:
+    started: float = time.perf_counter()
+    export(quotation_items)
+    duration: float = time.perf_counter() - started
+
+    # Tracing allocations slows the export down, so it runs separately.
+    tracemalloc.start()
+    export(quotation_items)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return duration, peak / 2**20
+
+
+def main() -> None:
+    argument_parser = argparse.ArgumentParser()
+    argument_parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1_000, 50_000]
+    )
+    args = argument_parser.parse_args()
+
+    print(f"{'items':>8} {'exporter':>10} {'time [s]':>10} {'peak [MiB]':>11}")
+    for size in args.sizes:
+        quotation_items: QuotationItems = make_quotation_items(size)
+        for name, export in [
+            ("legacy", legacy_generate_xml_export),
+            ("streaming", streaming_generate_xml_export),
+        ]:
+            duration, peak = measure(export, quotation_items)
+            print(f"{size:>8} {name:>10} {duration:>10.3f} {peak:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+A local stand-in for the OpenRouter chat models that answers with canned
+outputs derived from the ground truth of a synthetic LV.
+"""
+
+import asyncio
+import json
+import re
+import threading
+import time
+from typing import Any
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import Field, PrivateAttr
+
+from synthetic_lv import SyntheticPosition
+from tokens import estimate_tokens
+
+ORDNUNGSZAHL_PATTERN: re.Pattern = re.compile(r"^\s*(\d+\.\d+\.\d+)\s", re.MULTILINE)
+EXTRACTED_ORDNUNGSZAHL_PATTERN: re.Pattern = re.compile(r'"ordnungszahl":\s*"([^"]+)"')
+
+
+class FakeChatModel(BaseChatModel):
+    positions: dict[str, SyntheticPosition] = Field(
+        description="The ground truth positions by Ordnungszahl."
+    )
+    latency: float = Field(default=0.5, description="Seconds per request.")
+    stream_chunk_chars: int = Field(default=40)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _calls: int = PrivateAttr(default=0)
+    _prompt_tokens: int = PrivateAttr(default=0)
+    _completion_tokens: int = PrivateAttr(default=0)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def reset_usage(self) -> dict[str, int]:
+        """
+        Returns the calls and tokens counted since the last reset.
+        """
+        with self._lock:
+            usage: dict[str, int] = {
+                "llm_calls": self._calls,
+                "prompt_tokens": self._prompt_tokens,
+                "completion_tokens": self._completion_tokens,
+            }
+            self._calls = self._prompt_tokens = self._completion_tokens = 0
+        return usage
+
+    def _to_quotation_item(self, position: SyntheticPosition) -> dict[str, Any]:
+        return {
+            "sku": position.sku,
+            "name": position.beschreibung.split("\n", 1)[0],
+            "text": position.beschreibung.replace("\n", "<br/>"),
+            "quantity": position.quantity,
+            "quantity_unit": position.quantity_unit,
+            "commission": f"LV-POS. {position.ordnungszahl}",
+            "is_door_product_confidence": 0.9,
+        }
+
+    def _respond(self, messages: list[BaseMessage]) -> str:
+        prompt: str = "\n".join(str(message.content) for message in messages)
+        if "Extraktion von Daten" in prompt:
+            return json.dumps(
+                [
+                    {
+                        "ordnungszahl": position.ordnungszahl,
+                        "beschreibung": position.beschreibung,
+                    }
+                    for position in self._find_positions(ORDNUNGSZAHL_PATTERN, prompt)
+                ],
+                ensure_ascii=False,
+            )
+
+        # The categorization prompt lists extracted positions, the prompt of
+        # PipelineV1 contains the raw document.
+        pattern: re.Pattern = (
+            EXTRACTED_ORDNUNGSZAHL_PATTERN
+            if "türbezogene Bauleistungen" in prompt
+            else ORDNUNGSZAHL_PATTERN
+        )
+        return json.dumps(
+            {
+                "items": [
+                    self._to_quotation_item(position)
+                    for position in self._find_positions(pattern, prompt)
+                    if position.sku is not None
+                ]
+            },
+            ensure_ascii=False,
+        )
+
+    def _find_positions(
+        self, pattern: re.Pattern, prompt: str
+    ) -> list[SyntheticPosition]:
+        return [
+            self.positions[ordnungszahl]
+            for ordnungszahl in dict.fromkeys(pattern.findall(prompt))
+            if ordnungszahl in self.positions
+        ]
+
+    def _record_usage(self, messages: list[BaseMessage], output: str) -> None:
+        with self._lock:
+            self._calls += 1
+            self._prompt_tokens += sum(
+                estimate_tokens(str(message.content)) for message in messages
+            )
+            self._completion_tokens += estimate_tokens(output)
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        time.sleep(self.latency)
+        output: str = self._respond(messages)
+        self._record_usage(messages, output)
+        return ChatResult(
+            generations=[ChatGeneration(message=AIMessage(content=output))]
+        )
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        output: str = self._respond(messages)
+        self._record_usage(messages, output)
+        return ChatResult(
+            generations=[ChatGeneration(message=AIMessage(content=output))]
+        )
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ):
+        output: str = self._respond(messages)
+        self._record_usage(messages, output)
+        chunk_count: int = max(1, -(-len(output) // self.stream_chunk_chars))
+        for start in range(0, len(output), self.stream_chunk_chars):
+            await asyncio.sleep(self.latency / chunk_count)
+            yield ChatGenerationChunk(
+                message=AIMessageChunk(
+                    content=output[start : start + self.stream_chunk_chars]
+                )
+            )
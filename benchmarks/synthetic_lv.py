@@ -0,0 +1,335 @@
+"""
+Generates synthetic German service specification (LV) PDFs together with the
+quotation items that are expected to be extracted from them.
+"""
+
+import random
+from contextlib import ExitStack
+from itertools import groupby
+from pathlib import Path
+
+from lxml import etree
+from pydantic import BaseModel, Field
+
+PAGE_WIDTH: int = 595
+PAGE_HEIGHT: int = 842
+LINE_HEIGHT: int = 14
+TOP_MARGIN: int = 60
+BOTTOM_MARGIN: int = 50
+
+HEADER_LINES: list[str] = [
+    "SF BAU MOSER GmbH & Co. KG",
+    "Industriestraße 12, 79108 Freiburg, Tel. 0761 123456",
+    "Projekt: Neubau Bürogebäude Cerdia Leitwarte",
+    "LV 2025-017 Innentüren",
+    "Los 3 - Ausbau",
+]
+GAEB_NAMESPACE: str = "http://www.gaeb.de/GAEB_DA_XML/DA83/3.2"
+COLUMN_HEADING: str = (
+    "Ordnungszahl Leistungsbeschreibung Menge ME Einheitspreis Gesamtbetrag"
+)
+
+# (chapter title, [(first line, detail lines, expected SKU, unit)])
+CHAPTERS: list[tuple[str, list[tuple[str, list[str], str | None, str]]]] = [
+    (
+        "Holztüren mit Stahl-U-Zarge",
+        [
+            (
+                "Bürotür mit Stahl-U-Zarge",
+                [
+                    "Holztürblatt mit HPL-Beschichtung, Stahlzarge verzinkt",
+                    "Drückerhöhe 1050 mm, Meterrissmarkierung",
+                ],
+                "620001",
+                "Stk",
+            ),
+            (
+                "Holztür Nassraum",
+                ["Holztürblatt Spanplatte, feuchtraumgeeignet"],
+                "620001",
+                "Stk",
+            ),
+        ],
+    ),
+    (
+        "Stahltüren",
+        [
+            (
+                "Feuerschutztür T30 einflügelig",
+                ["Stahlzarge als Eckzarge, Türblatt aus Stahlblech"],
+                "670001",
+                "Stk",
+            ),
+            (
+                "Stahltür Technikraum",
+                ["Stahlrahmen mit Stahl-U-Profil, pulverbeschichtet"],
+                "670001",
+                "Stk",
+            ),
+        ],
+    ),
+    (
+        "Türzubehör",
+        [
+            (
+                "Drückergarnitur Edelstahl",
+                ["Türgriff mit Rosette, für Tür nach Pos. 1.1"],
+                "240001",
+                "Stk",
+            ),
+            (
+                "Einsteckschloss für Tür",
+                ["Profilzylinder vorgerichtet, Dornmaß 55 mm"],
+                "360001",
+                "Stk",
+            ),
+            (
+                "Obentürschließer",
+                ["Türschließer mit Gleitschiene, GEZE TS 5000"],
+                "290001",
+                "Stk",
+            ),
+        ],
+    ),
+    (
+        "Sonstige Leistungen",
+        [
+            (
+                "Montage von Türen",
+                ["Montage von Türen inkl. Befestigungsmaterial"],
+                "DL8110016",
+                "Std",
+            ),
+            (
+                "Fenster Kunststoff",
+                ["Fenster mit Dreh-Kipp-Beschlag, Uw 1,1"],
+                None,
+                "Stk",
+            ),
+            (
+                "Trockenbauwand",
+                ["Wand aus Gipskarton, beidseitig beplankt"],
+                None,
+                "m2",
+            ),
+            ("Stundenlohnarbeiten", ["Stundenlohn Facharbeiter"], None, "Std"),
+        ],
+    ),
+]
+
+
+class SyntheticPosition(BaseModel):
+    ordnungszahl: str
+    beschreibung: str
+    quantity: int
+    quantity_unit: str
+    sku: str | None = Field(
+        description="The expected SKU, or None if the position isn't door-related."
+    )
+
+
+class SyntheticLv(BaseModel):
+    positions: list[SyntheticPosition]
+    page_count: int
+
+    @property
+    def door_positions(self) -> list[SyntheticPosition]:
+        return [position for position in self.positions if position.sku is not None]
+
+
+def _escape_pdf_text(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(pages: list[list[str]], path: Path) -> None:
+    """
+    Writes a minimal PDF with one text line per entry of each page.
+    """
+    objects: list[bytes] = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica"
+        b" /Encoding /WinAnsiEncoding >>",
+    ]
+    page_ids: list[int] = []
+    for lines in pages:
+        operations: list[str] = ["BT /F1 10 Tf"]
+        for i, line in enumerate(lines):
+            operations.append(
+                f"1 0 0 1 50 {PAGE_HEIGHT - 42 - i * LINE_HEIGHT} Tm"
+                f" ({_escape_pdf_text(line)}) Tj"
+            )
+        operations.append("ET")
+        stream: bytes = "\n".join(operations).encode("cp1252")
+        objects.append(
+            b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream)
+        )
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d]"
+            b" /Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>"
+            % (PAGE_WIDTH, PAGE_HEIGHT, len(objects))
+        )
+        page_ids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % page_id for page_id in page_ids),
+        len(page_ids),
+    )
+
+    content: bytearray = bytearray(b"%PDF-1.4\n")
+    offsets: list[int] = []
+    for i, pdf_object in enumerate(objects, start=1):
+        offsets.append(len(content))
+        content += b"%d 0 obj\n%s\nendobj\n" % (i, pdf_object)
+    xref_offset: int = len(content)
+    content += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        content += b"%010d 00000 n \n" % offset
+    content += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1,
+        xref_offset,
+    )
+    path.write_bytes(bytes(content))
+
+
+def generate_lv(
+    path: Path,
+    position_count: int = 200,
+    header_lines: int = 3,
+    footer_lines: int = 2,
+    seed: int = 0,
+) -> SyntheticLv:
+    """
+    Writes an LV with `position_count` positions spread over the chapters of
+    `CHAPTERS` to `path`. Every page repeats `header_lines` header lines, the
+    column heading and `footer_lines` footer lines.
+    """
+    rng: random.Random = random.Random(seed)
+    per_chapter: int = max(1, position_count // len(CHAPTERS))
+
+    body: list[str] = ["1. Innentüren und Zubehör"]
+    positions: list[SyntheticPosition] = []
+    for chapter_number, (chapter_title, templates) in enumerate(CHAPTERS, start=1):
+        remaining: int = position_count - len(positions)
+        if remaining <= 0:
+            break
+        body.append(f"1.{chapter_number}. {chapter_title}")
+        count: int = (
+            remaining
+            if chapter_number == len(CHAPTERS)
+            else min(per_chapter, remaining)
+        )
+        first_ordnungszahl: str | None = None
+        for i in range(count):
+            first_line, detail_lines, sku, unit = templates[i % len(templates)]
+            ordnungszahl: str = f"1.{chapter_number}.{(i + 1) * 10}"
+            width: str = f"{rng.choice([0.76, 0.885, 1.01, 1.135]):.3f}".replace(
+                ".", ","
+            )
+            if first_ordnungszahl is not None and i % len(templates) == 0 and i % 3:
+                detail_lines = [
+                    f"Wie Pos. {first_ordnungszahl}, jedoch b = {width} m",
+                    *detail_lines[1:],
+                ]
+            description_lines: list[str] = [
+                first_line,
+                *detail_lines,
+                f"RBLM b/h = {width} x 2,135 m",
+            ]
+            quantity: int = rng.randint(1, 12)
+            body.append(f"{ordnungszahl} {description_lines[0]}")
+            body.extend(description_lines[1:])
+            body.append(
+                f"{quantity},000 {unit} ......................... "
+                "........................."
+            )
+            positions.append(
+                SyntheticPosition(
+                    ordnungszahl=ordnungszahl,
+                    beschreibung="\n".join(description_lines),
+                    quantity=quantity,
+                    quantity_unit=unit,
+                    sku=sku,
+                )
+            )
+            first_ordnungszahl = first_ordnungszahl or ordnungszahl
+        body.append(f"Summe 1.{chapter_number}. {chapter_title}")
+
+    lines_per_page: int = (PAGE_HEIGHT - TOP_MARGIN - BOTTOM_MARGIN) // LINE_HEIGHT - (
+        header_lines + 1 + footer_lines
+    )
+    page_bodies: list[list[str]] = [
+        body[start : start + lines_per_page]
+        for start in range(0, len(body), lines_per_page)
+    ]
+    pages: list[list[str]] = []
+    for page_number, page_body in enumerate(page_bodies, start=1):
+        footer: list[str] = [
+            "Druckdatum: 12.05.2025",
+            f"Seite: {page_number} von {len(page_bodies)}",
+        ]
+        pages.append(
+            HEADER_LINES[:header_lines]
+            + [COLUMN_HEADING]
+            + page_body
+            + footer[:footer_lines]
+        )
+    write_pdf(pages, path)
+    return SyntheticLv(positions=positions, page_count=len(pages))
+
+
+def _gaeb_tag(name: str) -> str:
+    return f"{{{GAEB_NAMESPACE}}}{name}"
+
+
+def _write_gaeb_text(xml_file: etree.xmlfile, tag: str, lines: list[str]) -> None:
+    with xml_file.element(_gaeb_tag(tag)):
+        for line in lines:
+            with xml_file.element(_gaeb_tag("p")):
+                xml_file.write(line)
+
+
+def _write_gaeb_item(xml_file: etree.xmlfile, position: SyntheticPosition) -> None:
+    lines: list[str] = position.beschreibung.split("\n")
+    with xml_file.element(
+        _gaeb_tag("Item"), RNoPart=position.ordnungszahl.split(".")[-1]
+    ):
+        with xml_file.element(_gaeb_tag("Qty")):
+            xml_file.write(f"{position.quantity:.3f}")
+        with xml_file.element(_gaeb_tag("QU")):
+            xml_file.write(position.quantity_unit)
+        with xml_file.element(_gaeb_tag("Description")):
+            with xml_file.element(_gaeb_tag("CompleteText")):
+                with xml_file.element(_gaeb_tag("DetailTxt")):
+                    _write_gaeb_text(xml_file, "Text", lines)
+                with xml_file.element(_gaeb_tag("OutlineText")):
+                    with xml_file.element(_gaeb_tag("OutlTxt")):
+                        _write_gaeb_text(xml_file, "TextOutlTxt", lines[:1])
+
+
+def write_gaeb(lv: SyntheticLv, path: Path) -> None:
+    """
+    Writes the positions of `lv` as a GAEB DA XML file (X83) with the same
+    chapters as the PDF.
+    """
+    chapters = groupby(
+        lv.positions, key=lambda position: position.ordnungszahl.split(".")[1]
+    )
+    with etree.xmlfile(str(path), encoding="utf-8") as xml_file, ExitStack() as stack:
+        xml_file.write_declaration()
+        stack.enter_context(
+            xml_file.element(_gaeb_tag("GAEB"), nsmap={None: GAEB_NAMESPACE})
+        )
+        for tag in ["Award", "BoQ", "BoQBody"]:
+            stack.enter_context(xml_file.element(_gaeb_tag(tag)))
+        with xml_file.element(_gaeb_tag("BoQCtgy"), RNoPart="1"):
+            _write_gaeb_text(xml_file, "LblTx", ["Innentüren und Zubehör"])
+            with xml_file.element(_gaeb_tag("BoQBody")):
+                for chapter_number, chapter_positions in chapters:
+                    with xml_file.element(_gaeb_tag("BoQCtgy"), RNoPart=chapter_number):
+                        _write_gaeb_text(
+                            xml_file, "LblTx", [CHAPTERS[int(chapter_number) - 1][0]]
+                        )
+                        with xml_file.element(_gaeb_tag("BoQBody")):
+                            with xml_file.element(_gaeb_tag("Itemlist")):
+                                for position in chapter_positions:
+                                    _write_gaeb_item(xml_file, position)
@@ -0,0 +1,425 @@
+import argparse
+import asyncio
+import glob
+import os
+import sys
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+from dotenv import load_dotenv
+from pydantic import BaseModel, Field
+
+from cache import CacheStats, ResultCache, content_hash
+from catalog import SkuCatalog
+from checkpoints import CheckpointStore, RunCheckpoint
+from lib import XmlOrder, generate_xml_export, read_pdf_content, write_xml_export
+from llm import LLMRequestLimiter
+from memo import ClassificationMemo
+from models import PdfContent, QuotationItems
+from pipelines import CATEGORIZATION_PROMPT_VERSION, PipelineV2
+from prefilter import SKU_KEYWORDS, SKU_NAMES
+from tokens import RequestPlan, TokenBudget, get_token_budget
+from tracing import Tracer, start_metrics_server
+
+
+class DocumentResult(BaseModel):
+    pdf_path: str = Field(description="The processed PDF.")
+    xml_path: str | None = Field(default=None, description="The written XML export.")
+    item_count: int = Field(default=0, description="Number of quotation items.")
+    duration: float = Field(default=0.0, description="Wall time in seconds.")
+    error: str | None = Field(default=None, description="The error, if it failed.")
+    trace_path: str | None = Field(default=None, description="The written trace.")
+    quotation_items: QuotationItems | None = Field(default=None, exclude=True)
+
+
+class BatchSummary(BaseModel):
+    run_id: str | None = Field(
+        default=None, description="Pass as --run-id to resume the run."
+    )
+    started_at: datetime
+    duration: float
+    customer_id: str
+    succeeded: int
+    failed: int
+    rate_limited_requests: int
+    cache_stats: dict[str, CacheStats] = Field(
+        default_factory=dict, description="Result cache hits and misses per stage."
+    )
+    documents: list[DocumentResult]
+
+
+def collect_pdf_paths(inputs: list[str]) -> list[Path]:
+    pdf_paths: dict[Path, None] = {}
+    for input in inputs:
+        if Path(input).is_dir():
+            matches: list[str] = sorted(
+                str(path) for path in Path(input).rglob("*") if path.is_file()
+            )
+        else:
+            matches = sorted(glob.glob(input, recursive=True))
+        for match in matches:
+            if match.lower().endswith(".pdf"):
+                pdf_paths[Path(match).resolve()] = None
+    return list(pdf_paths)
+
+
+def get_xml_paths(pdf_paths: list[Path], output_dir: Path) -> list[Path]:
+    """
+    Mirrors the PDFs below their common directory in `output_dir`, so PDFs of
+    the same name in different directories don't overwrite each other's XML.
+    """
+    if not pdf_paths:
+        return []
+    common_dir: Path = Path(os.path.commonpath([path.parent for path in pdf_paths]))
+    return [
+        output_dir / pdf_path.relative_to(common_dir).with_suffix(".xml")
+        for pdf_path in pdf_paths
+    ]
+
+
+async def process_pdf(
+    pdf_path: Path,
+    xml_path: Path,
+    customer_id: str,
+    openrouter_api_key: str,
+    limiter: LLMRequestLimiter,
+    document_slots: asyncio.Semaphore,
+    cache: ResultCache | None,
+    chunked: bool,
+    trace_dir: Path | None,
+    catalog: SkuCatalog | None,
+    memo: ClassificationMemo | None,
+    token_budget: TokenBudget | None,
+    checkpoint: RunCheckpoint | None,
+) -> DocumentResult:
+    result: DocumentResult = DocumentResult(pdf_path=str(pdf_path))
+    async with document_slots:
+        started: float = time.perf_counter()
+        tracer: Tracer = Tracer()
+        try:
+            pdf_stat: os.stat_result = pdf_path.stat()
+            pdf_key: str = content_hash(
+                str(pdf_path), str(pdf_stat.st_size), str(pdf_stat.st_mtime_ns)
+            )
+            stored_pdf_content: str | None = (
+                checkpoint.get("pdf", pdf_key) if checkpoint else None
+            )
+            if stored_pdf_content is not None:
+                pdf_content: PdfContent = PdfContent.model_validate_json(
+                    stored_pdf_content
+                )
+            else:
+                pdf_content = await asyncio.to_thread(
+                    read_pdf_content, pdf_path, tracer=tracer
+                )
+                if checkpoint is not None:
+                    checkpoint.set("pdf", pdf_key, pdf_content.model_dump_json())
+            quotation_items: QuotationItems = (
+                await PipelineV2.aextract_quotation_items_from_pdf(
+                    pdf_content.text,
+                    openrouter_api_key,
+                    tracer=tracer,
+                    cache=cache,
+                    chunked=chunked,
+                    limiter=limiter,
+                    catalog=catalog,
+                    memo=memo,
+                    token_budget=token_budget,
+                    checkpoint=checkpoint,
+                    quantity_lines=pdf_content.quantity_lines,
+                )
+            )
+            xml_path.parent.mkdir(parents=True, exist_ok=True)
+            xml_path.write_bytes(
+                generate_xml_export(
+                    quotation_items=quotation_items, customer_id=customer_id
+                )
+            )
+            result.xml_path = str(xml_path)
+            result.item_count = len(quotation_items.items)
+            result.quotation_items = quotation_items
+        except Exception as error:
+            # One broken tender must not abort the rest of the batch.
+            result.error = f"{type(error).__name__}: {error}"
+        result.duration = time.perf_counter() - started
+        if trace_dir is not None:
+            result.trace_path = str(tracer.write_trace(trace_dir))
+    print(
+        f"{'FAILED' if result.error else 'OK':6} {pdf_path.name}"
+        f" ({result.item_count} items, {result.duration:.1f} s)"
+        + (f": {result.error}" if result.error else ""),
+        file=sys.stderr,
+    )
+    return result
+
+
+async def run_batch(
+    pdf_paths: list[Path],
+    output_dir: Path,
+    customer_id: str,
+    openrouter_api_key: str,
+    max_in_flight: int = 4,
+    max_documents: int = 4,
+    cache: ResultCache | None = None,
+    chunked: bool = True,
+    trace_dir: Path | None = None,
+    catalog: SkuCatalog | None = None,
+    memo: ClassificationMemo | None = None,
+    token_budget: TokenBudget | None = None,
+    checkpoint: RunCheckpoint | None = None,
+) -> BatchSummary:
+    started_at: datetime = datetime.now()
+    started: float = time.perf_counter()
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    limiter: LLMRequestLimiter = LLMRequestLimiter(max_in_flight=max_in_flight)
+    document_slots: asyncio.Semaphore = asyncio.Semaphore(max_documents)
+    documents: list[DocumentResult] = await asyncio.gather(
+        *(
+            process_pdf(
+                pdf_path,
+                xml_path,
+                customer_id,
+                openrouter_api_key,
+                limiter,
+                document_slots,
+                cache,
+                chunked,
+                trace_dir,
+                catalog,
+                memo,
+                token_budget,
+                checkpoint,
+            )
+            for pdf_path, xml_path in zip(
+                pdf_paths, get_xml_paths(pdf_paths, output_dir)
+            )
+        )
+    )
+
+    return BatchSummary(
+        run_id=checkpoint.run_id if checkpoint is not None else None,
+        started_at=started_at,
+        duration=time.perf_counter() - started,
+        customer_id=customer_id,
+        succeeded=sum(1 for document in documents if document.error is None),
+        failed=sum(1 for document in documents if document.error is not None),
+        rate_limited_requests=limiter.rate_limited_requests,
+        cache_stats=cache.stats if cache is not None else {},
+        documents=documents,
+    )
+
+
+def print_request_plan(
+    pdf_paths: list[Path], chunked: bool, token_budget: TokenBudget
+) -> None:
+    total: RequestPlan = RequestPlan()
+    for pdf_path in pdf_paths:
+        pdf_content: PdfContent = read_pdf_content(pdf_path)
+        plan: RequestPlan = PipelineV2.plan_requests(
+            pdf_content.text,
+            chunked=chunked,
+            token_budget=token_budget,
+            quantity_lines=pdf_content.quantity_lines,
+        )
+        total += plan
+        print(
+            f"{pdf_path.name}: up to {plan.calls} LLM calls, ~{plan.input_tokens}"
+            f" prompt and ~{plan.output_tokens} completion tokens, ~${plan.cost:.2f}"
+        )
+    print(
+        f"Total: up to {total.calls} LLM calls, ~{total.input_tokens} prompt and"
+        f" ~{total.output_tokens} completion tokens, ~${total.cost:.2f}"
+    )
+
+
+def main() -> int:
+    argument_parser = argparse.ArgumentParser(
+        description="Extracts quotation items from service specification PDFs"
+        " without the Streamlit UI and writes one XML export per PDF."
+    )
+    argument_parser.add_argument(
+        "inputs", nargs="+", help="PDF files, directories or glob patterns."
+    )
+    argument_parser.add_argument("--customer-id", required=True)
+    argument_parser.add_argument("--output-dir", type=Path, default=Path("output"))
+    argument_parser.add_argument(
+        "--max-in-flight",
+        type=int,
+        default=4,
+        help="Maximum number of concurrent LLM requests across all PDFs.",
+    )
+    argument_parser.add_argument(
+        "--max-documents",
+        type=int,
+        default=4,
+        help="Maximum number of PDFs processed at the same time.",
+    )
+    argument_parser.add_argument(
+        "--cache-dir",
+        type=Path,
+        default=Path(__file__).parents[1] / ".cache" / "results",
+    )
+    argument_parser.add_argument("--no-cache", action="store_true")
+    argument_parser.add_argument(
+        "--combined-xml",
+        type=Path,
+        help="Additionally writes the orders of all PDFs into this XML file.",
+    )
+    argument_parser.add_argument(
+        "--no-chunking",
+        action="store_true",
+        help="Send each document in a single request instead of chunks.",
+    )
+    argument_parser.add_argument(
+        "--trace-dir",
+        type=Path,
+        help="Writes a JSON trace of the stages of each PDF to this directory.",
+    )
+    argument_parser.add_argument(
+        "--sku-catalog",
+        type=Path,
+        help="Assigns SKUs of positions similar to the corrected items saved in"
+        " this catalog (e.g. .cache/sku_catalog.jsonl) without an LLM call.",
+    )
+    argument_parser.add_argument(
+        "--classification-memo",
+        type=Path,
+        help="Reuses and extends the categorizations saved in this SQLite file"
+        " (e.g. .cache/classification_memo.sqlite3) across documents and runs.",
+    )
+    argument_parser.add_argument(
+        "--max-input-tokens",
+        type=int,
+        help="Prompt tokens per LLM request, by default the budget of the model.",
+    )
+    argument_parser.add_argument(
+        "--max-output-tokens",
+        type=int,
+        help="Completion tokens per LLM request, by default the budget of the model.",
+    )
+    argument_parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Only prints the planned LLM calls and their estimated cost.",
+    )
+    argument_parser.add_argument(
+        "--checkpoint-dir",
+        type=Path,
+        default=Path(__file__).parents[1] / ".cache" / "runs",
+    )
+    argument_parser.add_argument(
+        "--run-id",
+        help="Resumes this earlier run. The LLM calls it finished are not repeated.",
+    )
+    argument_parser.add_argument(
+        "--metrics-port",
+        type=int,
+        help="Serves Prometheus metrics at http://127.0.0.1:<port>/metrics.",
+    )
+    args = argument_parser.parse_args()
+
+    pdf_paths: list[Path] = collect_pdf_paths(args.inputs)
+    if not pdf_paths:
+        argument_parser.error("No PDF files found")
+    token_budget: TokenBudget = get_token_budget(PipelineV2.MODEL).model_copy(
+        update={
+            name: value
+            for name, value in [
+                ("max_input_tokens", args.max_input_tokens),
+                ("max_output_tokens", args.max_output_tokens),
+            ]
+            if value is not None
+        }
+    )
+    if args.dry_run:
+        print_request_plan(pdf_paths, not args.no_chunking, token_budget)
+        return 0
+
+    load_dotenv(Path(__file__).parent / ".env")
+    openrouter_api_key: str | None = os.getenv("OPENROUTER_API_KEY")
+    if not openrouter_api_key:
+        argument_parser.error("OPENROUTER_API_KEY is not set")
+    if args.metrics_port is not None:
+        start_metrics_server(args.metrics_port)
+    catalog: SkuCatalog | None = None
+    if args.sku_catalog is not None:
+        catalog = SkuCatalog.from_keywords(SKU_KEYWORDS, SKU_NAMES)
+        catalog.load(args.sku_catalog)
+    memo: ClassificationMemo | None = (
+        ClassificationMemo(args.classification_memo, CATEGORIZATION_PROMPT_VERSION)
+        if args.classification_memo is not None
+        else None
+    )
+
+    try:
+        checkpoint: RunCheckpoint = CheckpointStore(args.checkpoint_dir).create(
+            args.run_id or uuid.uuid4().hex, {"inputs": " ".join(args.inputs)}
+        )
+    except ValueError as error:
+        argument_parser.error(str(error))
+    print(f"Run ID: {checkpoint.run_id}", file=sys.stderr)
+
+    summary: BatchSummary = asyncio.run(
+        run_batch(
+            pdf_paths,
+            output_dir=args.output_dir,
+            customer_id=args.customer_id,
+            openrouter_api_key=openrouter_api_key,
+            max_in_flight=args.max_in_flight,
+            max_documents=args.max_documents,
+            cache=None if args.no_cache else ResultCache(args.cache_dir),
+            chunked=not args.no_chunking,
+            trace_dir=args.trace_dir,
+            catalog=catalog,
+            memo=memo,
+            token_budget=token_budget,
+            checkpoint=checkpoint,
+        )
+    )
+    if summary.failed:
+        checkpoint.mark_failed(f"{summary.failed} of {len(pdf_paths)} PDFs failed")
+    else:
+        checkpoint.mark_done()
+
+    if args.combined_xml:
+        write_xml_export(
+            args.combined_xml,
+            (
+                XmlOrder(
+                    quotation_items=document.quotation_items,
+                    customer_id=args.customer_id,
+                )
+                for document in summary.documents
+                if document.quotation_items is not None
+            ),
+        )
+
+    summary_path: Path = (
+        args.output_dir
+        / f"{summary.started_at.strftime('%Y-%m-%d-%H-%M-%S')}-summary.json"
+    )
+    summary_path.write_text(summary.model_dump_json(indent=2), encoding="utf-8")
+    print(
+        f"Processed {len(pdf_paths)} PDFs ({summary.failed} failed) in"
+        f" {summary.duration:.1f} s, summary written to {summary_path}",
+        file=sys.stderr,
+    )
+    for stage, stats in sorted(summary.cache_stats.items()):
+        print(
+            f"Result cache {stage}: {stats.hits} hits, {stats.misses} misses"
+            f" ({stats.hit_rate:.0%} hit rate)",
+            file=sys.stderr,
+        )
+    if summary.failed:
+        print(
+            f"Resume the failed PDFs with --run-id {checkpoint.run_id}",
+            file=sys.stderr,
+        )
+    return 1 if summary.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+import hashlib
+import os
+import threading
+from pathlib import Path
+
+from pydantic import BaseModel, Field
+
+from tracing import METRICS
+
+
+def content_hash(*parts: str) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        # Separates the parts so that ("ab", "c") and ("a", "bc") differ.
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class CacheStats(BaseModel):
+    hits: int = Field(default=0, description="Number of lookups answered from cache.")
+    misses: int = Field(default=0, description="Number of lookups not in cache.")
+
+    @property
+    def hit_rate(self) -> float:
+        lookups: int = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class ResultCache:
+    """
+    Disk-backed, size-bounded LRU cache for pipeline stage outputs.
+
+    Entries are grouped by stage (e.g. "extraction", "categorization") so each
+    stage can be keyed by its own prompt and looked up independently. Hits and
+    misses are counted in `stats` and in `bytecook_cache_lookups_total`.
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int = 256 * 1024 * 1024) -> None:
+        self.cache_dir: Path = Path(cache_dir)
+        self.max_bytes: int = max_bytes
+        self.stats: dict[str, CacheStats] = {}
+        self._lock = threading.Lock()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        # Tracks the size written since the last scan, so the directory is only
+        # scanned once the limit may have been exceeded.
+        self._total_bytes: int = 0
+        self.evict()
+
+    def _entry_path(self, stage: str, key: str) -> Path:
+        return self.cache_dir / stage / f"{key}.json"
+
+    def _record(self, stage: str, hit: bool) -> None:
+        with self._lock:
+            stats: CacheStats = self.stats.setdefault(stage, CacheStats())
+            if hit:
+                stats.hits += 1
+            else:
+                stats.misses += 1
+        METRICS.increment(
+            "bytecook_cache_lookups_total",
+            help="Result cache lookups.",
+            stage=stage,
+            result="hit" if hit else "miss",
+        )
+
+    def get(self, stage: str, key: str) -> str | None:
+        entry_path: Path = self._entry_path(stage, key)
+        try:
+            value: str = entry_path.read_text(encoding="utf-8")
+            # The modification time doubles as the LRU access time.
+            os.utime(entry_path)
+        except FileNotFoundError:
+            self._record(stage, hit=False)
+            return None
+        self._record(stage, hit=True)
+        return value
+
+    def set(self, stage: str, key: str, value: str) -> None:
+        entry_path: Path = self._entry_path(stage, key)
+        entry_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path: Path = entry_path.with_suffix(f".{threading.get_ident()}.tmp")
+        tmp_path.write_text(value, encoding="utf-8")
+        written_bytes: int = tmp_path.stat().st_size
+        os.replace(tmp_path, entry_path)
+        with self._lock:
+            self._total_bytes += written_bytes
+            if self._total_bytes <= self.max_bytes:
+                return
+        self.evict()
+
+    def evict(self) -> None:
+        with self._lock:
+            entries: list[tuple[float, int, Path]] = []
+            for entry_path in self.cache_dir.glob("*/*.json"):
+                try:
+                    stat = entry_path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry_path))
+
+            total_bytes: int = sum(size for _, size, _ in entries)
+            # Evicting below the limit leaves room for further entries before
+            # the next scan.
+            target_bytes: int = (
+                int(self.max_bytes * 0.9)
+                if total_bytes > self.max_bytes
+                else total_bytes
+            )
+            for _, size, entry_path in sorted(entries):
+                if total_bytes <= target_bytes:
+                    break
+                entry_path.unlink(missing_ok=True)
+                total_bytes -= size
+            self._total_bytes = total_bytes
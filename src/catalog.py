@@ -0,0 +1,402 @@
+import re
+import threading
+from pathlib import Path
+from typing import Iterable, Literal
+
+import numpy as np
+from pydantic import BaseModel, Field
+
+from models import QuotationItem
+
+# Character n-grams are hashed, so the index can grow without a vocabulary and
+# vectors stay comparable across updates. A text has a few hundred distinct
+# n-grams, so vectors are kept sparse.
+NGRAM_HASH_BITS: int = 40
+NGRAM_SIZES: tuple[int, ...] = (3, 4, 5)
+MIN_CATALOG_SIMILARITY: float = 0.85
+QUERY_BATCH_SIZE: int = 512
+# Candidates come from the n-grams that carry all but this share of a text's
+# norm. A lower share finds fewer candidates to compare exactly, but walks
+# more posting lists to find them.
+CANDIDATE_NORM_SHARE: float = 0.7
+
+_HASH_MULTIPLIER: np.uint64 = np.uint64(1_000_003)
+_HASH_MASK: np.uint64 = np.uint64((1 << NGRAM_HASH_BITS) - 1)
+
+
+class CatalogEntry(BaseModel):
+    text: str = Field(description="The normalized position text.")
+    sku: str
+    name: str
+    is_door_product_confidence: float
+    source: Literal["keywords", "confirmed"] = Field(
+        default="confirmed",
+        description="Whether the entry was seeded from the keyword rules or"
+        " confirmed by a user.",
+    )
+
+
+class CatalogMatch(BaseModel):
+    entry: CatalogEntry
+    similarity: float = Field(description="Cosine similarity of the TF-IDF vectors.")
+
+
+def normalize_catalog_text(text: str) -> str:
+    """
+    Lower-cases the text and drops markup, digits and repeated whitespace, so
+    positions that only differ in measures map to the same text.
+    """
+    text = text.replace("<br/>", " ").lower()
+    text = re.sub(r"\d+", "0", text)
+    return " ".join(text.split())
+
+
+def _count_ngrams(texts: list[str]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Returns the hashed n-grams of all texts as rows, hashes and counts, sorted
+    by row and hash.
+    """
+    padded: list[str] = [f" {text} " for text in texts]
+    codes: np.ndarray = np.frombuffer(
+        "".join(padded).encode("utf-32-le"), dtype=np.uint32
+    ).astype(np.uint64)
+    rows: np.ndarray = np.repeat(
+        np.arange(len(texts), dtype=np.uint64), [len(text) for text in padded]
+    )
+    keys: list[np.ndarray] = []
+    for size in NGRAM_SIZES:
+        ngram_count: int = len(codes) - size + 1
+        if ngram_count <= 0:
+            continue
+        # Polynomial hash of all n-grams at once; uint64 overflow wraps around.
+        hashes: np.ndarray = np.full(ngram_count, size, dtype=np.uint64)
+        for offset in range(size):
+            hashes = hashes * _HASH_MULTIPLIER + codes[offset : offset + ngram_count]
+        # N-grams spanning two texts are dropped.
+        within_text: np.ndarray = rows[:ngram_count] == rows[size - 1 :]
+        keys.append(
+            (rows[:ngram_count][within_text] << np.uint64(NGRAM_HASH_BITS))
+            | (hashes[within_text] & _HASH_MASK)
+        )
+    unique_keys, counts = np.unique(
+        np.concatenate(keys) if keys else np.zeros(0, np.uint64), return_counts=True
+    )
+    return (
+        (unique_keys >> np.uint64(NGRAM_HASH_BITS)).astype(np.intp),
+        unique_keys & _HASH_MASK,
+        counts.astype(np.float32),
+    )
+
+
+def _expand_ranges(
+    starts: np.ndarray, stops: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the positions within all ranges `[start, stop)` together with the
+    number of the range each position belongs to.
+    """
+    lengths: np.ndarray = stops - starts
+    range_numbers: np.ndarray = np.repeat(np.arange(len(starts)), lengths)
+    range_offsets: np.ndarray = np.cumsum(lengths) - lengths
+    positions: np.ndarray = (
+        np.arange(len(range_numbers))
+        - range_offsets[range_numbers]
+        + starts[range_numbers]
+    )
+    return positions, range_numbers
+
+
+def _normalize(rows: np.ndarray, weights: np.ndarray, row_count: int) -> np.ndarray:
+    norms: np.ndarray = np.sqrt(np.bincount(rows, weights * weights, row_count))
+    return weights / np.maximum(norms[rows], 1e-12)
+
+
+class _CatalogIndex:
+    """
+    Sparse TF-IDF vectors of the catalog entries, stored by entry and as an
+    inverted index from n-grams to the entries containing them.
+    """
+
+    def __init__(
+        self, entry_rows: np.ndarray, hashes: np.ndarray, counts: np.ndarray, size: int
+    ) -> None:
+        self.size: int = size
+        self.vocabulary, features, document_frequency = np.unique(
+            hashes, return_inverse=True, return_counts=True
+        )
+        self.idf: np.ndarray = np.log((1 + size) / (1 + document_frequency)) + 1
+        self.unseen_idf: float = float(np.log(1 + size) + 1)
+        weights: np.ndarray = _normalize(
+            entry_rows, np.log1p(counts) * self.idf[features], size
+        ).astype(np.float32)
+        # The rows are sorted, so each entry's n-grams form one range.
+        self.entry_starts: np.ndarray = np.searchsorted(entry_rows, np.arange(size + 1))
+        self.entry_features: np.ndarray = features
+        self.entry_weights: np.ndarray = weights
+        order: np.ndarray = np.argsort(features, kind="stable")
+        self.posting_starts: np.ndarray = np.searchsorted(
+            features[order], np.arange(len(self.vocabulary) + 1)
+        )
+        self.posting_entries: np.ndarray = entry_rows[order]
+        self.posting_weights: np.ndarray = weights[order]
+
+    def match(
+        self, texts: list[str], min_similarity: float
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the most similar entry for each text and its cosine similarity,
+        or -1 and 0.0 if no entry reaches `min_similarity`.
+        """
+        best_entries: np.ndarray = np.full(len(texts), -1)
+        best_similarities: np.ndarray = np.zeros(len(texts))
+        if not len(self.vocabulary):
+            return best_entries, best_similarities
+        rows, hashes, counts = _count_ngrams(texts)
+        features: np.ndarray = np.minimum(
+            np.searchsorted(self.vocabulary, hashes), len(self.vocabulary) - 1
+        )
+        known: np.ndarray = self.vocabulary[features] == hashes
+        weights: np.ndarray = _normalize(
+            rows,
+            np.log1p(counts) * np.where(known, self.idf[features], self.unseen_idf),
+            len(texts),
+        )
+
+        # The n-grams outside a text's heaviest ones have a norm below
+        # `CANDIDATE_NORM_SHARE * min_similarity`, which bounds their part of
+        # any similarity, so only entries sharing a heavy n-gram can match.
+        # Weights are in (0, 1], so this sorts by row and descending weight.
+        order: np.ndarray = np.argsort(2.0 * rows - weights)
+        squares: np.ndarray = weights[order] ** 2
+        preceding: np.ndarray = np.cumsum(squares) - squares
+        row_starts: np.ndarray = np.cumsum(np.bincount(rows, minlength=len(texts)))
+        row_starts = np.append(0, row_starts[:-1])[rows[order]]
+        remaining: np.ndarray = 1.0 - (preceding - preceding[row_starts])
+        heavy: np.ndarray = np.zeros(len(rows), bool)
+        heavy[order] = remaining >= (CANDIDATE_NORM_SHARE * min_similarity) ** 2
+        rest_norms: np.ndarray = np.sqrt(
+            np.bincount(rows[~heavy], weights[~heavy] ** 2, len(texts))
+        )
+        heavy &= known
+        positions, heavy_ngrams = _expand_ranges(
+            self.posting_starts[features[heavy]],
+            self.posting_starts[features[heavy] + 1],
+        )
+        pairs, pair_numbers = np.unique(
+            rows[heavy][heavy_ngrams] * self.size + self.posting_entries[positions],
+            return_inverse=True,
+        )
+        pair_rows: np.ndarray = pairs // self.size
+        # The shared heavy n-grams plus the bound for the rest rule out most
+        # candidates before their exact similarity is computed.
+        upper_bounds: np.ndarray = (
+            np.bincount(
+                pair_numbers,
+                weights[heavy][heavy_ngrams] * self.posting_weights[positions],
+                len(pairs),
+            )
+            + rest_norms[pair_rows]
+        )
+        pairs = pairs[upper_bounds >= min_similarity - 1e-6]
+        if not len(pairs):
+            return best_entries, best_similarities
+        pair_rows, pair_entries = pairs // self.size, pairs % self.size
+
+        # The keys are sorted, as the n-grams are sorted by row and hash.
+        text_keys: np.ndarray = rows[known] * len(self.vocabulary) + features[known]
+        positions, pair_numbers = _expand_ranges(
+            self.entry_starts[pair_entries], self.entry_starts[pair_entries + 1]
+        )
+        entry_keys: np.ndarray = (
+            pair_rows[pair_numbers] * len(self.vocabulary)
+            + self.entry_features[positions]
+        )
+        matches: np.ndarray = np.minimum(
+            np.searchsorted(text_keys, entry_keys), len(text_keys) - 1
+        )
+        shared: np.ndarray = text_keys[matches] == entry_keys
+        similarities: np.ndarray = np.bincount(
+            pair_numbers[shared],
+            weights[known][matches[shared]] * self.entry_weights[positions[shared]],
+            len(pairs),
+        )
+
+        order = np.lexsort((similarities, pair_rows))
+        is_best: np.ndarray = np.append(
+            pair_rows[order][1:] != pair_rows[order][:-1], True
+        )
+        best: np.ndarray = order[is_best]
+        found: np.ndarray = similarities[best] >= min_similarity
+        best_entries[pair_rows[best][found]] = pair_entries[best][found]
+        best_similarities[pair_rows[best][found]] = similarities[best][found]
+        return best_entries, best_similarities
+
+
+class SkuCatalog:
+    """
+    Nearest-neighbour index from position texts to SKUs over TF-IDF weighted
+    character n-grams. All positions of a document are looked up at once in
+    an inverted index, and entries can be added while the index is in use.
+    """
+
+    def __init__(self, max_entries: int = 5000) -> None:
+        self.max_entries: int = max_entries
+        self.entries: list[CatalogEntry] = []
+        self._entry_index: dict[str, int] = {}
+        # The n-grams of all entries, sorted by entry and hash.
+        self._ngram_rows: np.ndarray = np.zeros(0, np.intp)
+        self._ngram_hashes: np.ndarray = np.zeros(0, np.uint64)
+        self._ngram_counts: np.ndarray = np.zeros(0, np.float32)
+        self._index: _CatalogIndex | None = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @classmethod
+    def from_keywords(
+        cls, sku_keywords: dict[str, list[str]], sku_names: dict[str, str]
+    ) -> "SkuCatalog":
+        catalog: SkuCatalog = cls()
+        catalog.add(
+            CatalogEntry(
+                text=normalize_catalog_text(f"{sku_names[sku]} {' '.join(keywords)}"),
+                sku=sku,
+                name=sku_names[sku],
+                is_door_product_confidence=0.9,
+                source="keywords",
+            )
+            for sku, keywords in sku_keywords.items()
+        )
+        return catalog
+
+    def add(self, entries: Iterable[CatalogEntry]) -> None:
+        with self._lock:
+            new_texts: list[str] = []
+            first_new_row: int = len(self.entries)
+            for entry in entries:
+                if entry.text in self._entry_index:
+                    # A correction replaces the earlier entry for the same text.
+                    self.entries[self._entry_index[entry.text]] = entry
+                    continue
+                self._entry_index[entry.text] = len(self.entries)
+                self.entries.append(entry)
+                new_texts.append(entry.text)
+            if new_texts:
+                rows, hashes, counts = _count_ngrams(new_texts)
+                self._ngram_rows = np.concatenate(
+                    [self._ngram_rows, rows + first_new_row]
+                )
+                self._ngram_hashes = np.concatenate([self._ngram_hashes, hashes])
+                self._ngram_counts = np.concatenate([self._ngram_counts, counts])
+            if len(self.entries) > self.max_entries:
+                # The oldest confirmed entries go first, seeded ones are kept.
+                confirmed: list[int] = [
+                    i
+                    for i, entry in enumerate(self.entries)
+                    if entry.source == "confirmed"
+                ]
+                dropped: set[int] = set(
+                    confirmed[: len(self.entries) - self.max_entries]
+                )
+                keep: list[int] = [
+                    i for i in range(len(self.entries)) if i not in dropped
+                ]
+                self.entries = [self.entries[i] for i in keep]
+                new_rows: np.ndarray = np.full(len(self.entries) + len(dropped), -1)
+                new_rows[keep] = np.arange(len(keep))
+                kept: np.ndarray = new_rows[self._ngram_rows] >= 0
+                self._ngram_rows = new_rows[self._ngram_rows[kept]]
+                self._ngram_hashes = self._ngram_hashes[kept]
+                self._ngram_counts = self._ngram_counts[kept]
+                self._entry_index = {
+                    entry.text: i for i, entry in enumerate(self.entries)
+                }
+            self._index = None
+
+    def add_quotation_item(self, quotation_item: QuotationItem) -> None:
+        """
+        Adds an item confirmed or corrected by a user.
+        """
+        if quotation_item.sku:
+            self.add(
+                [
+                    CatalogEntry(
+                        text=normalize_catalog_text(quotation_item.text),
+                        sku=quotation_item.sku,
+                        name=quotation_item.name,
+                        is_door_product_confidence=(
+                            quotation_item.is_door_product_confidence
+                        ),
+                    )
+                ]
+            )
+
+    def _get_index(self) -> _CatalogIndex:
+        if self._index is None:
+            self._index = _CatalogIndex(
+                self._ngram_rows,
+                self._ngram_hashes,
+                self._ngram_counts,
+                len(self.entries),
+            )
+        return self._index
+
+    def match(
+        self, texts: list[str], min_similarity: float = MIN_CATALOG_SIMILARITY
+    ) -> list[CatalogMatch | None]:
+        """
+        Returns the most similar entry for each text, or None if no entry
+        reaches `min_similarity`.
+        """
+        with self._lock:
+            if not self.entries or not texts:
+                return [None] * len(texts)
+            normalized_texts: list[str] = [
+                normalize_catalog_text(text) for text in texts
+            ]
+            # Known texts are answered directly, repeated ones are looked up once.
+            matches: dict[str, CatalogMatch | None] = {
+                text: CatalogMatch(
+                    entry=self.entries[self._entry_index[text]], similarity=1.0
+                )
+                for text in normalized_texts
+                if text in self._entry_index
+            }
+            unknown_texts: list[str] = list(
+                dict.fromkeys(text for text in normalized_texts if text not in matches)
+            )
+            index: _CatalogIndex = self._get_index()
+            for start in range(0, len(unknown_texts), QUERY_BATCH_SIZE):
+                batch: list[str] = unknown_texts[start : start + QUERY_BATCH_SIZE]
+                best_entries, similarities = index.match(batch, min_similarity)
+                for text, entry, similarity in zip(batch, best_entries, similarities):
+                    matches[text] = (
+                        CatalogMatch(
+                            entry=self.entries[entry], similarity=float(similarity)
+                        )
+                        if entry >= 0
+                        else None
+                    )
+            return [matches[text] for text in normalized_texts]
+
+    def save(self, path: Path) -> None:
+        with self._lock:
+            lines: list[str] = [entry.model_dump_json() for entry in self.entries]
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path: Path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        tmp_path.write_text("".join(f"{line}\n" for line in lines), encoding="utf-8")
+        tmp_path.replace(path)
+
+    def load(self, path: Path) -> None:
+        """
+        Adds the entries saved at `path`, if it exists. The vectors are
+        recomputed, so changing the n-gram settings doesn't need a migration.
+        """
+        if not path.exists():
+            return
+        self.add(
+            CatalogEntry.model_validate_json(line)
+            for line in path.read_text(encoding="utf-8").splitlines()
+            if line.strip()
+        )
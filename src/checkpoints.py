@@ -0,0 +1,142 @@
+import os
+import re
+import shutil
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Literal
+
+from pydantic import BaseModel, Field
+
+# Run IDs come from URLs and command lines, so they must not leave the
+# checkpoint directory; "." and ".." would.
+RUN_ID_PATTERN: re.Pattern = re.compile(r"[A-Za-z0-9_-]+")
+
+
+class RunManifest(BaseModel):
+    run_id: str
+    metadata: dict[str, str] = Field(
+        default_factory=dict, description="What is needed to start the run again."
+    )
+    state: Literal["running", "done", "failed"] = Field(default="running")
+    error: str | None = Field(default=None)
+    created_at: datetime = Field(default_factory=datetime.now)
+    updated_at: datetime = Field(default_factory=datetime.now)
+
+
+class RunCheckpoint:
+    """
+    Keeps the output of every finished stage and chunk of one run under its
+    run ID, so a run that failed or was interrupted by a crash or restart
+    resumes without repeating the LLM calls it already made.
+
+    Unlike the `ResultCache`, entries are never evicted while the run exists.
+    """
+
+    def __init__(self, run_dir: Path) -> None:
+        self.run_dir: Path = Path(run_dir)
+        self._lock = threading.Lock()
+
+    @property
+    def run_id(self) -> str:
+        return self.run_dir.name
+
+    @property
+    def manifest(self) -> RunManifest:
+        return RunManifest.model_validate_json(
+            (self.run_dir / "manifest.json").read_text(encoding="utf-8")
+        )
+
+    def _write(self, path: Path, value: str) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path: Path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        tmp_path.write_text(value, encoding="utf-8")
+        os.replace(tmp_path, path)
+
+    def write_manifest(self, manifest: RunManifest) -> None:
+        manifest.updated_at = datetime.now()
+        self._write(self.run_dir / "manifest.json", manifest.model_dump_json())
+
+    def get(self, stage: str, key: str) -> str | None:
+        try:
+            return (self.run_dir / stage / f"{key}.json").read_text(encoding="utf-8")
+        except FileNotFoundError:
+            return None
+
+    def set(self, stage: str, key: str, value: str) -> None:
+        self._write(self.run_dir / stage / f"{key}.json", value)
+
+    def mark_running(self) -> None:
+        with self._lock:
+            self.write_manifest(
+                self.manifest.model_copy(update={"state": "running", "error": None})
+            )
+
+    def mark_done(self) -> None:
+        with self._lock:
+            self.write_manifest(self.manifest.model_copy(update={"state": "done"}))
+
+    def mark_failed(self, error: str) -> None:
+        with self._lock:
+            self.write_manifest(
+                self.manifest.model_copy(update={"state": "failed", "error": error})
+            )
+
+
+class CheckpointStore:
+    """
+    One directory per run under `checkpoint_dir`. Runs not updated for
+    `max_age` seconds are deleted.
+    """
+
+    def __init__(self, checkpoint_dir: Path, max_age: float | None = None) -> None:
+        self.checkpoint_dir: Path = Path(checkpoint_dir)
+        self.max_age: float | None = max_age
+        self.checkpoint_dir.mkdir(parents=True, exist_ok=True)
+        self.delete_expired()
+
+    def create(
+        self, run_id: str, metadata: dict[str, str] | None = None
+    ) -> RunCheckpoint:
+        """
+        Starts a run, or resumes the run with the same ID and its checkpoints.
+        """
+        checkpoint: RunCheckpoint | None = self.open(run_id)
+        if checkpoint is not None:
+            checkpoint.mark_running()
+            return checkpoint
+        if not self._is_valid_run_id(run_id):
+            raise ValueError(f"Invalid run ID {run_id!r}.")
+        checkpoint = RunCheckpoint(self.checkpoint_dir / run_id)
+        checkpoint.write_manifest(RunManifest(run_id=run_id, metadata=metadata or {}))
+        return checkpoint
+
+    def _is_valid_run_id(self, run_id: str) -> bool:
+        return RUN_ID_PATTERN.fullmatch(run_id) is not None
+
+    def open(self, run_id: str) -> RunCheckpoint | None:
+        run_dir: Path = self.checkpoint_dir / run_id
+        if not self._is_valid_run_id(run_id):
+            return None
+        if not (run_dir / "manifest.json").exists():
+            return None
+        return RunCheckpoint(run_dir)
+
+    def delete(self, run_id: str) -> None:
+        checkpoint: RunCheckpoint | None = self.open(run_id)
+        if checkpoint is not None:
+            shutil.rmtree(checkpoint.run_dir, ignore_errors=True)
+
+    def delete_expired(self) -> None:
+        if self.max_age is None:
+            return
+        for manifest_path in self.checkpoint_dir.glob("*/manifest.json"):
+            try:
+                expired: bool = (
+                    time.time() - manifest_path.stat().st_mtime > self.max_age
+                )
+            except FileNotFoundError:
+                continue
+            if expired:
+                shutil.rmtree(manifest_path.parent, ignore_errors=True)
@@ -0,0 +1,99 @@
+import re
+
+from models import QuotationItems
+
+# Matches lines starting with an Ordnungszahl, e.g. "1.", "1.1.", "1.1.10" or
+# "1.1.10.A". Quantity lines like "2,000 Stk" don't match because of the comma.
+ORDNUNGSZAHL_LINE_PATTERN: re.Pattern = re.compile(
+    r"^\s*(?P<ordnungszahl>\d{1,3}\.(?:[0-9A-Z]{1,4}\.?)*)(?:\s|$)"
+)
+
+
+def get_ordnungszahl(line: str) -> str | None:
+    match = ORDNUNGSZAHL_LINE_PATTERN.match(line)
+    return match.group("ordnungszahl") if match else None
+
+
+def get_ordnungszahl_depth(ordnungszahl: str) -> int:
+    return len([part for part in ordnungszahl.split(".") if part])
+
+
+def is_title_line(line: str) -> bool:
+    """
+    Titles (e.g. "1. Innentüren", "1.1. Holztüren mit Stahl-U-Zarge") have
+    fewer than three levels, positions start at "1.1.10".
+    """
+    ordnungszahl: str | None = get_ordnungszahl(line)
+    return ordnungszahl is not None and get_ordnungszahl_depth(ordnungszahl) < 3
+
+
+def split_lv_blocks(text: str) -> list[str]:
+    """
+    Splits an LV text into blocks that each start at an Ordnungszahl.
+    """
+    blocks: list[list[str]] = [[]]
+    for line in text.splitlines():
+        if get_ordnungszahl(line) is not None and blocks[-1]:
+            blocks.append([])
+        blocks[-1].append(line)
+    return ["\n".join(block) for block in blocks if any(block)]
+
+
+def split_lv_text(text: str, max_chars: int = 12_000) -> list[str]:
+    """
+    Splits an LV text into chunks of at most `max_chars` characters without
+    cutting through a position. Each chunk is prefixed with the titles that
+    are open at its start so the chapter hierarchy stays visible.
+    """
+    chunks: list[str] = []
+    chunk_blocks: list[str] = []
+    chunk_chars: int = 0
+    open_titles: dict[int, str] = {}
+    chunk_titles: list[str] = []
+
+    for block in split_lv_blocks(text):
+        first_line: str = block.split("\n", 1)[0]
+        depth: int | None = (
+            get_ordnungszahl_depth(get_ordnungszahl(first_line))
+            if is_title_line(first_line)
+            else None
+        )
+
+        if chunk_blocks and chunk_chars + len(block) > max_chars:
+            chunks.append("\n".join(chunk_titles + chunk_blocks))
+            chunk_blocks, chunk_chars = [], 0
+            chunk_titles = [
+                title
+                for level, title in open_titles.items()
+                if depth is None or level < depth
+            ]
+
+        if depth is not None:
+            open_titles = {
+                level: title for level, title in open_titles.items() if level < depth
+            }
+            open_titles[depth] = first_line.strip()
+
+        chunk_blocks.append(block)
+        chunk_chars += len(block) + 1
+
+    if chunk_blocks:
+        chunks.append("\n".join(chunk_titles + chunk_blocks))
+    return chunks
+
+
+def merge_quotation_items(chunk_results: list[QuotationItems]) -> QuotationItems:
+    """
+    Concatenates per-chunk results in document order and drops positions that
+    were returned more than once.
+    """
+    seen_commissions: set[str] = set()
+    merged: QuotationItems = QuotationItems(items=[])
+    for quotation_items in chunk_results:
+        for quotation_item in quotation_items.items:
+            commission: str = quotation_item.commission.strip()
+            if commission in seen_commissions:
+                continue
+            seen_commissions.add(commission)
+            merged.items.append(quotation_item)
+    return merged
@@ -0,0 +1,147 @@
+from pathlib import Path
+from typing import Iterator
+
+from lxml import etree
+from pydantic import BaseModel, Field
+
+from models import LvPosition
+
+GAEB_SUFFIXES: tuple[str, ...] = (".x83", ".x84")
+
+
+class GaebChapter(BaseModel):
+    ordnungszahl: str = Field(description="The chapter ID, e.g. 1.2.")
+    title: str
+
+
+def _get_tag(element: etree._Element) -> str:
+    # GAEB versions differ in their namespace, so elements are matched by name.
+    return etree.QName(element).localname
+
+
+def _get_ordnungszahl_part(element: etree._Element) -> str:
+    # "01" and "0010" are written as "1" and "10" like in the PDF exports.
+    part: str = (element.get("RNoPart") or "").strip()
+    return str(int(part)) if part.isdigit() else part
+
+
+def _get_text_lines(element: etree._Element | None) -> list[str]:
+    """
+    Returns the lines of a formatted GAEB text.
+    """
+    if element is None:
+        return []
+    # The element is discarded after reading, so the line breaks are written
+    # into the text in place.
+    for line_break in element.iter("{*}br"):
+        line_break.tail = "\n" + (line_break.tail or "")
+    paragraphs: list[etree._Element] = list(element.iter("{*}p")) or [element]
+    return [
+        line.strip()
+        for paragraph in paragraphs
+        for line in "".join(paragraph.itertext()).split("\n")
+        if line.strip()
+    ]
+
+
+def _find(element: etree._Element, path: str) -> etree._Element | None:
+    return element.find("/".join(f"{{*}}{tag}" for tag in path.split("/")))
+
+
+def _to_lv_position(item: etree._Element, ordnungszahl: str) -> LvPosition:
+    short_text: list[str] = _get_text_lines(
+        _find(item, "Description/CompleteText/OutlineText/OutlTxt/TextOutlTxt")
+    )
+    long_text: list[str] = _get_text_lines(
+        _find(item, "Description/CompleteText/DetailTxt/Text")
+    )
+    # The long text usually repeats the short text in its first line.
+    lines: list[str] = (
+        long_text if short_text[:1] == long_text[:1] else short_text + long_text
+    )
+    quantity: etree._Element | None = _find(item, "Qty")
+    unit: etree._Element | None = _find(item, "QU")
+    return LvPosition(
+        ordnungszahl=ordnungszahl,
+        beschreibung="\n".join(lines),
+        quantity=(
+            float(quantity.text)
+            if quantity is not None and (quantity.text or "").strip()
+            else None
+        ),
+        quantity_unit=((unit.text or "").strip() or None) if unit is not None else None,
+    )
+
+
+def iter_gaeb(gaeb_path: Path) -> Iterator[GaebChapter | LvPosition]:
+    """
+    Streams the chapters and positions of a GAEB DA XML file (X83/X84) in
+    document order. Elements are discarded once they have been read, so the
+    memory use doesn't grow with the file size.
+    """
+    ordnungszahl_parts: list[str] = []
+    for event, element in etree.iterparse(
+        str(gaeb_path),
+        events=("start", "end"),
+        resolve_entities=False,
+        huge_tree=True,
+    ):
+        tag: str = _get_tag(element)
+        if tag == "BoQCtgy":
+            if event == "start":
+                ordnungszahl_parts.append(_get_ordnungszahl_part(element))
+                continue
+            ordnungszahl_parts.pop()
+        elif event == "start":
+            continue
+        elif tag == "LblTx" and _get_tag(element.getparent()) == "BoQCtgy":
+            yield GaebChapter(
+                ordnungszahl=".".join(ordnungszahl_parts),
+                title=" ".join(_get_text_lines(element)),
+            )
+            continue
+        elif tag == "Item":
+            yield _to_lv_position(
+                element,
+                ".".join(ordnungszahl_parts + [_get_ordnungszahl_part(element)]),
+            )
+        else:
+            continue
+        # Finished categories and items are dropped together with the
+        # siblings read before them.
+        element.clear(keep_tail=True)
+        while element.getprevious() is not None:
+            del element.getparent()[0]
+
+
+class GaebDocument(BaseModel):
+    chapter_titles: dict[str, str] = Field(
+        default_factory=dict,
+        description="Maps chapter Ordnungszahlen to their lower-cased title.",
+    )
+    chunks: list[list[LvPosition]] = Field(
+        default_factory=list,
+        description="The positions in groups of at most `max_chunk_chars`.",
+    )
+
+
+def read_gaeb(gaeb_path: Path, max_chunk_chars: int = 12_000) -> GaebDocument:
+    """
+    Reads the positions of a GAEB file in chunks like `split_lv_text` does for
+    the text of a PDF.
+    """
+    document: GaebDocument = GaebDocument()
+    chunk: list[LvPosition] = []
+    chunk_chars: int = 0
+    for element in iter_gaeb(gaeb_path):
+        if isinstance(element, GaebChapter):
+            document.chapter_titles[element.ordnungszahl] = element.title.lower()
+            continue
+        if chunk and chunk_chars + len(element.beschreibung) > max_chunk_chars:
+            document.chunks.append(chunk)
+            chunk, chunk_chars = [], 0
+        chunk.append(element)
+        chunk_chars += len(element.beschreibung)
+    if chunk:
+        document.chunks.append(chunk)
+    return document
@@ -0,0 +1,116 @@
+import math
+from typing import Any
+
+from models import QuotationItem, QuotationItems
+from pydantic import BaseModel, Field
+
+# Lower and upper bound of the door product confidence per band.
+CONFIDENCE_BANDS: dict[str, tuple[float, float]] = {
+    "high": (0.75, math.inf),
+    "medium": (0.5, 0.75),
+    "low": (-math.inf, 0.5),
+}
+MISSING_SKU: str = "-"
+
+
+def get_confidence_band(confidence: float) -> str:
+    for band, (lower, upper) in CONFIDENCE_BANDS.items():
+        if lower <= confidence < upper:
+            return band
+    return "low"
+
+
+def get_chapter(commission: str) -> str:
+    """
+    Returns the chapter of an item, e.g. "1.2" for "LV-POS. 1.2.30".
+    """
+    parts: list[str] = [
+        part for part in commission.replace("LV-POS.", "").strip().split(".") if part
+    ]
+    return ".".join(parts[:-1]) if len(parts) > 1 else "".join(parts)
+
+
+class ItemFilter(BaseModel):
+    sku: str = Field(
+        default="",
+        description=f"Part of the SKU, or `{MISSING_SKU}` for items without a SKU.",
+    )
+    confidence_bands: list[str] = Field(
+        default_factory=list, description="Keys of `CONFIDENCE_BANDS`, empty for all."
+    )
+    chapters: list[str] = Field(default_factory=list, description="Empty for all.")
+
+    def matches(self, quotation_item: QuotationItem) -> bool:
+        sku: str = self.sku.strip()
+        if sku == MISSING_SKU:
+            if quotation_item.sku:
+                return False
+        elif sku and sku.lower() not in (quotation_item.sku or "").lower():
+            return False
+        if self.confidence_bands and (
+            get_confidence_band(quotation_item.is_door_product_confidence)
+            not in self.confidence_bands
+        ):
+            return False
+        return not self.chapters or (
+            get_chapter(quotation_item.commission) in self.chapters
+        )
+
+
+class QuotationItemEdits:
+    """
+    The fields changed by the user per item index, kept apart from the
+    analysis result. Only changed values are stored, and an edit neither
+    copies the item list nor touches the other items.
+    """
+
+    def __init__(self) -> None:
+        self._changes: dict[int, dict[str, Any]] = {}
+        self._applied: QuotationItems | None = None
+
+    def __len__(self) -> int:
+        return len(self._changes)
+
+    def get(self, quotation_items: QuotationItems, index: int) -> QuotationItem:
+        quotation_item: QuotationItem = quotation_items.items[index]
+        changes: dict[str, Any] | None = self._changes.get(index)
+        return quotation_item.model_copy(update=changes) if changes else quotation_item
+
+    def save(
+        self,
+        quotation_items: QuotationItems,
+        index: int,
+        edited_item: QuotationItem,
+    ) -> None:
+        original: dict[str, Any] = quotation_items.items[index].model_dump()
+        changes: dict[str, Any] = {
+            field: value
+            for field, value in edited_item.model_dump().items()
+            if value != original[field]
+        }
+        if changes == self._changes.get(index, {}):
+            return
+        if changes:
+            self._changes[index] = changes
+        else:
+            self._changes.pop(index, None)
+        quotation_items.mark_changed()
+
+    def apply(self, quotation_items: QuotationItems) -> QuotationItems:
+        """
+        Returns the edited items. The result is reused until the next change,
+        so it keeps its identity and revision across reruns.
+        """
+        if not self._changes:
+            return quotation_items
+        if self._applied is None or (
+            self._applied.revision != quotation_items.revision
+        ):
+            self._applied = QuotationItems(
+                items=[
+                    self.get(quotation_items, index)
+                    for index in range(len(quotation_items.items))
+                ]
+            )
+            self._applied._revision = quotation_items.revision
+        return self._applied
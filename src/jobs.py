@@ -0,0 +1,367 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from datetime import datetime
+from enum import Enum
+from typing import Callable
+
+from pydantic import BaseModel, Field
+
+from models import QuotationItem, QuotationItems
+from tracing import METRICS
+
+
+class JobState(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+FINISHED_JOB_STATES: set[JobState] = {
+    JobState.DONE,
+    JobState.FAILED,
+    JobState.CANCELLED,
+}
+
+
+class JobStatus(BaseModel):
+    job_id: str
+    owner: str = Field(description="The client that submitted the job.")
+    metadata: dict[str, str] = Field(default_factory=dict)
+    state: JobState = Field(default=JobState.QUEUED)
+    queue_position: int | None = Field(
+        default=None, description="Number of queued jobs that start before this one."
+    )
+    progress: float = Field(default=0.0)
+    message: str = Field(default="")
+    streamed_item_count: int = Field(default=0)
+    error: str | None = Field(default=None)
+    created_at: datetime = Field(default_factory=datetime.now)
+    started_at: datetime | None = Field(default=None)
+    finished_at: datetime | None = Field(default=None)
+
+
+class JobCancelledError(Exception):
+    pass
+
+
+class JobQueueFullError(Exception):
+    pass
+
+
+class _Job:
+    def __init__(
+        self,
+        status: JobStatus,
+        function: Callable[["JobContext"], QuotationItems],
+        coalesce_key: str | None = None,
+        on_finish: Callable[[JobStatus], None] | None = None,
+    ) -> None:
+        self.status: JobStatus = status
+        self.function: Callable[[JobContext], QuotationItems] = function
+        self.coalesce_key: str | None = coalesce_key
+        self.on_finish: Callable[[JobStatus], None] | None = on_finish
+        self.cancel_requested: threading.Event = threading.Event()
+        self.streamed_items: list[QuotationItem] = []
+        self.result: QuotationItems | None = None
+        self.finished: float | None = None
+        # Coalesced jobs wait for a shared run instead of being queued.
+        self.run: _Job | None = None
+        self.waiters: list[_Job] = []
+
+
+class JobContext:
+    """
+    Handed to a job function to report its progress and streamed items. Both
+    raise `JobCancelledError` once the job was cancelled, which aborts the
+    pipeline from within its callbacks.
+    """
+
+    def __init__(self, job: _Job, lock: threading.Lock) -> None:
+        self._job: _Job = job
+        self._lock: threading.Lock = lock
+
+    @property
+    def job_id(self) -> str:
+        return self._job.status.job_id
+
+    def check_cancelled(self) -> None:
+        if self._job.cancel_requested.is_set():
+            raise JobCancelledError(self.job_id)
+
+    def report_progress(self, progress: float, message: str) -> None:
+        self.check_cancelled()
+        with self._lock:
+            self._job.status.progress = progress
+            self._job.status.message = message
+
+    def add_item(self, quotation_item: QuotationItem) -> None:
+        self.check_cancelled()
+        with self._lock:
+            self._job.streamed_items.append(quotation_item)
+            self._job.status.streamed_item_count = len(self._job.streamed_items)
+
+
+class JobManager:
+    """
+    Runs analyses on a bounded pool of worker threads, independent of the
+    Streamlit script runs that submit and poll them.
+
+    Queued jobs are dispatched round-robin per owner, so one user submitting
+    several tenders doesn't delay everyone else. Memory stays bounded by
+    limiting queued and active jobs and by evicting finished jobs after
+    `finished_job_ttl` seconds or beyond `max_finished_jobs`.
+
+    Jobs submitted with the same `coalesce_key` while one of them is active
+    share a single run: they report its progress and streamed items, and
+    receive its result or error. The run is only cancelled once all of its
+    jobs are. As only the first job's function runs, each job's `on_finish`
+    is called with its own final status.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 4,
+        max_queued_jobs: int = 100,
+        max_active_jobs_per_owner: int = 2,
+        max_finished_jobs: int = 200,
+        finished_job_ttl: float = 24 * 60 * 60,
+    ) -> None:
+        self.max_workers: int = max_workers
+        self.max_queued_jobs: int = max_queued_jobs
+        self.max_active_jobs_per_owner: int = max_active_jobs_per_owner
+        self.max_finished_jobs: int = max_finished_jobs
+        self.finished_job_ttl: float = finished_job_ttl
+        self._lock = threading.Lock()
+        self._job_available = threading.Condition(self._lock)
+        self._jobs: dict[str, _Job] = {}
+        # Per-owner FIFO queues; the owner served next is the first entry.
+        self._queues: OrderedDict[str, deque[_Job]] = OrderedDict()
+        self._workers: list[threading.Thread] = []
+        # The active run per coalesce key.
+        self._runs: dict[str, _Job] = {}
+        self.coalesced_jobs: int = 0
+
+    def submit(
+        self,
+        owner: str,
+        function: Callable[[JobContext], QuotationItems],
+        metadata: dict[str, str] | None = None,
+        coalesce_key: str | None = None,
+        job_id: str | None = None,
+        on_finish: Callable[[JobStatus], None] | None = None,
+    ) -> JobStatus:
+        """
+        Queues `function`. A resumed run passes its `job_id` again, which
+        replaces a finished job with that ID and is ignored while it's active.
+        `on_finish` is called with the job's final status while the manager's
+        lock is held, so it must not call the manager.
+        """
+        with self._lock:
+            self._evict_finished_jobs()
+            existing_job: _Job | None = self._jobs.get(job_id or "")
+            if existing_job is not None and existing_job.finished is None:
+                return self._get_status(existing_job)
+            run: _Job | None = self._runs.get(coalesce_key)
+            if run is not None and run.cancel_requested.is_set():
+                run = None
+            if run is None and sum(len(queue) for queue in self._queues.values()) >= (
+                self.max_queued_jobs
+            ):
+                raise JobQueueFullError(
+                    "Too many analyses are waiting, please try again later."
+                )
+            active_jobs: int = sum(
+                1
+                for job in self._jobs.values()
+                if job.status.owner == owner
+                and job.status.state not in FINISHED_JOB_STATES
+            )
+            if active_jobs >= self.max_active_jobs_per_owner:
+                raise JobQueueFullError(
+                    f"At most {self.max_active_jobs_per_owner} analyses can run at"
+                    " the same time."
+                )
+
+            job: _Job = _Job(
+                JobStatus(
+                    job_id=job_id or uuid.uuid4().hex,
+                    owner=owner,
+                    metadata=metadata or {},
+                ),
+                function,
+                on_finish=on_finish,
+            )
+            self._jobs.pop(job.status.job_id, None)
+            self._jobs[job.status.job_id] = job
+            if coalesce_key is not None:
+                if run is None:
+                    run = _Job(
+                        JobStatus(job_id=uuid.uuid4().hex, owner=owner),
+                        function,
+                        coalesce_key,
+                    )
+                    self._runs[coalesce_key] = run
+                    self._enqueue(run)
+                else:
+                    self.coalesced_jobs += 1
+                    METRICS.increment(
+                        "bytecook_coalesced_jobs_total",
+                        help="Analyses that joined an identical analysis in flight.",
+                    )
+                job.run = run
+                run.waiters.append(job)
+            else:
+                self._enqueue(job)
+            return self._get_status(job)
+
+    def _enqueue(self, job: _Job) -> None:
+        self._queues.setdefault(job.status.owner, deque()).append(job)
+        if len(self._workers) < self.max_workers:
+            worker = threading.Thread(
+                target=self._run_worker,
+                name=f"job-worker-{len(self._workers)}",
+                daemon=True,
+            )
+            self._workers.append(worker)
+            worker.start()
+        self._job_available.notify()
+
+    def status(self, job_id: str) -> JobStatus | None:
+        with self._lock:
+            job: _Job | None = self._jobs.get(job_id)
+            return self._get_status(job) if job is not None else None
+
+    def streamed_items(self, job_id: str, start: int = 0) -> list[QuotationItem]:
+        with self._lock:
+            job: _Job | None = self._jobs.get(job_id)
+            if job is None:
+                return []
+            if job.result is not None:
+                return job.result.items[start:]
+            if job.run is not None and job.finished is None:
+                return job.run.streamed_items[start:]
+            return job.streamed_items[start:]
+
+    def result(self, job_id: str) -> QuotationItems | None:
+        with self._lock:
+            job: _Job | None = self._jobs.get(job_id)
+            return job.result if job is not None else None
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Removes a queued job or asks a running one to stop at its next progress
+        report. Returns False if the job is unknown or already finished.
+        """
+        with self._lock:
+            job: _Job | None = self._jobs.get(job_id)
+            if job is None or job.finished is not None:
+                return False
+            if job.run is None:
+                self._cancel_run(job)
+                return True
+            job.run.waiters.remove(job)
+            if not job.run.waiters:
+                self._cancel_run(job.run)
+            self._finish(job, JobState.CANCELLED)
+            return True
+
+    def _cancel_run(self, job: _Job) -> None:
+        job.cancel_requested.set()
+        if job.status.state == JobState.QUEUED:
+            queue: deque[_Job] = self._queues[job.status.owner]
+            queue.remove(job)
+            if not queue:
+                del self._queues[job.status.owner]
+            self._finish(job, JobState.CANCELLED)
+        else:
+            job.status.message = "Cancelling..."
+
+    def _get_status(self, job: _Job) -> JobStatus:
+        if job.run is not None and job.finished is None:
+            return self._get_status(job.run).model_copy(
+                update=job.status.model_dump(
+                    include={"job_id", "owner", "metadata", "created_at"}
+                )
+            )
+        status: JobStatus = job.status.model_copy()
+        if job.status.state == JobState.QUEUED:
+            index: int = self._queues[job.status.owner].index(job)
+            owner_rank: int = list(self._queues).index(job.status.owner)
+            # Each round serves one job per owner, starting with the first owner.
+            status.queue_position = index + sum(
+                min(len(queue), index + (1 if rank < owner_rank else 0))
+                for rank, queue in enumerate(self._queues.values())
+                if rank != owner_rank
+            )
+        return status
+
+    def _next_job(self) -> _Job:
+        with self._lock:
+            while not self._queues:
+                self._job_available.wait()
+            owner, queue = self._queues.popitem(last=False)
+            job: _Job = queue.popleft()
+            if queue:
+                # The owner moves to the end of the round.
+                self._queues[owner] = queue
+            job.status.state = JobState.RUNNING
+            job.status.started_at = datetime.now()
+            return job
+
+    def _run_worker(self) -> None:
+        while True:
+            job: _Job = self._next_job()
+            context: JobContext = JobContext(job, self._lock)
+            try:
+                result: QuotationItems = job.function(context)
+            except JobCancelledError:
+                with self._lock:
+                    self._finish(job, JobState.CANCELLED)
+            except Exception as error:
+                with self._lock:
+                    job.status.error = f"{type(error).__name__}: {error}"
+                    self._finish(job, JobState.FAILED)
+            else:
+                with self._lock:
+                    if job.cancel_requested.is_set():
+                        self._finish(job, JobState.CANCELLED)
+                        continue
+                    job.result = result
+                    job.status.progress = 1.0
+                    self._finish(job, JobState.DONE)
+
+    def _finish(self, job: _Job, state: JobState) -> None:
+        job.status.state = state
+        job.status.finished_at = datetime.now()
+        job.finished = time.monotonic()
+        # The result holds the items, so the streamed copies aren't needed.
+        job.streamed_items = []
+        if job.coalesce_key is not None and self._runs.get(job.coalesce_key) is job:
+            del self._runs[job.coalesce_key]
+        for waiter in job.waiters:
+            # Each job gets its own deep copy, so edits to its items don't
+            # change the other jobs' results.
+            waiter.result = job.result.model_copy(deep=True) if job.result else None
+            waiter.status = self._get_status(waiter).model_copy(
+                update={"error": job.status.error}
+            )
+            self._finish(waiter, state)
+        job.waiters = []
+        if job.on_finish is not None:
+            job.on_finish(job.status.model_copy())
+        self._evict_finished_jobs()
+
+    def _evict_finished_jobs(self) -> None:
+        finished_jobs: list[_Job] = sorted(
+            (job for job in self._jobs.values() if job.finished is not None),
+            key=lambda job: job.finished,
+        )
+        expired_before: float = time.monotonic() - self.finished_job_ttl
+        excess: int = len(finished_jobs) - self.max_finished_jobs
+        for i, job in enumerate(finished_jobs):
+            if i < excess or job.finished < expired_before:
+                del self._jobs[job.status.job_id]
@@ -1,24 +1,396 @@
-import pdfplumber
+import io
+import itertools
+import multiprocessing
+import os
+import re
+import threading
 import time
+from collections import Counter
+from contextlib import contextmanager
+from concurrent.futures import Future, ProcessPoolExecutor
 from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator
 
-from langchain.chains import LLMChain
-from langchain.chat_models import ChatOpenAI
-from langchain.prompts import PromptTemplate
-from langchain_core.output_parsers import PydanticOutputParser
-import xml.etree.cElementTree as ET
-from models import QuotationItems, get_fake_quotation_items
-from xml.dom import minidom
+from chunking import get_ordnungszahl
+from lxml import etree
+from lv_parser import QUANTITY_LINE_PATTERN, words_to_quantity_lines
+from models import (
+    LvLine,
+    PdfContent,
+    PdfPage,
+    QuotationItems,
+    get_fake_quotation_items,
+)
+from pydantic import BaseModel, Field
+from tokens import estimate_tokens
+from tracing import Tracer
 
+XML_INDENT: str = "   "
 
-def get_pdf_content(pdf_path: Path) -> str:
-    text: str = ""
-    with pdfplumber.open(str(pdf_path)) as pdf:
+COLUMN_HEADING_PATTERN: re.Pattern = re.compile(
+    r"^\s*Ordnungszahl\s+Leistungsbeschreibung\b", re.IGNORECASE
+)
+
+
+class StrippingReport(BaseModel):
+    tokens_before: int = Field(description="Estimated tokens before stripping.")
+    tokens_after: int = Field(description="Estimated tokens after stripping.")
+    removed_lines: int = Field(description="Number of removed lines.")
+
+    @property
+    def removed_percentage(self) -> float:
+        if not self.tokens_before:
+            return 0.0
+        return 100 * (self.tokens_before - self.tokens_after) / self.tokens_before
+
+
+def _extract_page_range(
+    pdf_path: str, start: int, stop: int, page_count: int, margin: float = 0.08
+) -> list[PdfPage]:
+    # pdfplumber is only imported where PDFs are read, so the UI and the XML
+    # export start without it.
+    import pdfplumber
+
+    pages: list[PdfPage] = []
+    with pdfplumber.open(pdf_path, pages=list(range(start + 1, stop + 1))) as pdf:
         for page in pdf.pages:
+            started: float = time.perf_counter()
             page_text = page.extract_text(x_tolerance=1, y_tolerance=1)
-            if page_text:
-                text += page_text + "\n\n"
-    return text
+            margin_lines: list[str] = []
+            for bbox in [
+                (0, 0, page.width, page.height * margin),
+                (0, page.height * (1 - margin), page.width, page.height),
+            ]:
+                margin_text = page.crop(bbox).extract_text(x_tolerance=1, y_tolerance=1)
+                margin_lines.extend((margin_text or "").splitlines())
+            # The words reuse the characters parsed for the text.
+            quantity_lines: dict[str, LvLine] = words_to_quantity_lines(
+                page.extract_words(x_tolerance=1, y_tolerance=1), page.width
+            )
+            pages.append(
+                PdfPage(
+                    page_number=page.page_number,
+                    page_count=page_count,
+                    text=page_text or "",
+                    margin_lines=margin_lines,
+                    extraction_time=time.perf_counter() - started,
+                    quantity_lines=quantity_lines,
+                )
+            )
+            # Releases the parsed layout objects of the page.
+            page.close()
+    return pages
+
+
+_pdf_executor: ProcessPoolExecutor | None = None
+_pdf_executor_lock = threading.Lock()
+
+
+def get_pdf_executor() -> ProcessPoolExecutor:
+    """
+    Returns the process pool shared by all documents, so concurrent analyses
+    don't start more processes than there are cores.
+    """
+    global _pdf_executor
+    with _pdf_executor_lock:
+        if _pdf_executor is None:
+            # The app and the job workers run threads, whose held locks a
+            # forked process would inherit, so the processes are spawned.
+            _pdf_executor = ProcessPoolExecutor(
+                max_workers=os.cpu_count() or 1,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pdf_executor
+
+
+def iter_pdf_pages(
+    pdf_path: Path,
+    max_workers: int | None = None,
+    pages_per_task: int = 4,
+) -> Iterator[PdfPage]:
+    """
+    Yields the pages of the PDF in order while the remaining pages are still
+    being extracted in the shared process pool. `max_workers=1` extracts
+    them in this process instead.
+    """
+    import pdfplumber
+
+    with pdfplumber.open(str(pdf_path)) as pdf:
+        page_count: int = len(pdf.pages)
+
+    page_ranges: list[tuple[int, int]] = [
+        (start, min(start + pages_per_task, page_count))
+        for start in range(0, page_count, pages_per_task)
+    ]
+    if (max_workers is not None and max_workers <= 1) or len(page_ranges) <= 1:
+        for start, stop in page_ranges:
+            yield from _extract_page_range(str(pdf_path), start, stop, page_count)
+        return
+
+    executor: ProcessPoolExecutor = get_pdf_executor()
+    futures: list[Future[list[PdfPage]]] = [
+        executor.submit(_extract_page_range, str(pdf_path), start, stop, page_count)
+        for start, stop in page_ranges
+    ]
+    try:
+        for future in futures:
+            yield from future.result()
+    finally:
+        # Drops the remaining work if the consumer abandons the generator early.
+        for future in futures:
+            future.cancel()
+
+
+def _normalize_repeated_line(line: str) -> str:
+    # Page numbers and dates differ from page to page ("Seite: 3 von 40").
+    return re.sub(r"\d+", "#", " ".join(line.split()))
+
+
+def _is_repeated_line_candidate(line: str) -> bool:
+    return not (QUANTITY_LINE_PATTERN.match(line) or get_ordnungszahl(line) is not None)
+
+
+def find_repeated_lines(
+    pages: list[PdfPage], edge_lines: int = 4, min_page_ratio: float = 0.5
+) -> set[str]:
+    """
+    Returns the normalized page headers and footers, i.e. lines in the page
+    margins or among the first and last `edge_lines` lines that repeat on
+    most of `pages`.
+    """
+    if len(pages) < 2:
+        return set()
+    edge_candidates: list[set[str]] = []
+    for page in pages:
+        lines: list[str] = page.text.splitlines()
+        edge_candidates.append(
+            {
+                _normalize_repeated_line(line)
+                for line in lines[:edge_lines] + lines[-edge_lines:] + page.margin_lines
+                if _is_repeated_line_candidate(line)
+            }
+        )
+    counts: Counter[str] = Counter(
+        line for candidates in edge_candidates for line in candidates
+    )
+    return {
+        line
+        for line, count in counts.items()
+        if line and count >= max(2, len(pages) * min_page_ratio)
+    }
+
+
+def strip_repeated_lines(
+    page: PdfPage, repeated_lines: set[str], edge_lines: int = 4
+) -> tuple[PdfPage, int]:
+    """
+    Removes the `repeated_lines` found by `find_repeated_lines` from the page
+    together with the column-heading row. Returns the page and the number of
+    removed lines.
+    """
+
+    def is_repeated(line: str) -> bool:
+        return (
+            _is_repeated_line_candidate(line)
+            and _normalize_repeated_line(line) in repeated_lines
+        )
+
+    lines: list[str] = page.text.splitlines()
+    # Headers and footers are removed as contiguous blocks from the page
+    # edges, so repeated description lines inside the page are kept.
+    start: int = 0
+    while start < min(edge_lines, len(lines)) and (
+        is_repeated(lines[start]) or COLUMN_HEADING_PATTERN.match(lines[start])
+    ):
+        start += 1
+    stop: int = len(lines)
+    while stop > max(start, len(lines) - edge_lines) and is_repeated(lines[stop - 1]):
+        stop -= 1
+    kept_lines: list[str] = [
+        line for line in lines[start:stop] if not COLUMN_HEADING_PATTERN.match(line)
+    ]
+    return (
+        page.model_copy(update={"text": "\n".join(kept_lines)}),
+        len(lines) - len(kept_lines),
+    )
+
+
+def join_pdf_pages(pages: Iterable[PdfPage]) -> str:
+    return "".join(page.text + "\n\n" for page in pages if page.text)
+
+
+def iter_pdf_content(
+    pdf_path: Path,
+    strip_headers: bool = True,
+    tracer: Tracer | None = None,
+    sample_pages: int = 8,
+) -> Iterator[PdfPage]:
+    """
+    Yields the pages of the PDF while the remaining pages are still being
+    extracted. Headers and footers are learned from the first `sample_pages`
+    pages and then stripped from every page as soon as it arrives.
+    """
+    tracer = tracer or Tracer()
+    with tracer.span("pdf_parse") as span:
+        pages: Iterator[PdfPage] = iter_pdf_pages(pdf_path)
+        sample: list[PdfPage] = list(itertools.islice(pages, sample_pages))
+        repeated_lines: set[str] = (
+            find_repeated_lines(sample) if strip_headers else set()
+        )
+        report: StrippingReport = StrippingReport(
+            tokens_before=0, tokens_after=0, removed_lines=0
+        )
+        page_count: int = 0
+        for page in itertools.chain(sample, pages):
+            tracer.progress(
+                "pdf_parse",
+                page.page_number,
+                page.page_count,
+                f"📄 Extracting text from PDF (page {page.page_number})...",
+            )
+            report.tokens_before += estimate_tokens(page.text)
+            if strip_headers:
+                page, removed_lines = strip_repeated_lines(page, repeated_lines)
+                report.removed_lines += removed_lines
+            report.tokens_after += estimate_tokens(page.text)
+            page_count += 1
+            yield page
+        span.set(pages=page_count)
+        if strip_headers:
+            span.set(removed_percentage=report.removed_percentage)
+            tracer.progress(
+                "pdf_parse",
+                page_count,
+                page_count,
+                f"📜 Extracted {page_count} pages from PDF, removed"
+                f" {report.removed_percentage:.0f} % of tokens as headers/footers",
+            )
+
+
+def get_pdf_content(
+    pdf_path: Path, strip_headers: bool = True, tracer: Tracer | None = None
+) -> str:
+    return join_pdf_pages(iter_pdf_content(pdf_path, strip_headers, tracer))
+
+
+def read_pdf_content(
+    pdf_path: Path, strip_headers: bool = True, tracer: Tracer | None = None
+) -> PdfContent:
+    """
+    Like `get_pdf_content`, but also returns the quantity columns read from
+    the word positions, which the local LV parser prefers over the text.
+    """
+    pages: list[PdfPage] = list(iter_pdf_content(pdf_path, strip_headers, tracer))
+    return PdfContent(
+        text=join_pdf_pages(pages),
+        quantity_lines={
+            key: lv_line
+            for page in pages
+            for key, lv_line in page.quantity_lines.items()
+        },
+    )
+
+
+class XmlOrder(BaseModel):
+    quotation_items: QuotationItems
+    customer_id: str = "102736"
+    commission: str = "Cerdia Leitwarte"
+    type: str = "A"
+    shipping_condition_id: int = 2
+
+
+def _write_xml_element(
+    xml_file: etree.xmlfile, tag: str, text: str | None, indent: str
+) -> None:
+    xml_file.write(indent)
+    if text:
+        with xml_file.element(tag):
+            xml_file.write(text)
+    else:
+        xml_file.write(etree.Element(tag))
+
+
+def _write_xml_order(xml_file: etree.xmlfile, order: XmlOrder, level: int) -> None:
+    indent: str = "\n" + XML_INDENT * level
+    with xml_file.element("order"):
+        _write_xml_element(
+            xml_file, "customerId", str(order.customer_id), indent + XML_INDENT
+        )
+        _write_xml_element(
+            xml_file, "commission", order.commission, indent + XML_INDENT
+        )
+        _write_xml_element(xml_file, "type", order.type, indent + XML_INDENT)
+        _write_xml_element(
+            xml_file,
+            "shippingConditionId",
+            str(order.shipping_condition_id),
+            indent + XML_INDENT,
+        )
+
+        xml_file.write(indent + XML_INDENT)
+        item_indent: str = indent + XML_INDENT * 2
+        field_indent: str = indent + XML_INDENT * 3
+        with xml_file.element("items"):
+            for quotation_item in order.quotation_items.items:
+                xml_file.write(item_indent)
+                # Each item is a small subtree that is serialized in one call.
+                item: etree._Element = etree.Element("item")
+                item.text = field_indent
+                for tag, text in [
+                    ("sku", quotation_item.sku),
+                    ("name", quotation_item.name),
+                    ("text", quotation_item.text),
+                    ("quantity", str(quotation_item.quantity)),
+                    ("quantityUnit", quotation_item.quantity_unit),
+                    ("price", "695.00"),
+                    ("priceUnit", "€"),
+                    ("purchasePrice", ""),
+                    ("commission", quotation_item.commission),
+                ]:
+                    field: etree._Element = etree.SubElement(item, tag)
+                    field.text = text or None
+                    field.tail = field_indent
+                field.tail = item_indent
+                xml_file.write(item)
+            if order.quotation_items.items:
+                xml_file.write(indent + XML_INDENT)
+        xml_file.write(indent)
+
+
+@contextmanager
+def _open_xml_output(output: BinaryIO | Path | str) -> Iterator[etree.xmlfile]:
+    if isinstance(output, (Path, str)):
+        with open(output, "wb") as file, _open_xml_output(file) as xml_file:
+            yield xml_file
+        return
+
+    # lxml doesn't allow whitespace outside the root element.
+    output.write(b'<?xml version="1.0" encoding="utf-8"?>\n')
+    with etree.xmlfile(output, encoding="utf-8") as xml_file:
+        yield xml_file
+    output.write(b"\n")
+
+
+def write_xml_order(output: BinaryIO | Path | str, order: XmlOrder) -> None:
+    """
+    Writes a single order as the `<order>` root element in one pass directly
+    to `output`, without keeping the document in memory.
+    """
+    with _open_xml_output(output) as xml_file:
+        _write_xml_order(xml_file, order, level=0)
+
+
+def write_xml_export(output: BinaryIO | Path | str, orders: Iterable[XmlOrder]) -> None:
+    """
+    Writes any number of orders wrapped in an `<orders>` root element, like
+    `write_xml_order` in a single pass.
+    """
+    with _open_xml_output(output) as xml_file:
+        with xml_file.element("orders"):
+            for order in orders:
+                xml_file.write("\n" + XML_INDENT)
+                _write_xml_order(xml_file, order, level=1)
+            xml_file.write("\n")
 
 
 def generate_xml_export(
@@ -28,30 +400,41 @@ def generate_xml_export(
     type: str = "A",
     shipping_condition_id: int = 2,
 ) -> bytes:
-    order = ET.Element("order")
-
-    ET.SubElement(order, "customerId").text = str(customer_id)
-    ET.SubElement(order, "commission").text = commission
-    ET.SubElement(order, "type").text = type
-    ET.SubElement(order, "shippingConditionId").text = str(shipping_condition_id)
-
-    items = ET.SubElement(order, "items")
+    output: io.BytesIO = io.BytesIO()
+    write_xml_order(
+        output,
+        XmlOrder(
+            quotation_items=quotation_items,
+            customer_id=customer_id,
+            commission=commission,
+            type=type,
+            shipping_condition_id=shipping_condition_id,
+        ),
+    )
+    return output.getvalue()
 
-    for quotation_item in quotation_items.items:
-        item = ET.SubElement(items, "item")
-        ET.SubElement(item, "sku").text = quotation_item.sku
-        ET.SubElement(item, "name").text = quotation_item.name
-        ET.SubElement(item, "text").text = quotation_item.text
-        ET.SubElement(item, "quantity").text = str(quotation_item.quantity)
-        ET.SubElement(item, "quantityUnit").text = quotation_item.quantity_unit
-        ET.SubElement(item, "price").text = "695.00"
-        ET.SubElement(item, "priceUnit").text = "€"
-        ET.SubElement(item, "purchasePrice").text = ""
-        ET.SubElement(item, "commission").text = quotation_item.commission
 
-    rough_string: str = ET.tostring(order, encoding="utf-8", xml_declaration=True)
+class XmlExportCache:
+    """
+    Keeps the last XML export and regenerates it only once the quotation
+    items, their revision or the customer ID changed.
+    """
 
-    parsed = minidom.parseString(rough_string)
+    def __init__(self) -> None:
+        self._quotation_items: QuotationItems | None = None
+        self._key: tuple[int, str] | None = None
+        self._xml_export: bytes | None = None
+        self._lock = threading.Lock()
 
-    xml_bytes: bytes = parsed.toprettyxml(indent="   ", encoding="utf-8")
-    return xml_bytes
+    def get(self, quotation_items: QuotationItems, customer_id: str) -> bytes:
+        key: tuple[int, str] = (quotation_items.revision, customer_id)
+        with self._lock:
+            # Holding on to the items ensures that the identity check can't
+            # match a new object at the address of a collected one.
+            if self._quotation_items is not quotation_items or self._key != key:
+                self._xml_export = generate_xml_export(
+                    quotation_items=quotation_items, customer_id=customer_id
+                )
+                self._quotation_items = quotation_items
+                self._key = key
+            return self._xml_export
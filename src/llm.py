@@ -0,0 +1,227 @@
+import asyncio
+import concurrent.futures
+import queue
+import random
+import threading
+import weakref
+from typing import Any, Awaitable, Callable, TypeVar
+
+import httpx
+import openai
+from langchain_core.language_models.chat_models import BaseChatModel
+
+T = TypeVar("T")
+
+OPENROUTER_API_BASE: str = "https://openrouter.ai/api/v1"
+HTTP_LIMITS: httpx.Limits = httpx.Limits(
+    max_connections=32, max_keepalive_connections=16, keepalive_expiry=60
+)
+HTTP_TIMEOUT: httpx.Timeout = httpx.Timeout(600, connect=10)
+
+_lock = threading.Lock()
+_shared_event_loop: asyncio.AbstractEventLoop | None = None
+_http_client: httpx.Client | None = None
+_sync_chat_models: dict[tuple[str, str], BaseChatModel] = {}
+# httpx.AsyncClient connections are bound to the event loop they were opened
+# in, so async clients are pooled per loop.
+_async_clients: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+_async_chat_models: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+_chat_model_factory: Callable[[str, str], BaseChatModel] | None = None
+
+
+def get_shared_event_loop() -> asyncio.AbstractEventLoop:
+    """
+    Returns a process-wide event loop running in a background thread. Running
+    all pipelines on it lets sessions and threads share keep-alive connections.
+    """
+    global _shared_event_loop
+    with _lock:
+        if _shared_event_loop is None:
+            _shared_event_loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=_shared_event_loop.run_forever,
+                name="llm-event-loop",
+                daemon=True,
+            ).start()
+        return _shared_event_loop
+
+
+def _get_http_client() -> httpx.Client:
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.Client(limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+    return _http_client
+
+
+def set_chat_model_factory(
+    factory: Callable[[str, str], BaseChatModel] | None,
+) -> None:
+    """
+    Replaces the OpenRouter models returned by `get_chat_model` with the ones
+    built by `factory(openrouter_api_key, model)`, e.g. with a local stand-in
+    for offline benchmarks. Pass None to restore the OpenRouter models.
+    """
+    global _chat_model_factory
+    _chat_model_factory = factory
+
+
+def get_chat_model(openrouter_api_key: str, model: str) -> BaseChatModel:
+    """
+    Returns a chat model for `model` that is built once per process (and per
+    event loop for async use) and reuses pooled HTTP connections.
+    """
+    if _chat_model_factory is not None:
+        return _chat_model_factory(openrouter_api_key, model)
+
+    # The legacy langchain package is only needed to build OpenRouter models,
+    # not by offline runs with a model factory.
+    from langchain.chat_models import ChatOpenAI
+
+    try:
+        loop: asyncio.AbstractEventLoop | None = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+
+    with _lock:
+        chat_models: dict[tuple[str, str], BaseChatModel] = (
+            _sync_chat_models
+            if loop is None
+            else _async_chat_models.setdefault(loop, {})
+        )
+        if (openrouter_api_key, model) not in chat_models:
+            sync_client = openai.OpenAI(
+                base_url=OPENROUTER_API_BASE,
+                api_key=openrouter_api_key,
+                http_client=_get_http_client(),
+            )
+            async_client: openai.AsyncOpenAI | None = None
+            if loop is not None:
+                async_clients: dict[str, openai.AsyncOpenAI] = (
+                    _async_clients.setdefault(loop, {})
+                )
+                if openrouter_api_key not in async_clients:
+                    async_clients[openrouter_api_key] = openai.AsyncOpenAI(
+                        base_url=OPENROUTER_API_BASE,
+                        api_key=openrouter_api_key,
+                        http_client=httpx.AsyncClient(
+                            limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT
+                        ),
+                    )
+                async_client = async_clients[openrouter_api_key]
+            chat_models[(openrouter_api_key, model)] = ChatOpenAI(
+                openai_api_base=OPENROUTER_API_BASE,
+                openai_api_key=openrouter_api_key,
+                model=model,
+                client=sync_client.chat.completions,
+                async_client=(
+                    async_client.chat.completions if async_client is not None else None
+                ),
+            )
+        return chat_models[(openrouter_api_key, model)]
+
+
+def get_token_usage(message: Any) -> tuple[int, int] | None:
+    """
+    Returns the prompt and completion tokens reported by the provider for a
+    chat model response, or None if the response doesn't include them.
+    """
+    usage_metadata: dict | None = getattr(message, "usage_metadata", None)
+    if usage_metadata:
+        return usage_metadata["input_tokens"], usage_metadata["output_tokens"]
+    token_usage: dict | None = getattr(message, "response_metadata", {}).get(
+        "token_usage"
+    )
+    if token_usage:
+        return token_usage.get("prompt_tokens", 0), token_usage.get(
+            "completion_tokens", 0
+        )
+    return None
+
+
+class CallbackRelay:
+    """
+    Runs callbacks of a coroutine that executes on the shared event loop in the
+    waiting thread instead, e.g. because Streamlit commands must be issued from
+    the script thread.
+    """
+
+    def __init__(self) -> None:
+        self._calls: queue.SimpleQueue = queue.SimpleQueue()
+
+    def wrap(self, callback: Callable[..., None] | None) -> Callable[..., None] | None:
+        if callback is None:
+            return None
+
+        def relayed_callback(*args: Any) -> None:
+            self._calls.put((callback, args))
+
+        return relayed_callback
+
+    def wait(self, future: concurrent.futures.Future) -> Any:
+        try:
+            while not (future.done() and self._calls.empty()):
+                try:
+                    callback, args = self._calls.get(timeout=0.05)
+                except queue.Empty:
+                    continue
+                callback(*args)
+        except BaseException:
+            future.cancel()
+            raise
+        return future.result()
+
+
+class LLMRequestLimiter:
+    """
+    Bounds the number of in-flight LLM requests and retries requests that were
+    rejected by the provider's rate limit with exponential backoff.
+
+    A single limiter can be shared by all pipeline runs of one event loop.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = 4,
+        max_retries: int = 5,
+        initial_backoff: float = 1.0,
+        max_backoff: float = 60.0,
+    ) -> None:
+        self.max_in_flight: int = max_in_flight
+        self.max_retries: int = max_retries
+        self.initial_backoff: float = initial_backoff
+        self.max_backoff: float = max_backoff
+        self.rate_limited_requests: int = 0
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+
+    def _get_backoff(self, attempt: int, error: openai.RateLimitError) -> float:
+        retry_after: str | None = (
+            error.response.headers.get("retry-after") if error.response else None
+        )
+        if retry_after is not None:
+            try:
+                return min(float(retry_after), self.max_backoff)
+            except ValueError:
+                pass
+        backoff: float = min(self.initial_backoff * 2**attempt, self.max_backoff)
+        return backoff * random.uniform(0.5, 1.0)
+
+    async def run(
+        self,
+        request: Callable[[], Awaitable[T]],
+        on_retry: Callable[[], None] | None = None,
+    ) -> T:
+        attempt: int = 0
+        while True:
+            async with self._semaphore:
+                try:
+                    return await request()
+                except openai.RateLimitError as error:
+                    if attempt >= self.max_retries:
+                        raise
+                    self.rate_limited_requests += 1
+                    if on_retry is not None:
+                        on_retry()
+                    backoff: float = self._get_backoff(attempt, error)
+            # Waits outside the semaphore so other requests can proceed.
+            await asyncio.sleep(backoff)
+            attempt += 1
@@ -0,0 +1,208 @@
+import json
+import re
+from typing import Iterable
+
+from pydantic import BaseModel, Field
+
+from chunking import get_ordnungszahl, get_ordnungszahl_depth
+from models import LvLine, LvPosition
+
+QUANTITY_PATTERN: str = r"\d{1,3}(?:\.\d{3})*(?:,\d{1,3})?"
+UNIT_PATTERN: str = r"[A-Za-zÄÖÜäöü][A-Za-zÄÖÜäöü²³0-9/.\-]{0,7}"
+
+# "2,000 Stk ......................... ........................." or
+# "1,000 Stk ......................... Nur Einh.-Pr.", optionally preceded by
+# the end of the description on the same line.
+QUANTITY_LINE_PATTERN: re.Pattern = re.compile(
+    rf"^(?P<text>.*?)\s*(?P<quantity>{QUANTITY_PATTERN})\s+(?P<unit>{UNIT_PATTERN})"
+    r"\s+(?:\.{5,}|Nur Einh)"
+)
+QUANTITY_WORD_PATTERN: re.Pattern = re.compile(rf"^{QUANTITY_PATTERN}$")
+UNIT_WORD_PATTERN: re.Pattern = re.compile(rf"^{UNIT_PATTERN}$")
+SUM_LINE_PATTERN: re.Pattern = re.compile(r"^\s*Summe\b", re.IGNORECASE)
+IGNORED_LINE_PATTERNS: list[re.Pattern] = [
+    re.compile(r"^\s*Druckdatum\b", re.IGNORECASE),
+    re.compile(r"^\s*Seite:?\s*\d+\s*(von\s*\d+)?\s*$", re.IGNORECASE),
+    re.compile(r"^\s*Ordnungszahl\s+Leistungsbeschreibung\b", re.IGNORECASE),
+]
+
+# Parser results below this confidence are handed to the LLM extraction stage.
+MIN_PARSER_CONFIDENCE: float = 0.9
+
+
+class LvParseResult(BaseModel):
+    positions: list[LvPosition] = Field(description="The extracted positions.")
+    confidence: float = Field(
+        description="Share of positions that are terminated by a quantity line. Between 0.0 and 1.0."
+    )
+
+    def to_extraction_output(self) -> str:
+        return positions_to_extraction_output(self.positions)
+
+
+def positions_to_extraction_output(positions: list[LvPosition]) -> str:
+    """
+    Serializes the positions like the output of the LLM extraction stage.
+    """
+    return json.dumps(
+        [position.model_dump(exclude_none=True) for position in positions],
+        ensure_ascii=False,
+        indent=2,
+    )
+
+
+def parse_quantity(value: str) -> float:
+    return float(value.replace(".", "").replace(",", "."))
+
+
+def _is_ignored_line(line: str) -> bool:
+    return any(pattern.search(line) for pattern in IGNORED_LINE_PATTERNS)
+
+
+def get_line_key(line: str) -> str:
+    return " ".join(line.split())
+
+
+def words_to_quantity_lines(
+    words: list[dict],
+    page_width: float,
+    quantity_column_start: float = 0.4,
+    line_tolerance: float = 2.0,
+) -> dict[str, LvLine]:
+    """
+    Groups the pdfplumber words of a page into lines and takes the quantity
+    and unit from their columns instead of recovering them from the line
+    text. Returns the lines that have both, keyed by `get_line_key` of their
+    text.
+    """
+    rows: list[list[dict]] = []
+    for word in sorted(words, key=lambda word: (word["top"], word["x0"])):
+        if rows and abs(rows[-1][0]["top"] - word["top"]) <= line_tolerance:
+            rows[-1].append(word)
+        else:
+            rows.append([word])
+
+    quantity_lines: dict[str, LvLine] = {}
+    for row in rows:
+        row.sort(key=lambda word: word["x0"])
+        for i, word in enumerate(row[:-1]):
+            following_text: str = row[i + 2]["text"] if i + 2 < len(row) else ""
+            if (
+                QUANTITY_WORD_PATTERN.match(word["text"])
+                and UNIT_WORD_PATTERN.match(row[i + 1]["text"])
+                and (
+                    word["x0"] >= page_width * quantity_column_start
+                    or following_text.startswith((".....", "Nur"))
+                )
+            ):
+                quantity_lines[get_line_key(" ".join(w["text"] for w in row))] = LvLine(
+                    text=" ".join(w["text"] for w in row[:i]),
+                    quantity=parse_quantity(word["text"]),
+                    quantity_unit=row[i + 1]["text"],
+                )
+                break
+    return quantity_lines
+
+
+def text_to_lv_lines(
+    text: str, quantity_lines: dict[str, LvLine] | None = None
+) -> list[LvLine]:
+    """
+    Splits the quantity and unit columns off the lines of `get_pdf_content`,
+    which has already removed the page headers and footers. Lines found in
+    the `quantity_lines` read from the word positions of the PDF take their
+    columns from there, the others are matched against
+    `QUANTITY_LINE_PATTERN`.
+    """
+    quantity_lines = quantity_lines or {}
+    lv_lines: list[LvLine] = []
+    for line in text.splitlines():
+        # Blank lines only separate the pages.
+        if not line.strip():
+            continue
+        quantity_line: LvLine | None = quantity_lines.get(get_line_key(line))
+        if quantity_line is not None:
+            lv_lines.append(quantity_line)
+            continue
+        match = QUANTITY_LINE_PATTERN.match(line)
+        if match:
+            lv_lines.append(
+                LvLine(
+                    text=match.group("text"),
+                    quantity=parse_quantity(match.group("quantity")),
+                    quantity_unit=match.group("unit"),
+                )
+            )
+        else:
+            lv_lines.append(LvLine(text=line))
+    return lv_lines
+
+
+def parse_lv_lines(lv_lines: Iterable[LvLine]) -> LvParseResult:
+    """
+    Applies the rules of the LLM extraction prompt: a position starts at an
+    Ordnungszahl with at least three levels, its description runs until the
+    quantity line, the next Ordnungszahl, a title or a sum line.
+    """
+    positions: list[LvPosition] = []
+    terminated_positions: int = 0
+    current_ordnungszahl: str | None = None
+    description_lines: list[str] = []
+
+    def close_position(
+        quantity: float | None = None, quantity_unit: str | None = None
+    ) -> None:
+        nonlocal current_ordnungszahl, description_lines, terminated_positions
+        if current_ordnungszahl is None:
+            return
+        while description_lines and not description_lines[-1].strip():
+            description_lines.pop()
+        positions.append(
+            LvPosition(
+                ordnungszahl=current_ordnungszahl,
+                beschreibung="\n".join(description_lines),
+                quantity=quantity,
+                quantity_unit=quantity_unit,
+            )
+        )
+        if quantity is not None:
+            terminated_positions += 1
+        current_ordnungszahl, description_lines = None, []
+
+    for lv_line in lv_lines:
+        line: str = lv_line.text
+        if _is_ignored_line(line):
+            continue
+
+        ordnungszahl: str | None = get_ordnungszahl(line)
+        if ordnungszahl is not None:
+            close_position()
+            if get_ordnungszahl_depth(ordnungszahl) >= 3:
+                current_ordnungszahl = ordnungszahl.rstrip(".")
+                description_lines = [line.strip()[len(ordnungszahl) :].strip()]
+            if lv_line.quantity is not None:
+                close_position(lv_line.quantity, lv_line.quantity_unit)
+            continue
+
+        if SUM_LINE_PATTERN.match(line):
+            close_position()
+            continue
+
+        if current_ordnungszahl is None:
+            continue
+
+        if line.strip() or description_lines:
+            description_lines.append(line.rstrip())
+        if lv_line.quantity is not None:
+            close_position(lv_line.quantity, lv_line.quantity_unit)
+
+    close_position()
+
+    confidence: float = terminated_positions / len(positions) if positions else 0.0
+    return LvParseResult(positions=positions, confidence=confidence)
+
+
+def parse_lv_text(
+    text: str, quantity_lines: dict[str, LvLine] | None = None
+) -> LvParseResult:
+    return parse_lv_lines(text_to_lv_lines(text, quantity_lines))
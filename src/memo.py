@@ -0,0 +1,190 @@
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Literal
+
+from pydantic import BaseModel, Field
+
+from cache import content_hash
+from lv_parser import QUANTITY_LINE_PATTERN
+from models import LvPosition, QuotationItem, QuotationItems
+from tracing import METRICS
+
+ORDNUNGSZAHL_PATTERN: re.Pattern = re.compile(r"\b\d{1,3}(?:\.[0-9A-Z]{1,4}){2,}\.?")
+
+
+class MemoEntry(BaseModel):
+    is_door_related: bool = Field(
+        description="False if the categorization left the position out."
+    )
+    sku: str | None = Field(default=None)
+    name: str = Field(default="")
+    is_door_product_confidence: float = Field(default=0.0)
+
+
+def normalize_position_text(text: str) -> str:
+    """
+    Lower-cases the position text and drops markup, Ordnungszahlen, the
+    trailing quantity line and whitespace differences, so the same standard
+    text matches across tenders. Dimensions in the text stay part of it.
+    """
+    lines: list[str] = text.replace("<br/>", "\n").rstrip().splitlines()
+    if lines:
+        match = QUANTITY_LINE_PATTERN.match(lines[-1])
+        if match:
+            lines[-1] = match.group("text")
+    text = " ".join(lines).lower()
+    text = ORDNUNGSZAHL_PATTERN.sub(" ", text)
+    return " ".join(text.split())
+
+
+def get_confirmed_memo_entry(
+    quotation_items: QuotationItems, index: int, edited_item: QuotationItem
+) -> tuple[str, MemoEntry] | None:
+    """
+    Pairs the text of the position of an item corrected by the user with the
+    correction. Returns None if the pipeline didn't parse the positions.
+    """
+    ordnungszahl: str = (
+        quotation_items.items[index].commission.removeprefix("LV-POS.").strip()
+    )
+    position_text: str | None = quotation_items.position_texts.get(ordnungszahl)
+    if position_text is None:
+        return None
+    return position_text, MemoEntry(
+        is_door_related=True,
+        sku=edited_item.sku,
+        name=edited_item.name,
+        is_door_product_confidence=edited_item.is_door_product_confidence,
+    )
+
+
+def get_memo_entries(
+    positions: list[LvPosition], quotation_items: list[QuotationItem]
+) -> list[tuple[str, MemoEntry]]:
+    """
+    Pairs the text of each categorized position with its result. Positions
+    without an item were judged not door-related.
+    """
+    items_by_ordnungszahl: dict[str, QuotationItem] = {
+        quotation_item.commission.removeprefix("LV-POS.").strip(): quotation_item
+        for quotation_item in quotation_items
+    }
+    entries: list[tuple[str, MemoEntry]] = []
+    for position in positions:
+        quotation_item: QuotationItem | None = items_by_ordnungszahl.get(
+            position.ordnungszahl
+        )
+        entries.append(
+            (
+                position.beschreibung,
+                (
+                    MemoEntry(
+                        is_door_related=True,
+                        sku=quotation_item.sku,
+                        name=quotation_item.name,
+                        is_door_product_confidence=(
+                            quotation_item.is_door_product_confidence
+                        ),
+                    )
+                    if quotation_item is not None
+                    else MemoEntry(is_door_related=False)
+                ),
+            )
+        )
+    return entries
+
+
+class ClassificationMemo:
+    """
+    Persistent, SQLite-backed map from normalized position texts to their
+    categorization, shared by all documents.
+
+    Entries learned from the LLM only count for the categorization prompt
+    version they were created with, entries confirmed by a user in the edit
+    dialog count for every version and take precedence.
+    """
+
+    def __init__(self, path: Path, prompt_version: str) -> None:
+        self.path: Path = Path(path)
+        self.prompt_version: str = prompt_version
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection: sqlite3.Connection = sqlite3.connect(
+            self.path, check_same_thread=False
+        )
+        with self._lock, self._connection:
+            self._connection.execute("""
+                CREATE TABLE IF NOT EXISTS classifications (
+                    text_hash TEXT NOT NULL,
+                    prompt_version TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    entry TEXT NOT NULL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (text_hash, prompt_version)
+                )
+                """)
+            # Entries of earlier prompt versions can never be hit again.
+            self._connection.execute(
+                "DELETE FROM classifications WHERE source = 'llm'"
+                " AND prompt_version != ?",
+                (prompt_version,),
+            )
+
+    def get_many(self, texts: list[str]) -> list[MemoEntry | None]:
+        text_hashes: list[str] = [
+            content_hash(normalize_position_text(text)) for text in texts
+        ]
+        entries: dict[str, MemoEntry] = {}
+        with self._lock:
+            for start in range(0, len(text_hashes), 500):
+                batch: list[str] = text_hashes[start : start + 500]
+                rows = self._connection.execute(
+                    "SELECT text_hash, entry FROM classifications"
+                    f" WHERE text_hash IN ({','.join('?' * len(batch))})"
+                    " AND (prompt_version = ? OR source = 'confirmed')"
+                    " ORDER BY source = 'confirmed'",
+                    (*batch, self.prompt_version),
+                ).fetchall()
+                # Confirmed rows come last and override LLM rows.
+                for text_hash, entry in rows:
+                    entries[text_hash] = MemoEntry.model_validate_json(entry)
+        results: list[MemoEntry | None] = [
+            entries.get(text_hash) for text_hash in text_hashes
+        ]
+        hits: int = sum(entry is not None for entry in results)
+        for result, count in [("hit", hits), ("miss", len(results) - hits)]:
+            METRICS.increment(
+                "bytecook_memo_lookups_total",
+                count,
+                help="Positions looked up in the classification memo.",
+                result=result,
+            )
+        return results
+
+    def set_many(
+        self,
+        entries: list[tuple[str, MemoEntry]],
+        source: Literal["llm", "confirmed"] = "llm",
+    ) -> None:
+        prompt_version: str = self.prompt_version if source == "llm" else ""
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO classifications VALUES (?, ?, ?, ?, ?)",
+                [
+                    (
+                        content_hash(normalize_position_text(text)),
+                        prompt_version,
+                        source,
+                        entry.model_dump_json(),
+                        time.time(),
+                    )
+                    for text, entry in entries
+                ],
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
 from typing import List
 
 
@@ -36,12 +36,120 @@ class QuotationItem(BaseModel):
     )
 
 
+class LvPosition(BaseModel):
+    """
+    A position of a service specification document (Leistungsverzeichnis).
+    """
+
+    ordnungszahl: str = Field(
+        description="The position ID in the service specification document.",
+        examples=["1.1.10"],
+    )
+    beschreibung: str = Field(
+        description="The full, possibly multi-line description of the position."
+    )
+    quantity: float | None = Field(
+        default=None, description="The quantity of the position.", examples=[2.0]
+    )
+    quantity_unit: str | None = Field(
+        default=None, description="The unit of the quantity.", examples=["Stk"]
+    )
+
+
+class LvLine(BaseModel):
+    text: str = Field(description="The text of the line without quantity columns.")
+    quantity: float | None = Field(
+        default=None, description="The quantity column, if the line has one."
+    )
+    quantity_unit: str | None = Field(
+        default=None, description="The unit column, if the line has one."
+    )
+
+
+class PdfPage(BaseModel):
+    """
+    The extracted text of a single PDF page.
+    """
+
+    page_number: int = Field(description="The 1-based page number.")
+    page_count: int = Field(description="The number of pages of the PDF.")
+    text: str = Field(description="The extracted text of the page.")
+    margin_lines: list[str] = Field(
+        default_factory=list,
+        description="Lines located in the top and bottom margins of the page.",
+    )
+    extraction_time: float = Field(
+        description="Wall time in seconds spent extracting the page's text."
+    )
+    quantity_lines: dict[str, LvLine] = Field(
+        default_factory=dict,
+        description="Lines with a quantity and unit in their columns, read from"
+        " the word positions and keyed by their text.",
+    )
+
+
+class PdfContent(BaseModel):
+    """
+    The text of a PDF together with the quantity columns of its lines.
+    """
+
+    text: str = Field(description="The text of all pages, see `get_pdf_content`.")
+    quantity_lines: dict[str, LvLine] = Field(
+        default_factory=dict,
+        description="Lines with a quantity and unit in their columns, read from"
+        " the word positions and keyed by their text.",
+    )
+
+
+class PositionFingerprint(BaseModel):
+    """
+    What a later version of the document is compared to for a position.
+    """
+
+    text_hash: str = Field(description="Hash of the normalized description.")
+    quantity: float | None = Field(default=None)
+    quantity_unit: str | None = Field(default=None)
+
+
 class QuotationItems(BaseModel):
     """
     The list of quotation items.
     """
 
     items: List[QuotationItem] = Field(description="The list of quotation items.")
+    _revision: int = PrivateAttr(default=0)
+    _position_fingerprints: dict[str, PositionFingerprint] = PrivateAttr(
+        default_factory=dict
+    )
+    _position_texts: dict[str, str] = PrivateAttr(default_factory=dict)
+
+    @property
+    def revision(self) -> int:
+        """
+        Incremented by `mark_changed` whenever the items are edited, so data
+        derived from them (e.g. the XML export) can tell that it's stale.
+        """
+        return self._revision
+
+    def mark_changed(self) -> None:
+        self._revision += 1
+
+    @property
+    def position_fingerprints(self) -> dict[str, PositionFingerprint]:
+        """
+        The fingerprints of all positions the items were derived from, keyed by
+        Ordnungszahl, so a revised version of the document can be compared to
+        them. Empty if the pipeline didn't parse the positions.
+        """
+        return self._position_fingerprints
+
+    @property
+    def position_texts(self) -> dict[str, str]:
+        """
+        The descriptions of the positions the items were derived from, keyed by
+        Ordnungszahl, which the classification memo is keyed by.
+        """
+        return self._position_texts
 
 
 def get_fake_quotation_items() -> QuotationItems:
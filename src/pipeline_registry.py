@@ -0,0 +1,27 @@
+import functools
+import importlib
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from pipelines import AbstractPipeline
+
+# Pipelines are referenced by "module:class", so the UI and the XML export
+# start without importing langchain and the OpenAI client.
+PIPELINES: dict[str, str] = {
+    "v1": "pipelines:PipelineV1",
+    "v2": "pipelines:PipelineV2",
+}
+DEFAULT_PIPELINE: str = "v2"
+
+
+@functools.cache
+def get_pipeline(name: str = DEFAULT_PIPELINE) -> type["AbstractPipeline"]:
+    """
+    Imports the pipeline registered as `name` on first use.
+    """
+    if name not in PIPELINES:
+        raise ValueError(
+            f"Unknown pipeline {name!r}, expected one of {', '.join(PIPELINES)}."
+        )
+    module_name, class_name = PIPELINES[name].split(":")
+    return getattr(importlib.import_module(module_name), class_name)
@@ -1,81 +1,72 @@
+import asyncio
+import functools
+import math
 import time
 
 from abc import ABC
 from pathlib import Path
+from typing import Any, Awaitable, Callable, Coroutine, Iterable, TypeVar
 
-from langchain.chains import LLMChain
-from langchain.chat_models import ChatOpenAI
+from langchain_core.exceptions import OutputParserException
+from langchain_core.language_models.chat_models import BaseChatModel
 from langchain_core.output_parsers import PydanticOutputParser
 from langchain_core.prompts import ChatPromptTemplate, PromptTemplate
-from models import QuotationItems
-from streamlit.delta_generator import DeltaGenerator
+from cache import ResultCache, content_hash
+from catalog import SkuCatalog
+from checkpoints import RunCheckpoint
+from chunking import merge_quotation_items, split_lv_blocks, split_lv_text
+from gaeb import GaebDocument, read_gaeb
+from llm import (
+    CallbackRelay,
+    LLMRequestLimiter,
+    get_chat_model,
+    get_shared_event_loop,
+    get_token_usage,
+)
+from lv_parser import (
+    MIN_PARSER_CONFIDENCE,
+    LvParseResult,
+    parse_lv_text,
+    positions_to_extraction_output,
+)
+from memo import ClassificationMemo, get_memo_entries
+from models import (
+    LvLine,
+    LvPosition,
+    PositionFingerprint,
+    QuotationItem,
+    QuotationItems,
+)
+from prefilter import (
+    PrefilterReport,
+    PrefilterResult,
+    get_chapter_titles,
+    parse_extraction_output,
+    prefilter_positions,
+    sort_quotation_items,
+)
+from references import inherit_quotation_items
+from revisions import (
+    PreviousAnalysis,
+    RevisionDiff,
+    carry_over_items,
+    diff_positions,
+    get_position_fingerprint,
+)
+from streaming import IncrementalQuotationItemParser
+from tokens import (
+    OUTPUT_TOKENS_PER_ITEM,
+    RequestPlan,
+    TokenBudget,
+    estimate_tokens,
+    get_token_budget,
+    pack_by_tokens,
+)
+from tracing import Span, Tracer
 
+T = TypeVar("T")
 
-class AbstractPipeline(ABC):
-    @staticmethod
-    def extract_quotation_items_from_pdf(
-        pdf_content: str,
-        openrouter_api_key: str,
-        progress_bar: DeltaGenerator,
-    ) -> QuotationItems:
-        raise NotImplementedError()
-
-
-class PipelineV1(AbstractPipeline):
-    @staticmethod
-    def extract_quotation_items_from_pdf(
-        pdf_content: str,
-        openrouter_api_key: str,
-        progress_bar: DeltaGenerator,
-    ) -> QuotationItems:
-        llm = ChatOpenAI(
-            openai_api_base="https://openrouter.ai/api/v1",
-            openai_api_key=openrouter_api_key,
-            model="openai/gpt-4o-mini",
-        )
-        parser = PydanticOutputParser(pydantic_object=QuotationItems)
-
-        path_to_hackathon_challenge_guidelines = (
-            Path(__file__).parents[1] / "HackathonChallengeGuidelines.md"
-        )
-
-        if not path_to_hackathon_challenge_guidelines.exists():
-            raise FileNotFoundError(
-                f"File not found: {path_to_hackathon_challenge_guidelines}"
-            )
-
-        prompt = PromptTemplate(
-            template=path_to_hackathon_challenge_guidelines.read_text()
-            + "\nThe following description is an excerpt from a service specification document. The specification might contain multiple requirements. Please extract each requirement separately.\n{text}\n{format_instructions}",
-            input_variables=["text"],
-            partial_variables={"format_instructions": parser.get_format_instructions()},
-        )
-
-        chain = LLMChain(llm=llm, prompt=prompt)
-
-        progress_bar.progress(
-            0.5,
-            "🔍 Extracting, analyzing, and structuring relevant content from the PDF...",
-        )
-        output = chain.run(text=pdf_content)
-
-        return parser.parse(output)
-
-
-class PipelineV2(AbstractPipeline):
-    @staticmethod
-    def extract_quotation_items_from_pdf(
-        pdf_content: str,
-        openrouter_api_key: str,
-        progress_bar: DeltaGenerator,
-    ) -> QuotationItems:
-        model = ChatOpenAI(
-            openai_api_base="https://openrouter.ai/api/v1",
-            openai_api_key=openrouter_api_key,
-            model="o4-mini-2025-04-16",
-        )
-
-        extraction_template = """
+EXTRACTION_TEMPLATE: str = """
         Sie sind ein hochspezialisierter Assistent für die Extraktion von Daten aus deutschen Leistungsverzeichnissen (LVs) im Bauwesen. Ihre Hauptaufgabe ist die präzise und vollständige Extraktion von Ordnungszahlen und den dazugehörigen Leistungsbeschreibungen. Ihre Arbeitsweise ist akribisch und detailorientiert, um höchste Genauigkeit zu gewährleisten.
 
         Bitte analysiere den folgenden Textauszug aus einem Leistungsverzeichnis. Extrahiere jede einzelne Position und ihre vollständige Leistungsbeschreibung gemäß den unten stehenden detaillierten Anweisungen und Definitionen.
@@ -125,7 +116,7 @@ class PipelineV2(AbstractPipeline):
 
         Bitte beginne nun mit der Extraktion aus dem folgenden Text:{input_text}"""
 
-        categorization_template = """# Rolle:  
+CATEGORIZATION_TEMPLATE: str = """# Rolle:  
         Sie sind ein hochspezialisierter KI-Assistent **ausschließlich für türbezogene Bauleistungen**. Ihre Aufgabe ist die präzise Filterung und Kategorisierung von LV-Positionen, die **direkt mit Türen** verbunden sind. Ignorieren Sie rigoros alle nicht-türbezogenen Elemente.
 
         # Aufgabe:  
@@ -180,28 +171,1028 @@ class PipelineV2(AbstractPipeline):
         {input_text}
         """
 
-        extraction_prompt = ChatPromptTemplate.from_template(extraction_template)
-        extraction_chain = extraction_prompt | model
+# Repeats the categorization prompt, so its prefix is cached as well and a
+# cut-off answer can be completed.
+REPAIR_TEMPLATE: str = CATEGORIZATION_TEMPLATE + """
+        # Korrektur:
+        Eine frühere Antwort auf diese Aufgabe konnte nicht gelesen werden.
+
+        Fehler:
+        {error}
+
+        Frühere Antwort:
+        {output}
+
+        Gib die vollständige, korrigierte Antwort im oben beschriebenen Format zurück.
+        """
 
-        progress_bar.progress(
-            0.33,
-            "🔍 Extracting and analyzing relevant content from the PDF...",
+
+QUOTATION_ITEMS_PARSER: PydanticOutputParser = PydanticOutputParser(
+    pydantic_object=QuotationItems
+)
+EXTRACTION_PROMPT: ChatPromptTemplate = ChatPromptTemplate.from_template(
+    EXTRACTION_TEMPLATE
+)
+# The variable input comes last, so the static instructions form a stable
+# prefix that provider-side prompt caching can reuse.
+CATEGORIZATION_PROMPT: PromptTemplate = PromptTemplate(
+    template=CATEGORIZATION_TEMPLATE,
+    input_variables=["input_text"],
+    partial_variables={
+        "format_instructions": QUOTATION_ITEMS_PARSER.get_format_instructions()
+    },
+)
+CATEGORIZATION_PROMPT_PREFIX: str = CATEGORIZATION_PROMPT.format(input_text="")
+# Classification memo entries learned with another prompt are discarded.
+CATEGORIZATION_PROMPT_VERSION: str = content_hash(CATEGORIZATION_PROMPT_PREFIX)[:16]
+EXTRACTION_PREFIX_TOKENS: int = estimate_tokens(EXTRACTION_TEMPLATE)
+REPAIR_PROMPT: PromptTemplate = PromptTemplate(
+    template=REPAIR_TEMPLATE,
+    input_variables=["input_text", "error", "output"],
+    partial_variables={
+        "format_instructions": QUOTATION_ITEMS_PARSER.get_format_instructions()
+    },
+)
+CATEGORIZATION_PREFIX_TOKENS: int = estimate_tokens(CATEGORIZATION_PROMPT_PREFIX)
+
+
+@functools.cache
+def _get_pipeline_v1_prompt() -> PromptTemplate:
+    path_to_hackathon_challenge_guidelines = (
+        Path(__file__).parents[1] / "HackathonChallengeGuidelines.md"
+    )
+
+    if not path_to_hackathon_challenge_guidelines.exists():
+        raise FileNotFoundError(
+            f"File not found: {path_to_hackathon_challenge_guidelines}"
         )
-        extraction_result = extraction_chain.invoke({"input_text": pdf_content})
 
-        parser = PydanticOutputParser(pydantic_object=QuotationItems)
-        classifcation_prompt = PromptTemplate(
-            template=categorization_template,
-            input_variables=["input_text"],
-            partial_variables={"format_instructions": parser.get_format_instructions()},
+    return PromptTemplate(
+        template=path_to_hackathon_challenge_guidelines.read_text()
+        + "\n{format_instructions}\nThe following description is an excerpt from a service specification document. The specification might contain multiple requirements. Please extract each requirement separately.\n{text}",
+        input_variables=["text"],
+        partial_variables={
+            "format_instructions": QUOTATION_ITEMS_PARSER.get_format_instructions()
+        },
+    )
+
+
+def _record_token_usage(
+    span: Span, prompt: str, output: str, message: Any | None = None
+) -> None:
+    token_usage: tuple[int, int] | None = (
+        get_token_usage(message) if message is not None else None
+    )
+    if token_usage is None:
+        span.set(
+            prompt_tokens=estimate_tokens(prompt),
+            completion_tokens=estimate_tokens(output),
+            estimated_tokens=True,
         )
-        classifcation_chain = classifcation_prompt | model
+    else:
+        span.set(prompt_tokens=token_usage[0], completion_tokens=token_usage[1])
+
+
+def _get_position_input_tokens(position: LvPosition) -> int:
+    return estimate_tokens(positions_to_extraction_output([position]))
+
+
+def _get_position_output_tokens(position: LvPosition) -> int:
+    # The item repeats the position text next to its SKU, name and quantity.
+    return estimate_tokens(position.beschreibung) + OUTPUT_TOKENS_PER_ITEM
+
 
-        progress_bar.progress(
-            0.66, "🛠️ Classifying and structuring detected requirements..."
+def _estimate_answer_tokens(text: str) -> int:
+    # Without parsed positions, each block of the text counts as one item.
+    return estimate_tokens(text) + len(split_lv_blocks(text)) * OUTPUT_TOKENS_PER_ITEM
+
+
+def pack_positions(
+    positions: list[LvPosition], budget: TokenBudget
+) -> list[list[LvPosition]]:
+    """
+    Groups the positions into categorization requests within `budget`.
+    """
+    return pack_by_tokens(
+        positions,
+        _get_position_input_tokens,
+        _get_position_output_tokens,
+        CATEGORIZATION_PREFIX_TOKENS,
+        budget,
+    )
+
+
+def _run_on_shared_loop(
+    run: Callable[
+        [Tracer, Callable[[QuotationItem], None] | None],
+        Coroutine[Any, Any, QuotationItems],
+    ],
+    tracer: Tracer | None,
+    on_item: Callable[[QuotationItem], None] | None,
+) -> QuotationItems:
+    # The run executes on the process-wide event loop so its pooled
+    # connections are shared; callbacks are relayed back to this thread.
+    relay: CallbackRelay = CallbackRelay()
+    tracer = tracer or Tracer()
+    on_event = tracer.on_event
+    tracer.on_event = relay.wrap(on_event)
+    try:
+        future = asyncio.run_coroutine_threadsafe(
+            run(tracer, relay.wrap(on_item)), get_shared_event_loop()
         )
-        categorization_result = classifcation_chain.invoke(
-            {"input_text": extraction_result.content}
+        return relay.wait(future)
+    finally:
+        tracer.on_event = on_event
+
+
+def _get_stage_output(
+    stage: str, key: str, cache: ResultCache | None, checkpoint: RunCheckpoint | None
+) -> str | None:
+    # The checkpoint comes first, as the cache may be disabled or have evicted
+    # the entry since the run started.
+    output: str | None = checkpoint.get(stage, key) if checkpoint else None
+    if output is None and cache is not None:
+        output = cache.get(stage, key)
+        if output is not None and checkpoint is not None:
+            checkpoint.set(stage, key, output)
+    return output
+
+
+def _set_stage_output(
+    stage: str,
+    key: str,
+    output: str,
+    cache: ResultCache | None,
+    checkpoint: RunCheckpoint | None,
+) -> None:
+    for store in [checkpoint, cache]:
+        if store is not None:
+            store.set(stage, key, output)
+
+
+async def _gather_all(awaitables: Iterable[Awaitable[T]]) -> list[T]:
+    """
+    Like `asyncio.gather`, but lets all awaitables finish before raising the
+    first error, so the results of the others are checkpointed.
+    """
+    results: list[T | BaseException] = await asyncio.gather(
+        *awaitables, return_exceptions=True
+    )
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return results
+
+
+def _emit_items(
+    quotation_items: list[QuotationItem],
+    on_item: Callable[[QuotationItem], None] | None,
+) -> None:
+    if on_item is not None:
+        for quotation_item in quotation_items:
+            on_item(quotation_item)
+
+
+class AbstractPipeline(ABC):
+    MODEL: str
+
+    @classmethod
+    def extract_quotation_items_from_pdf(
+        cls,
+        pdf_content: str,
+        openrouter_api_key: str,
+        tracer: Tracer | None = None,
+        cache: ResultCache | None = None,
+        on_item: Callable[[QuotationItem], None] | None = None,
+    ) -> QuotationItems:
+        raise NotImplementedError()
+
+
+class PipelineV1(AbstractPipeline):
+    MODEL: str = "openai/gpt-4o-mini"
+
+    @classmethod
+    def extract_quotation_items_from_pdf(
+        cls,
+        pdf_content: str,
+        openrouter_api_key: str,
+        tracer: Tracer | None = None,
+        cache: ResultCache | None = None,
+        on_item: Callable[[QuotationItem], None] | None = None,
+    ) -> QuotationItems:
+        tracer = tracer or Tracer()
+        llm: BaseChatModel = get_chat_model(openrouter_api_key, cls.MODEL)
+        prompt: PromptTemplate = _get_pipeline_v1_prompt()
+
+        with tracer.span("pipeline", pipeline=cls.__name__, model=cls.MODEL) as span:
+            cache_key: str = content_hash(
+                pdf_content, cls.__name__, cls.MODEL, prompt.format(text="")
+            )
+            if cache is not None:
+                cached_output: str | None = cache.get("quotation_items", cache_key)
+                span.set(cache_hit=cached_output is not None)
+                if cached_output is not None:
+                    quotation_items: QuotationItems = (
+                        QuotationItems.model_validate_json(cached_output)
+                    )
+                    _emit_items(quotation_items.items, on_item)
+                    return quotation_items
+
+            # The legacy chains package is only loaded when this pipeline runs.
+            from langchain.chains import LLMChain
+
+            chain = LLMChain(llm=llm, prompt=prompt)
+
+            # The answer repeats about the whole text, so a document exceeding
+            # either budget is sent in chunks.
+            token_budget: TokenBudget = get_token_budget(cls.MODEL)
+            prefix_tokens: int = estimate_tokens(prompt.format(text=""))
+            pdf_tokens: int = estimate_tokens(pdf_content)
+            answer_tokens: int = _estimate_answer_tokens(pdf_content)
+            chunks: list[str] = [pdf_content]
+            if not token_budget.fits(prefix_tokens + pdf_tokens, answer_tokens):
+                chunk_count: int = max(
+                    math.ceil(
+                        pdf_tokens / (token_budget.max_input_tokens - prefix_tokens)
+                    ),
+                    math.ceil(answer_tokens / token_budget.max_output_tokens),
+                )
+                chunks = split_lv_text(
+                    pdf_content, max_chars=len(pdf_content) // chunk_count
+                )
+            plan: RequestPlan = RequestPlan()
+            for chunk in chunks:
+                plan.add_request(
+                    token_budget,
+                    prefix_tokens + estimate_tokens(chunk),
+                    _estimate_answer_tokens(chunk),
+                )
+            span.set(planned_calls=plan.calls, estimated_cost=plan.cost)
+
+            tracer.progress(
+                "pipeline",
+                0,
+                len(chunks),
+                "🔍 Extracting, analyzing, and structuring relevant content from the PDF"
+                f" (up to {plan.calls} LLM calls, ~${plan.cost:.2f})...",
+            )
+            chunk_results: list[QuotationItems] = []
+            for chunk in chunks:
+                with tracer.span(
+                    "llm_call", model=cls.MODEL, stage="quotation_items"
+                ) as llm_span:
+                    output = chain.run(text=chunk)
+                    _record_token_usage(llm_span, prompt.format(text=chunk), output)
+
+                with tracer.span(
+                    "validation", stage="quotation_items"
+                ) as validation_span:
+                    chunk_results.append(QUOTATION_ITEMS_PARSER.parse(output))
+                    validation_span.set(items=len(chunk_results[-1].items))
+            quotation_items = merge_quotation_items(chunk_results)
+            if cache is not None:
+                cache.set(
+                    "quotation_items", cache_key, quotation_items.model_dump_json()
+                )
+            _emit_items(quotation_items.items, on_item)
+            tracer.progress(
+                "pipeline",
+                len(chunks),
+                len(chunks),
+                f"📦 Found {len(quotation_items.items)} quotation items",
+            )
+            return quotation_items
+
+
+class PipelineV2(AbstractPipeline):
+    MODEL: str = "o4-mini-2025-04-16"
+    PROMPT_VERSION: str = CATEGORIZATION_PROMPT_VERSION
+    # Categorization requests asked again after a malformed answer.
+    MAX_PARSE_RETRIES: int = 2
+
+    @classmethod
+    def extract_quotation_items_from_pdf(
+        cls,
+        pdf_content: str,
+        openrouter_api_key: str,
+        tracer: Tracer | None = None,
+        cache: ResultCache | None = None,
+        on_item: Callable[[QuotationItem], None] | None = None,
+        chunked: bool = False,
+        max_chunk_chars: int = 12_000,
+        max_concurrency: int = 4,
+        catalog: SkuCatalog | None = None,
+        memo: ClassificationMemo | None = None,
+        token_budget: TokenBudget | None = None,
+        previous: PreviousAnalysis | None = None,
+        checkpoint: RunCheckpoint | None = None,
+        repair_output: bool = True,
+        quantity_lines: dict[str, LvLine] | None = None,
+    ) -> QuotationItems:
+        return _run_on_shared_loop(
+            lambda tracer, on_item: cls.aextract_quotation_items_from_pdf(
+                pdf_content,
+                openrouter_api_key,
+                tracer=tracer,
+                cache=cache,
+                on_item=on_item,
+                chunked=chunked,
+                max_chunk_chars=max_chunk_chars,
+                limiter=LLMRequestLimiter(max_in_flight=max_concurrency),
+                catalog=catalog,
+                memo=memo,
+                token_budget=token_budget,
+                previous=previous,
+                checkpoint=checkpoint,
+                repair_output=repair_output,
+                quantity_lines=quantity_lines,
+            ),
+            tracer,
+            on_item,
+        )
+
+    @classmethod
+    def extract_quotation_items_from_gaeb(
+        cls,
+        gaeb_path: Path,
+        openrouter_api_key: str,
+        tracer: Tracer | None = None,
+        cache: ResultCache | None = None,
+        on_item: Callable[[QuotationItem], None] | None = None,
+        max_chunk_chars: int = 12_000,
+        max_concurrency: int = 4,
+        catalog: SkuCatalog | None = None,
+        memo: ClassificationMemo | None = None,
+        token_budget: TokenBudget | None = None,
+        previous: PreviousAnalysis | None = None,
+        checkpoint: RunCheckpoint | None = None,
+        repair_output: bool = True,
+    ) -> QuotationItems:
+        return _run_on_shared_loop(
+            lambda tracer, on_item: cls.aextract_quotation_items_from_gaeb(
+                gaeb_path,
+                openrouter_api_key,
+                tracer=tracer,
+                cache=cache,
+                on_item=on_item,
+                max_chunk_chars=max_chunk_chars,
+                limiter=LLMRequestLimiter(max_in_flight=max_concurrency),
+                catalog=catalog,
+                memo=memo,
+                token_budget=token_budget,
+                previous=previous,
+                checkpoint=checkpoint,
+                repair_output=repair_output,
+            ),
+            tracer,
+            on_item,
+        )
+
+    @classmethod
+    async def aextract_quotation_items_from_pdf(
+        cls,
+        pdf_content: str,
+        openrouter_api_key: str,
+        tracer: Tracer | None = None,
+        cache: ResultCache | None = None,
+        on_item: Callable[[QuotationItem], None] | None = None,
+        chunked: bool = False,
+        max_chunk_chars: int = 12_000,
+        limiter: LLMRequestLimiter | None = None,
+        catalog: SkuCatalog | None = None,
+        memo: ClassificationMemo | None = None,
+        token_budget: TokenBudget | None = None,
+        previous: PreviousAnalysis | None = None,
+        checkpoint: RunCheckpoint | None = None,
+        repair_output: bool = True,
+        quantity_lines: dict[str, LvLine] | None = None,
+    ) -> QuotationItems:
+        """
+        Async variant for callers that run several documents in one event loop
+        and share a `limiter` to bound the LLM requests across all of them.
+        Ambiguous positions categorized before, according to `memo`, or
+        similar to an entry of `catalog` get their SKU without an LLM call.
+        The remaining positions are packed into requests within `token_budget`,
+        by default the budget of the model. The local parser takes quantities
+        from the `quantity_lines` of `read_pdf_content` where it has them.
+        """
+        tracer = tracer or Tracer()
+        model: BaseChatModel = get_chat_model(openrouter_api_key, cls.MODEL)
+        token_budget = token_budget or get_token_budget(cls.MODEL)
+
+        # The runs of all sessions share one event loop, so the CPU-bound
+        # parsing runs in a worker thread.
+        chunks, parse_results, chapter_titles = await asyncio.to_thread(
+            cls._prepare_chunks,
+            pdf_content,
+            chunked,
+            max_chunk_chars,
+            token_budget,
+            tracer,
+            quantity_lines,
+        )
+        with tracer.span(
+            "pipeline", pipeline=cls.__name__, model=cls.MODEL, chunks=len(chunks)
+        ) as span:
+            quotation_items: QuotationItems = await cls._aextract_quotation_items(
+                model,
+                chunks,
+                parse_results,
+                chapter_titles,
+                tracer,
+                cache,
+                on_item,
+                limiter or LLMRequestLimiter(),
+                catalog,
+                memo,
+                token_budget,
+                previous,
+                checkpoint,
+                repair_output,
+            )
+            span.set(items=len(quotation_items.items))
+            return quotation_items
+
+    @classmethod
+    async def aextract_quotation_items_from_gaeb(
+        cls,
+        gaeb_path: Path,
+        openrouter_api_key: str,
+        tracer: Tracer | None = None,
+        cache: ResultCache | None = None,
+        on_item: Callable[[QuotationItem], None] | None = None,
+        max_chunk_chars: int = 12_000,
+        limiter: LLMRequestLimiter | None = None,
+        catalog: SkuCatalog | None = None,
+        memo: ClassificationMemo | None = None,
+        token_budget: TokenBudget | None = None,
+        previous: PreviousAnalysis | None = None,
+        checkpoint: RunCheckpoint | None = None,
+        repair_output: bool = True,
+    ) -> QuotationItems:
+        """
+        Categorizes the positions of a GAEB DA XML file (X83/X84). They are
+        read as structured data, so only the categorization may need the LLM.
+        """
+        tracer = tracer or Tracer()
+        model: BaseChatModel = get_chat_model(openrouter_api_key, cls.MODEL)
+        token_budget = token_budget or get_token_budget(cls.MODEL)
+
+        with tracer.span("gaeb_parse") as span:
+            document: GaebDocument = await asyncio.to_thread(
+                read_gaeb, gaeb_path, max_chunk_chars
+            )
+            span.set(positions=sum(len(chunk) for chunk in document.chunks))
+        chunks: list[str] = await asyncio.to_thread(
+            lambda: [positions_to_extraction_output(chunk) for chunk in document.chunks]
+        )
+        with tracer.span(
+            "pipeline",
+            pipeline=cls.__name__,
+            model=cls.MODEL,
+            chunks=len(document.chunks),
+        ) as span:
+            quotation_items: QuotationItems = await cls._aextract_quotation_items(
+                model,
+                chunks,
+                [
+                    LvParseResult(positions=chunk, confidence=1.0)
+                    for chunk in document.chunks
+                ],
+                [document.chapter_titles] * len(document.chunks),
+                tracer,
+                cache,
+                on_item,
+                limiter or LLMRequestLimiter(),
+                catalog,
+                memo,
+                token_budget,
+                previous,
+                checkpoint,
+                repair_output,
+            )
+            span.set(items=len(quotation_items.items))
+            return quotation_items
+
+    @classmethod
+    def plan_requests(
+        cls,
+        pdf_content: str,
+        chunked: bool = False,
+        max_chunk_chars: int = 12_000,
+        token_budget: TokenBudget | None = None,
+        quantity_lines: dict[str, LvLine] | None = None,
+    ) -> RequestPlan:
+        """
+        Estimates the LLM requests of a run without sending any. Positions that
+        are decided locally only lower the actual number.
+        """
+        token_budget = token_budget or get_token_budget(cls.MODEL)
+        chunks: list[str] = cls._split_pdf_content(
+            pdf_content, chunked, max_chunk_chars, token_budget
+        )
+        return cls._plan_requests(
+            chunks,
+            [parse_lv_text(chunk, quantity_lines) for chunk in chunks],
+            token_budget,
+        )
+
+    @classmethod
+    def _prepare_chunks(
+        cls,
+        pdf_content: str,
+        chunked: bool,
+        max_chunk_chars: int,
+        token_budget: TokenBudget,
+        tracer: Tracer,
+        quantity_lines: dict[str, LvLine] | None = None,
+    ) -> tuple[list[str], list[LvParseResult], list[dict[str, str]]]:
+        chunks: list[str] = cls._split_pdf_content(
+            pdf_content, chunked, max_chunk_chars, token_budget
+        )
+        return (
+            chunks,
+            [cls._parse_locally(chunk, tracer, quantity_lines) for chunk in chunks],
+            [get_chapter_titles(chunk) for chunk in chunks],
+        )
+
+    @staticmethod
+    def _split_pdf_content(
+        pdf_content: str, chunked: bool, max_chunk_chars: int, token_budget: TokenBudget
+    ) -> list[str]:
+        # A document too large for a single extraction request is chunked anyway.
+        if chunked or not token_budget.fits(
+            EXTRACTION_PREFIX_TOKENS + estimate_tokens(pdf_content),
+            _estimate_answer_tokens(pdf_content),
+        ):
+            return split_lv_text(pdf_content, max_chars=max_chunk_chars)
+        return [pdf_content]
+
+    @staticmethod
+    def _plan_requests(
+        chunks: list[str],
+        parse_results: list[LvParseResult],
+        token_budget: TokenBudget,
+    ) -> RequestPlan:
+        plan: RequestPlan = RequestPlan()
+        for chunk, parse_result in zip(chunks, parse_results):
+            if parse_result.confidence >= MIN_PARSER_CONFIDENCE:
+                for positions in pack_positions(parse_result.positions, token_budget):
+                    plan.add_request(
+                        token_budget,
+                        CATEGORIZATION_PREFIX_TOKENS
+                        + sum(map(_get_position_input_tokens, positions)),
+                        sum(map(_get_position_output_tokens, positions)),
+                    )
+                continue
+            # The extraction answer repeats about the whole chunk, which is then
+            # categorized in as many requests as the budget requires.
+            chunk_tokens: int = estimate_tokens(chunk)
+            answer_tokens: int = _estimate_answer_tokens(chunk)
+            plan.add_request(
+                token_budget, EXTRACTION_PREFIX_TOKENS + chunk_tokens, answer_tokens
+            )
+            request_count: int = max(
+                1,
+                math.ceil(
+                    answer_tokens
+                    / max(
+                        token_budget.max_input_tokens - CATEGORIZATION_PREFIX_TOKENS, 1
+                    )
+                ),
+                math.ceil(answer_tokens / token_budget.max_output_tokens),
+            )
+            for _ in range(request_count):
+                plan.add_request(
+                    token_budget,
+                    CATEGORIZATION_PREFIX_TOKENS + answer_tokens // request_count,
+                    answer_tokens // request_count,
+                )
+        return plan
+
+    @classmethod
+    async def _aextract_quotation_items(
+        cls,
+        model: BaseChatModel,
+        chunks: list[str],
+        parse_results: list[LvParseResult],
+        chapter_titles: list[dict[str, str]],
+        tracer: Tracer,
+        cache: ResultCache | None,
+        on_item: Callable[[QuotationItem], None] | None,
+        limiter: LLMRequestLimiter,
+        catalog: SkuCatalog | None,
+        memo: ClassificationMemo | None,
+        token_budget: TokenBudget,
+        previous: PreviousAnalysis | None,
+        checkpoint: RunCheckpoint | None,
+        repair_output: bool,
+    ) -> QuotationItems:
+        total_steps: int = 2 * len(chunks)
+        completed_steps: int = 0
+
+        def report_progress(text: str) -> None:
+            tracer.progress("pipeline", completed_steps, total_steps, text)
+
+        prefilter_report: PrefilterReport = PrefilterReport()
+        position_fingerprints: dict[str, PositionFingerprint] = {}
+        position_texts: dict[str, str] = {}
+
+        async def process_chunk(
+            chunk: str, parse_result: LvParseResult, chunk_titles: dict[str, str]
+        ) -> QuotationItems:
+            nonlocal completed_steps, prefilter_report
+            with tracer.span("chunk", chars=len(chunk)):
+                extraction_output: str = await cls._aextract(
+                    model, chunk, parse_result, limiter, cache, checkpoint, tracer
+                )
+                completed_steps += 1
+                report_progress(
+                    "🛠️ Classifying and structuring detected requirements..."
+                )
+
+                # Clear cases are decided locally, only ambiguous positions are sent
+                # to the categorization model.
+                positions: list[LvPosition] | None = await asyncio.to_thread(
+                    parse_extraction_output, extraction_output
+                )
+                if positions is None:
+                    quotation_items: QuotationItems = await cls._acategorize(
+                        model,
+                        extraction_output,
+                        limiter,
+                        cache,
+                        checkpoint,
+                        repair_output,
+                        on_item,
+                        tracer,
+                    )
+                else:
+                    position_fingerprints.update(
+                        (position.ordnungszahl, get_position_fingerprint(position))
+                        for position in positions
+                    )
+                    position_texts.update(
+                        (position.ordnungszahl, position.beschreibung)
+                        for position in positions
+                    )
+                    # Positions unchanged since the previous analysis keep their
+                    # items, only the others are categorized again.
+                    carried_items: list[QuotationItem] = []
+                    changed_positions: list[LvPosition] = positions
+                    if previous is not None:
+                        carried_items, changed_positions = carry_over_items(
+                            previous, positions
+                        )
+                    with tracer.span("prefilter") as span:
+                        # The catalog and memo lookups block, so they run in a
+                        # worker thread.
+                        prefilter_result: PrefilterResult = await asyncio.to_thread(
+                            prefilter_positions,
+                            changed_positions,
+                            chunk_titles,
+                            catalog,
+                            memo,
+                        )
+                        span.set(**prefilter_result.report.model_dump())
+                    prefilter_report += prefilter_result.report
+                    quotation_items = QuotationItems(
+                        items=carried_items + prefilter_result.preassigned_items
+                    )
+                    _emit_items(quotation_items.items, on_item)
+                    if prefilter_result.llm_positions:
+                        # Positions exceeding one request's token budget are
+                        # categorized in several concurrent requests.
+                        requests: list[list[LvPosition]] = pack_positions(
+                            prefilter_result.llm_positions, token_budget
+                        )
+                        request_results: list[QuotationItems] = await _gather_all(
+                            (
+                                cls._acategorize(
+                                    model,
+                                    (
+                                        extraction_output
+                                        if len(request_positions) == len(positions)
+                                        else positions_to_extraction_output(
+                                            request_positions
+                                        )
+                                    ),
+                                    limiter,
+                                    cache,
+                                    checkpoint,
+                                    repair_output,
+                                    on_item,
+                                    tracer,
+                                )
+                                for request_positions in requests
+                            )
+                        )
+                        llm_items: list[QuotationItem] = [
+                            quotation_item
+                            for request_result in request_results
+                            for quotation_item in request_result.items
+                        ]
+                        quotation_items.items += llm_items
+                        if memo is not None:
+                            await asyncio.to_thread(
+                                memo.set_many,
+                                get_memo_entries(
+                                    prefilter_result.llm_positions, llm_items
+                                ),
+                            )
+                    # Delta positions reuse the SKU of their categorized base.
+                    inherited_items: list[QuotationItem] = inherit_quotation_items(
+                        prefilter_result.references, positions, quotation_items.items
+                    )
+                    _emit_items(inherited_items, on_item)
+                    quotation_items.items = sort_quotation_items(
+                        quotation_items.items + inherited_items, positions
+                    )
+                completed_steps += 1
+                report_progress(
+                    "🛠️ Classifying and structuring detected requirements..."
+                )
+                return quotation_items
+
+        # The local parse also tells how many requests the run needs at most.
+        with tracer.span("request_plan") as span:
+            plan: RequestPlan = cls._plan_requests(chunks, parse_results, token_budget)
+            span.set(**plan.model_dump())
+        report_progress(
+            "🔍 Extracting and analyzing relevant content from the PDF"
+            f" (up to {plan.calls} LLM calls, ~${plan.cost:.2f})..."
+        )
+        # The chunks run concurrently, so the total time follows the slowest
+        # chunk rather than the sum of all chunks.
+        chunk_results: list[QuotationItems] = await _gather_all(
+            (
+                process_chunk(chunk, parse_result, chunk_titles)
+                for chunk, parse_result, chunk_titles in zip(
+                    chunks, parse_results, chapter_titles
+                )
+            )
+        )
+        if prefilter_report.total_positions:
+            details: list[str] = []
+            if prefilter_report.inherited_positions:
+                details.append(
+                    f"{prefilter_report.inherited_positions} as referenced positions"
+                )
+            if prefilter_report.memo_positions:
+                details.append(
+                    f"{prefilter_report.memo_positions} from the classification memo at a"
+                    f" {prefilter_report.memo_positions / prefilter_report.memo_lookups:.0%}"
+                    " hit rate"
+                )
+            if prefilter_report.catalog_positions:
+                details.append(
+                    f"{prefilter_report.catalog_positions} from the SKU catalog"
+                )
+            details_text: str = f" ({', '.join(details)})" if details else ""
+            tracer.progress(
+                "pipeline",
+                completed_steps,
+                total_steps,
+                f"⚡ Decided {prefilter_report.total_positions - prefilter_report.llm_positions}"
+                f" of {prefilter_report.total_positions} positions locally{details_text},"
+                f" saving ~{prefilter_report.saved_tokens} tokens and"
+                f" {prefilter_report.saved_calls} LLM calls",
+            )
+        quotation_items: QuotationItems = merge_quotation_items(chunk_results)
+        quotation_items.position_fingerprints.update(position_fingerprints)
+        quotation_items.position_texts.update(position_texts)
+        if previous is not None:
+            with tracer.span("revision_diff") as span:
+                diff: RevisionDiff = diff_positions(
+                    previous.position_fingerprints, position_fingerprints
+                )
+                span.set(
+                    added=len(diff.added),
+                    changed=len(diff.changed),
+                    requantified=len(diff.requantified),
+                    removed=len(diff.removed),
+                    unchanged=diff.unchanged,
+                )
+            tracer.progress(
+                "pipeline",
+                completed_steps,
+                total_steps,
+                f"♻️ Compared to the previous version: {diff}",
+            )
+        return quotation_items
+
+    @staticmethod
+    def _parse_locally(
+        text: str, tracer: Tracer, quantity_lines: dict[str, LvLine] | None = None
+    ) -> LvParseResult:
+        with tracer.span("local_parse") as span:
+            parse_result: LvParseResult = parse_lv_text(text, quantity_lines)
+            span.set(
+                positions=len(parse_result.positions),
+                confidence=parse_result.confidence,
+            )
+        return parse_result
+
+    @classmethod
+    async def _aextract(
+        cls,
+        model: BaseChatModel,
+        text: str,
+        parse_result: LvParseResult,
+        limiter: LLMRequestLimiter,
+        cache: ResultCache | None,
+        checkpoint: RunCheckpoint | None,
+        tracer: Tracer,
+    ) -> str:
+        # The local parser applies the extraction rules mechanically; the LLM is
+        # only asked when the parser isn't confident about the document layout.
+        if parse_result.confidence >= MIN_PARSER_CONFIDENCE:
+            return parse_result.to_extraction_output()
+
+        # Each stage is keyed by its own input and prompt, so changing one
+        # prompt only invalidates the stage that uses it.
+        extraction_key: str = content_hash(
+            text, cls.__name__, cls.MODEL, EXTRACTION_TEMPLATE
+        )
+        stored_output: str | None = await asyncio.to_thread(
+            _get_stage_output, "extraction", extraction_key, cache, checkpoint
+        )
+        if stored_output is not None:
+            return stored_output
+
+        extraction_chain = EXTRACTION_PROMPT | model
+        with tracer.span("llm_call", model=cls.MODEL, stage="extraction") as span:
+            extraction_result = await limiter.run(
+                lambda: extraction_chain.ainvoke({"input_text": text}),
+                on_retry=lambda: span.increment("retries"),
+            )
+            _record_token_usage(
+                span,
+                EXTRACTION_TEMPLATE + text,
+                extraction_result.content,
+                extraction_result,
+            )
+
+        await asyncio.to_thread(
+            _set_stage_output,
+            "extraction",
+            extraction_key,
+            extraction_result.content,
+            cache,
+            checkpoint,
+        )
+        return extraction_result.content
+
+    @classmethod
+    async def _acategorize(
+        cls,
+        model: BaseChatModel,
+        extraction_output: str,
+        limiter: LLMRequestLimiter,
+        cache: ResultCache | None,
+        checkpoint: RunCheckpoint | None,
+        repair_output: bool,
+        on_item: Callable[[QuotationItem], None] | None,
+        tracer: Tracer,
+    ) -> QuotationItems:
+        categorization_key: str = content_hash(
+            extraction_output, cls.__name__, cls.MODEL, CATEGORIZATION_PROMPT_PREFIX
+        )
+        stored_output: str | None = await asyncio.to_thread(
+            _get_stage_output, "categorization", categorization_key, cache, checkpoint
+        )
+        if stored_output is not None:
+            quotation_items: QuotationItems = QuotationItems.model_validate_json(
+                stored_output
+            )
+            _emit_items(quotation_items.items, on_item)
+            return quotation_items
+
+        classifcation_chain = CATEGORIZATION_PROMPT | model
+        streamed_commissions: set[str] = set()
+
+        async def categorize(stream: bool) -> tuple[str, Any | None]:
+            if not stream:
+                categorization_result = await classifcation_chain.ainvoke(
+                    {"input_text": extraction_output}
+                )
+                return categorization_result.content, categorization_result
+            # Items are handed out as soon as their JSON object is complete;
+            # the returned result still comes from parsing the full output.
+            item_parser = IncrementalQuotationItemParser()
+            async for chunk in classifcation_chain.astream(
+                {"input_text": extraction_output}
+            ):
+                streamed_items: list[QuotationItem] = item_parser.feed(chunk.content)
+                streamed_commissions.update(
+                    quotation_item.commission.strip()
+                    for quotation_item in streamed_items
+                )
+                _emit_items(streamed_items, on_item)
+            return item_parser.buffer, None
+
+        # A malformed answer only repeats this request: the first one is
+        # repaired once, later ones are asked again, while the other requests
+        # keep their results.
+        parse_error: OutputParserException | None = None
+        for attempt in range(cls.MAX_PARSE_RETRIES + 1):
+            # Retries aren't streamed, their new items are emitted below.
+            stream: bool = on_item is not None and attempt == 0
+            with tracer.span(
+                "llm_call",
+                model=cls.MODEL,
+                stage="categorization",
+                streamed=stream,
+                attempt=attempt,
+            ) as span:
+                categorization_output, message = await limiter.run(
+                    functools.partial(categorize, stream),
+                    on_retry=lambda: span.increment("retries"),
+                )
+                _record_token_usage(
+                    span,
+                    CATEGORIZATION_PROMPT_PREFIX + extraction_output,
+                    categorization_output,
+                    message,
+                )
+            try:
+                quotation_items = cls._parse_quotation_items(
+                    categorization_output, tracer
+                )
+                break
+            except OutputParserException as error:
+                parse_error = error
+            if repair_output and attempt == 0:
+                try:
+                    quotation_items = await cls._arepair(
+                        model,
+                        extraction_output,
+                        categorization_output,
+                        parse_error,
+                        limiter,
+                        tracer,
+                    )
+                    break
+                except OutputParserException as error:
+                    parse_error = error
+        else:
+            raise parse_error
+        _emit_items(
+            [
+                quotation_item
+                for quotation_item in quotation_items.items
+                if quotation_item.commission.strip() not in streamed_commissions
+            ],
+            on_item,
+        )
+
+        await asyncio.to_thread(
+            _set_stage_output,
+            "categorization",
+            categorization_key,
+            quotation_items.model_dump_json(),
+            cache,
+            checkpoint,
         )
+        return quotation_items
 
-        return parser.parse(categorization_result.content)
+    @classmethod
+    async def _arepair(
+        cls,
+        model: BaseChatModel,
+        extraction_output: str,
+        output: str,
+        error: OutputParserException,
+        limiter: LLMRequestLimiter,
+        tracer: Tracer,
+    ) -> QuotationItems:
+        """
+        Asks the model again with its malformed answer and the parse error, so
+        it can correct the format and complete an answer that was cut off.
+        """
+        repair_chain = REPAIR_PROMPT | model
+        inputs: dict[str, str] = {
+            "input_text": extraction_output,
+            "error": str(error),
+            "output": output,
+        }
+        with tracer.span("llm_call", model=cls.MODEL, stage="repair") as span:
+            repair_result = await limiter.run(
+                lambda: repair_chain.ainvoke(inputs),
+                on_retry=lambda: span.increment("retries"),
+            )
+            _record_token_usage(
+                span,
+                REPAIR_PROMPT.format(**inputs),
+                repair_result.content,
+                repair_result,
+            )
+        return cls._parse_quotation_items(repair_result.content, tracer)
+
+    @staticmethod
+    def _parse_quotation_items(output: str, tracer: Tracer) -> QuotationItems:
+        # Failures are recorded as errors of the validation span.
+        with tracer.span("validation", stage="categorization") as span:
+            quotation_items: QuotationItems = QUOTATION_ITEMS_PARSER.parse(output)
+            span.set(items=len(quotation_items.items))
+        return quotation_items
@@ -0,0 +1,317 @@
+import json
+import re
+
+from pydantic import BaseModel, Field
+
+from catalog import CatalogMatch, SkuCatalog
+from chunking import get_ordnungszahl, is_title_line
+from memo import ClassificationMemo, MemoEntry
+from models import LvPosition, QuotationItem
+from references import ReferenceResolution, resolve_references
+from tokens import estimate_tokens
+
+# The keyword lists mirror the categorization prompt of PipelineV2.
+DOOR_KEYWORDS: list[str] = [
+    "tür",
+    "zarge",
+    "türblatt",
+    "schloss",
+    "band",
+    "schließer",
+    "dichtung",
+]
+NON_DOOR_KEYWORDS: list[str] = [
+    "fenster",
+    "lüftungsgitter",
+    "wc-beschlag",
+    "badarmatur",
+    "treppe",
+    "fassade",
+    "wand",
+    "stundenlohn",
+    "aufmaß",
+]
+SKU_KEYWORDS: dict[str, list[str]] = {
+    "620001": ["holztürblatt", "holzzarge", "spanplatte", "hpl-tür", "holztür"],
+    "670001": ["stahlzarge", "stahl-u-profil", "feuerschutztür", "stahlrahmen"],
+    "240001": ["türgriff", "drückergarnitur", "scharnier"],
+    "360001": ["einsteckschloss", "3-punkt-verriegelung", "zylinder"],
+    "290001": ["türschließer", "ots", "geze ts"],
+    "DL8110016": ["montage von türen", "einbau stahlzarge", "wartung türschließer"],
+}
+# Abbreviations must match as whole words, all other keywords also match
+# within German compounds like "Stahltür" or "Türband".
+ABBREVIATION_KEYWORDS: list[str] = ["ots"]
+ELEMENT_SKUS: list[str] = ["620001", "670001"]
+SKU_NAMES: dict[str, str] = {
+    "620001": "Holztür",
+    "670001": "Stahltür",
+    "240001": "Beschlag",
+    "360001": "Schloss",
+    "290001": "Türschließer",
+    "DL8110016": "Dienstleistung Tür",
+}
+
+
+class PrefilterReport(BaseModel):
+    total_positions: int = Field(default=0)
+    dropped_positions: int = Field(
+        default=0, description="Positions dropped as clearly not door-related."
+    )
+    preassigned_positions: int = Field(
+        default=0, description="Door positions with an unambiguous SKU."
+    )
+    inherited_positions: int = Field(
+        default=0,
+        description="Delta positions (Wie Pos. XX, jedoch ...) that reuse the"
+        " categorization of their base position.",
+    )
+    memo_lookups: int = Field(
+        default=0, description="Positions looked up in the classification memo."
+    )
+    memo_positions: int = Field(
+        default=0, description="Positions decided by the classification memo."
+    )
+    catalog_positions: int = Field(
+        default=0,
+        description="Pre-assigned positions similar to an entry of the SKU catalog.",
+    )
+    llm_positions: int = Field(
+        default=0, description="Ambiguous positions left for the LLM."
+    )
+    saved_tokens: int = Field(
+        default=0, description="Estimated prompt and completion tokens saved."
+    )
+    saved_calls: int = Field(default=0, description="LLM calls that were skipped.")
+
+    def __add__(self, other: "PrefilterReport") -> "PrefilterReport":
+        return PrefilterReport(
+            **{
+                name: getattr(self, name) + getattr(other, name)
+                for name in PrefilterReport.model_fields
+            }
+        )
+
+
+class PrefilterResult(BaseModel):
+    preassigned_items: list[QuotationItem] = Field(default_factory=list)
+    llm_positions: list[LvPosition] = Field(default_factory=list)
+    references: ReferenceResolution = Field(default_factory=ReferenceResolution)
+    report: PrefilterReport = Field(default_factory=PrefilterReport)
+
+
+def _contains_keyword(text: str, keyword: str) -> bool:
+    if keyword in ABBREVIATION_KEYWORDS:
+        return re.search(rf"\b{re.escape(keyword)}\b", text) is not None
+    return keyword in text
+
+
+def _matching_keywords(text: str, keywords: list[str]) -> list[str]:
+    return [keyword for keyword in keywords if _contains_keyword(text, keyword)]
+
+
+def parse_extraction_output(extraction_output: str) -> list[LvPosition] | None:
+    """
+    Reads the JSON list returned by the extraction stage. Returns None if the
+    output isn't a list of positions, e.g. because the model wrapped it in prose.
+    """
+    start: int = extraction_output.find("[")
+    end: int = extraction_output.rfind("]")
+    if start == -1 or end < start:
+        return None
+    try:
+        records = json.loads(extraction_output[start : end + 1])
+        return [LvPosition.model_validate(record) for record in records]
+    except ValueError:
+        return None
+
+
+def get_chapter_titles(text: str) -> dict[str, str]:
+    """
+    Maps chapter Ordnungszahlen (e.g. "1.1") to their lower-cased title.
+    """
+    chapter_titles: dict[str, str] = {}
+    for line in text.splitlines():
+        if is_title_line(line):
+            ordnungszahl: str = get_ordnungszahl(line)
+            chapter_titles[ordnungszahl.rstrip(".")] = (
+                line.strip()[len(ordnungszahl) :].strip().lower()
+            )
+    return chapter_titles
+
+
+def _get_chapter_text(ordnungszahl: str, chapter_titles: dict[str, str]) -> str:
+    parts: list[str] = ordnungszahl.split(".")
+    return " ".join(
+        chapter_titles.get(".".join(parts[:depth]), "")
+        for depth in range(1, len(parts))
+    )
+
+
+def _classify_sku(description: str) -> str | None:
+    matched_skus: set[str] = {
+        sku
+        for sku, keywords in SKU_KEYWORDS.items()
+        if _matching_keywords(description, keywords)
+    }
+    # Steel frame with a wooden door leaf is a wooden door (620001).
+    if matched_skus == {"620001", "670001"}:
+        return "620001"
+    if len(matched_skus) == 1:
+        return matched_skus.pop()
+    return None
+
+
+def _to_quotation_item(
+    position: LvPosition, sku: str | None, confidence: float, name: str = ""
+) -> QuotationItem:
+    first_line: str = position.beschreibung.strip().split("\n", 1)[0]
+    return QuotationItem(
+        sku=sku,
+        name=name or first_line[:120] or SKU_NAMES.get(sku, ""),
+        text=position.beschreibung.replace("\n", "<br/>"),
+        quantity=round(position.quantity) if position.quantity else 1,
+        quantity_unit=position.quantity_unit or "Stk",
+        commission=f"LV-POS. {position.ordnungszahl}",
+        is_door_product_confidence=confidence,
+    )
+
+
+def prefilter_positions(
+    positions: list[LvPosition],
+    chapter_titles: dict[str, str],
+    catalog: SkuCatalog | None = None,
+    memo: ClassificationMemo | None = None,
+) -> PrefilterResult:
+    """
+    Drops positions without any door reference, pre-assigns SKUs to positions
+    matching exactly one category, a `memo` entry or a `catalog` entry and
+    leaves the rest to the LLM. Delta positions are skipped, their items are
+    derived from their base position with `inherit_quotation_items`.
+    """
+    result: PrefilterResult = PrefilterResult(references=resolve_references(positions))
+    for position in positions:
+        if result.references.is_inherited(position):
+            result.report.inherited_positions += 1
+            continue
+        description: str = position.beschreibung.lower()
+        chapter_text: str = _get_chapter_text(position.ordnungszahl, chapter_titles)
+        door_keywords: list[str] = _matching_keywords(description, DOOR_KEYWORDS)
+        chapter_door_keywords: list[str] = _matching_keywords(
+            chapter_text, DOOR_KEYWORDS
+        )
+        non_door_keywords: list[str] = _matching_keywords(
+            description, NON_DOOR_KEYWORDS
+        )
+
+        sku_keywords: list[str] = [
+            keyword
+            for keywords in SKU_KEYWORDS.values()
+            for keyword in _matching_keywords(description, keywords)
+        ]
+        # Door hardware like "Drückergarnitur" or "Profilzylinder" often
+        # names no door at all, so an SKU keyword counts as a door reference.
+        if not door_keywords and not chapter_door_keywords and not sku_keywords:
+            result.report.dropped_positions += 1
+            continue
+
+        sku: str | None = _classify_sku(description)
+        if door_keywords and not non_door_keywords and sku is not None:
+            # A door element in a chapter of the other material is less certain.
+            chapter_sku: str | None = _classify_sku(chapter_text)
+            confidence: float = (
+                0.8
+                if {sku, chapter_sku} == set(ELEMENT_SKUS) and sku != chapter_sku
+                else 0.95
+            )
+            result.preassigned_items.append(
+                _to_quotation_item(position, sku, confidence)
+            )
+            continue
+
+        result.llm_positions.append(position)
+
+    if memo is not None and result.llm_positions:
+        unmatched_positions: list[LvPosition] = result.llm_positions
+        memo_entries: list[MemoEntry | None] = memo.get_many(
+            [position.beschreibung for position in unmatched_positions]
+        )
+        result.llm_positions = []
+        for position, memo_entry in zip(unmatched_positions, memo_entries):
+            if memo_entry is None:
+                result.llm_positions.append(position)
+            elif memo_entry.is_door_related:
+                result.preassigned_items.append(
+                    _to_quotation_item(
+                        position,
+                        memo_entry.sku,
+                        memo_entry.is_door_product_confidence,
+                        memo_entry.name,
+                    )
+                )
+            else:
+                result.report.dropped_positions += 1
+        result.report.memo_lookups = len(unmatched_positions)
+        result.report.memo_positions = len(unmatched_positions) - len(
+            result.llm_positions
+        )
+
+    if catalog is not None and result.llm_positions:
+        unmatched_positions = result.llm_positions
+        catalog_matches: list[CatalogMatch | None] = catalog.match(
+            [position.beschreibung for position in unmatched_positions]
+        )
+        result.llm_positions = []
+        for position, catalog_match in zip(unmatched_positions, catalog_matches):
+            if catalog_match is None:
+                result.llm_positions.append(position)
+                continue
+            result.preassigned_items.append(
+                _to_quotation_item(
+                    position,
+                    catalog_match.entry.sku,
+                    catalog_match.entry.is_door_product_confidence,
+                )
+            )
+            result.report.catalog_positions += 1
+        result.preassigned_items = sort_quotation_items(
+            result.preassigned_items, positions
+        )
+
+    result.report.total_positions = len(positions)
+    result.report.preassigned_positions = len(result.preassigned_items)
+    result.report.llm_positions = len(result.llm_positions)
+
+    llm_position_ids: set[int] = {id(position) for position in result.llm_positions}
+    skipped_input: str = "".join(
+        position.model_dump_json()
+        for position in positions
+        if id(position) not in llm_position_ids
+    )
+    skipped_output: str = "".join(
+        quotation_item.model_dump_json() for quotation_item in result.preassigned_items
+    )
+    result.report.saved_tokens = estimate_tokens(skipped_input) + estimate_tokens(
+        skipped_output
+    )
+    result.report.saved_calls = 0 if result.llm_positions else 1
+    return result
+
+
+def sort_quotation_items(
+    quotation_items: list[QuotationItem], positions: list[LvPosition]
+) -> list[QuotationItem]:
+    """
+    Restores document order after pre-assigned and LLM items were combined.
+    Items that don't match a position keep their relative order at the end.
+    """
+    position_index: dict[str, int] = {
+        position.ordnungszahl: i for i, position in enumerate(positions)
+    }
+    return sorted(
+        quotation_items,
+        key=lambda quotation_item: position_index.get(
+            quotation_item.commission.removeprefix("LV-POS.").strip(),
+            len(position_index),
+        ),
+    )
@@ -0,0 +1,128 @@
+import re
+
+from pydantic import BaseModel, Field
+
+from models import LvPosition, QuotationItem
+
+# "Wie Pos. 1.1.10, jedoch b = 0,885 m" or "wie Position 1.1.10, aber ..."
+REFERENCE_PATTERN: re.Pattern = re.compile(
+    r"\bwie\s+pos(?:ition|\.)?\s*(?P<ordnungszahl>\d{1,3}(?:\.[0-9A-Z]{1,4})+)\.?"
+    r"\s*,?\s*(?:jedoch|aber)?\s*(?P<delta>.*)",
+    re.IGNORECASE | re.DOTALL,
+)
+# A delta naming a material the base position doesn't mention may change the
+# SKU (e.g. wood to steel), so it is categorized on its own.
+MATERIAL_KEYWORDS: dict[str, list[str]] = {
+    "holz": ["holz", "spanplatte", "hpl", "furnier"],
+    "stahl": ["stahl", "feuerschutz", "metall"],
+    "glas": ["ganzglas", "glastür"],
+    "aluminium": ["aluminium", "alu-"],
+}
+
+
+class ReferenceResolution(BaseModel):
+    base_ordnungszahlen: dict[str, str] = Field(
+        default_factory=dict,
+        description="Maps the Ordnungszahl of each delta position to the base"
+        " position whose categorization it reuses.",
+    )
+    reviewed_positions: int = Field(
+        default=0,
+        description="Delta positions that change the material and are categorized"
+        " on their own.",
+    )
+
+    def is_inherited(self, position: LvPosition) -> bool:
+        return position.ordnungszahl in self.base_ordnungszahlen
+
+
+def get_referenced_ordnungszahl(description: str) -> tuple[str, str] | None:
+    """
+    Returns the referenced Ordnungszahl and the delta text of a position
+    written as "Wie Pos. XX, jedoch ...".
+    """
+    match = REFERENCE_PATTERN.search(description)
+    if match is None:
+        return None
+    return match.group("ordnungszahl").rstrip("."), match.group("delta").strip()
+
+
+def _get_materials(text: str) -> set[str]:
+    text = text.lower()
+    return {
+        material
+        for material, keywords in MATERIAL_KEYWORDS.items()
+        if any(keyword in text for keyword in keywords)
+    }
+
+
+def resolve_references(positions: list[LvPosition]) -> ReferenceResolution:
+    """
+    Links delta positions to the position they refer to. Chains of references
+    resolve to their first position, and references to positions outside of
+    `positions` are left alone.
+    """
+    resolution: ReferenceResolution = ReferenceResolution()
+    positions_by_ordnungszahl: dict[str, LvPosition] = {
+        position.ordnungszahl: position for position in positions
+    }
+    for position in positions:
+        reference: tuple[str, str] | None = get_referenced_ordnungszahl(
+            position.beschreibung
+        )
+        if reference is None:
+            continue
+        base_ordnungszahl, delta = reference
+        base: LvPosition | None = positions_by_ordnungszahl.get(base_ordnungszahl)
+        if base is None or base is position:
+            continue
+        if _get_materials(delta) - _get_materials(base.beschreibung):
+            resolution.reviewed_positions += 1
+            continue
+        # Bases precede their deltas, so a referenced delta is already resolved.
+        resolution.base_ordnungszahlen[position.ordnungszahl] = (
+            resolution.base_ordnungszahlen.get(base_ordnungszahl, base_ordnungszahl)
+        )
+    return resolution
+
+
+def inherit_quotation_items(
+    resolution: ReferenceResolution,
+    positions: list[LvPosition],
+    quotation_items: list[QuotationItem],
+) -> list[QuotationItem]:
+    """
+    Creates the items of the delta positions from the items of their base
+    positions. Deltas of positions that aren't door-related are dropped too.
+    """
+    items_by_ordnungszahl: dict[str, QuotationItem] = {
+        quotation_item.commission.removeprefix("LV-POS.").strip(): quotation_item
+        for quotation_item in quotation_items
+    }
+    inherited_items: list[QuotationItem] = []
+    for position in positions:
+        base_ordnungszahl: str | None = resolution.base_ordnungszahlen.get(
+            position.ordnungszahl
+        )
+        base_item: QuotationItem | None = items_by_ordnungszahl.get(
+            base_ordnungszahl or ""
+        )
+        if base_item is None:
+            continue
+        first_line: str = position.beschreibung.strip().split("\n", 1)[0]
+        inherited_items.append(
+            base_item.model_copy(
+                update={
+                    "name": first_line[:120] or base_item.name,
+                    "text": position.beschreibung.replace("\n", "<br/>"),
+                    "quantity": (
+                        round(position.quantity)
+                        if position.quantity
+                        else base_item.quantity
+                    ),
+                    "quantity_unit": position.quantity_unit or base_item.quantity_unit,
+                    "commission": f"LV-POS. {position.ordnungszahl}",
+                }
+            )
+        )
+    return inherited_items
@@ -0,0 +1,121 @@
+from pydantic import BaseModel, Field
+
+from cache import content_hash
+from models import LvPosition, PositionFingerprint, QuotationItem
+
+
+def get_position_fingerprint(position: LvPosition) -> PositionFingerprint:
+    # Reflowed lines and markup don't count as a change of the text.
+    text: str = " ".join(position.beschreibung.replace("<br/>", " ").split())
+    return PositionFingerprint(
+        text_hash=content_hash(text),
+        quantity=position.quantity,
+        quantity_unit=position.quantity_unit,
+    )
+
+
+class PreviousAnalysis(BaseModel):
+    """
+    The analysis of an earlier version of the document that a revised version
+    (e.g. "2. Änderung") is re-analyzed against.
+    """
+
+    position_fingerprints: dict[str, PositionFingerprint] = Field(
+        description="The fingerprints of all positions of the earlier version."
+    )
+    quotation_items: list[QuotationItem] = Field(
+        description="The final items of the earlier version, including user edits."
+    )
+
+
+class RevisionDiff(BaseModel):
+    added: list[str] = Field(
+        default_factory=list, description="Ordnungszahlen of new positions."
+    )
+    changed: list[str] = Field(
+        default_factory=list,
+        description="Ordnungszahlen of positions whose text changed.",
+    )
+    requantified: list[str] = Field(
+        default_factory=list,
+        description="Ordnungszahlen of positions where only the quantity changed.",
+    )
+    removed: list[str] = Field(
+        default_factory=list, description="Ordnungszahlen of dropped positions."
+    )
+    unchanged: int = Field(default=0)
+
+    def __str__(self) -> str:
+        return (
+            f"{len(self.added)} added, {len(self.changed)} changed,"
+            f" {len(self.requantified)} with new quantities, {len(self.removed)}"
+            f" removed and {self.unchanged} unchanged positions"
+        )
+
+
+def diff_positions(
+    previous: dict[str, PositionFingerprint], current: dict[str, PositionFingerprint]
+) -> RevisionDiff:
+    """
+    Compares the positions of two versions of a document by Ordnungszahl.
+    """
+    diff: RevisionDiff = RevisionDiff(
+        removed=[
+            ordnungszahl for ordnungszahl in previous if ordnungszahl not in current
+        ]
+    )
+    for ordnungszahl, fingerprint in current.items():
+        previous_fingerprint: PositionFingerprint | None = previous.get(ordnungszahl)
+        if previous_fingerprint is None:
+            diff.added.append(ordnungszahl)
+        elif previous_fingerprint.text_hash != fingerprint.text_hash:
+            diff.changed.append(ordnungszahl)
+        elif previous_fingerprint != fingerprint:
+            diff.requantified.append(ordnungszahl)
+        else:
+            diff.unchanged += 1
+    return diff
+
+
+def carry_over_items(
+    previous: PreviousAnalysis, positions: list[LvPosition]
+) -> tuple[list[QuotationItem], list[LvPosition]]:
+    """
+    Returns the earlier items of the positions whose text is unchanged and the
+    positions that need to be categorized again. Carried over items keep the
+    user's edits, only a quantity changed by the revision is taken over.
+    """
+    items_by_ordnungszahl: dict[str, list[QuotationItem]] = {}
+    for quotation_item in previous.quotation_items:
+        items_by_ordnungszahl.setdefault(
+            quotation_item.commission.removeprefix("LV-POS.").strip(), []
+        ).append(quotation_item)
+    carried_items: list[QuotationItem] = []
+    changed_positions: list[LvPosition] = []
+    for position in positions:
+        previous_fingerprint: PositionFingerprint | None = (
+            previous.position_fingerprints.get(position.ordnungszahl)
+        )
+        fingerprint: PositionFingerprint = get_position_fingerprint(position)
+        if (
+            previous_fingerprint is None
+            or previous_fingerprint.text_hash != fingerprint.text_hash
+        ):
+            changed_positions.append(position)
+            continue
+        # Positions that weren't door-related have no items to carry over.
+        for quotation_item in items_by_ordnungszahl.get(position.ordnungszahl, []):
+            if previous_fingerprint != fingerprint:
+                quotation_item = quotation_item.model_copy(
+                    update={
+                        "quantity": (
+                            round(position.quantity)
+                            if position.quantity
+                            else quotation_item.quantity
+                        ),
+                        "quantity_unit": position.quantity_unit
+                        or quotation_item.quantity_unit,
+                    }
+                )
+            carried_items.append(quotation_item)
+    return carried_items, changed_positions
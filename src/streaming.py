@@ -0,0 +1,74 @@
+import json
+
+from pydantic import ValidationError
+
+from models import QuotationItem
+
+
+class IncrementalQuotationItemParser:
+    """
+    Parses `QuotationItem`s from a partial `QuotationItems` JSON document as
+    soon as each object of the "items" array is complete.
+    """
+
+    def __init__(self) -> None:
+        self.buffer: str = ""
+        self._position: int = 0
+        self._items_start: int | None = None
+        self._depth: int = 0
+        self._in_string: bool = False
+        self._escaped: bool = False
+        self._object_start: int | None = None
+        self._done: bool = False
+
+    def feed(self, text: str) -> list[QuotationItem]:
+        self.buffer += text
+        if self._items_start is None:
+            key_index: int = self.buffer.find('"items"')
+            if key_index == -1:
+                return []
+            array_index: int = self.buffer.find("[", key_index)
+            if array_index == -1:
+                return []
+            self._items_start = array_index
+            self._position = array_index + 1
+
+        quotation_items: list[QuotationItem] = []
+        while self._position < len(self.buffer) and not self._done:
+            char: str = self.buffer[self._position]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                if self._depth == 0 and char == "{":
+                    self._object_start = self._position
+                self._depth += 1
+            elif char in "}]":
+                if self._depth == 0:
+                    # The closing bracket of the "items" array.
+                    self._done = True
+                else:
+                    self._depth -= 1
+                    if self._depth == 0 and self._object_start is not None:
+                        quotation_item: QuotationItem | None = self._parse_object(
+                            self.buffer[self._object_start : self._position + 1]
+                        )
+                        if quotation_item is not None:
+                            quotation_items.append(quotation_item)
+                        self._object_start = None
+            self._position += 1
+        return quotation_items
+
+    @staticmethod
+    def _parse_object(text: str) -> QuotationItem | None:
+        try:
+            return QuotationItem.model_validate(json.loads(text))
+        except (ValueError, ValidationError):
+            # Invalid items surface when the full output is parsed.
+            return None
@@ -1,65 +1,505 @@
+import functools
 import os
-import time
+import uuid
 from datetime import datetime
+from http.server import ThreadingHTTPServer
 from pathlib import Path
 
 import streamlit as st
+from cache import ResultCache, content_hash
+from catalog import SkuCatalog
+from checkpoints import CheckpointStore, RunCheckpoint
 from dotenv import load_dotenv
-from lib import get_pdf_content, generate_xml_export
-from pipelines import PipelineV2
-from models import QuotationItem, QuotationItems
+from gaeb import GAEB_SUFFIXES
+from jobs import (
+    JobContext,
+    JobManager,
+    JobQueueFullError,
+    JobState,
+    JobStatus,
+)
+from item_view import (
+    CONFIDENCE_BANDS,
+    MISSING_SKU,
+    ItemFilter,
+    QuotationItemEdits,
+    get_chapter,
+)
+from lib import XmlExportCache, read_pdf_content
+from memo import ClassificationMemo, MemoEntry, get_confirmed_memo_entry
+from pipeline_registry import get_pipeline
+from prefilter import SKU_KEYWORDS, SKU_NAMES
+from models import PdfContent, QuotationItem, QuotationItems
+from revisions import PreviousAnalysis, RevisionDiff, diff_positions
 from streamlit_pdf_viewer import pdf_viewer
 from streamlit.runtime.uploaded_file_manager import UploadedFile
+from tracing import PipelineEvent, Tracer, start_metrics_server
+from uploads import UploadHandle, UploadNotFoundError, UploadStore
 
 load_dotenv()
 
 OPENROUTER_API_KEY: str = os.getenv("OPENROUTER_API_KEY")
+METRICS_PORT: int = int(os.getenv("METRICS_PORT", "9464"))
+MAX_CONCURRENT_ANALYSES: int = int(os.getenv("MAX_CONCURRENT_ANALYSES", "4"))
+ITEMS_PER_PAGE: int = int(os.getenv("ITEMS_PER_PAGE", "20"))
+TRACE_DIR: Path = Path(__file__).parents[1] / ".cache" / "traces"
+SKU_CATALOG_PATH: Path = Path(__file__).parents[1] / ".cache" / "sku_catalog.jsonl"
+CLASSIFICATION_MEMO_PATH: Path = (
+    Path(__file__).parents[1] / ".cache" / "classification_memo.sqlite3"
+)
+CHECKPOINT_DIR: Path = Path(__file__).parents[1] / ".cache" / "runs"
+UPLOAD_STORE_MAX_MB: int = int(os.getenv("UPLOAD_STORE_MAX_MB", "1024"))
+UPLOAD_STORE_MAX_AGE_DAYS: float = float(os.getenv("UPLOAD_STORE_MAX_AGE_DAYS", "7"))
+# Share of the progress bar filled by each stage.
+PROGRESS_STAGES: dict[str, tuple[float, float]] = {
+    "pdf_parse": (0.0, 0.25),
+    "pipeline": (0.25, 0.99),
+}
+
+
+@st.cache_resource
+def get_result_cache() -> ResultCache:
+    return ResultCache(Path(__file__).parents[1] / ".cache" / "results")
+
+
+@st.cache_resource
+def get_upload_store() -> UploadStore:
+    return UploadStore(
+        Path(__file__).parents[1] / "uploads",
+        max_bytes=UPLOAD_STORE_MAX_MB * 1024 * 1024,
+        max_age=UPLOAD_STORE_MAX_AGE_DAYS * 24 * 60 * 60,
+    )
 
 
-@st.dialog("Analyzing PDF")
-def analyze_pdf() -> None:
-    sleep_time: float = 1.0
-    progress_bar = st.progress(0, text="Loading PDF. Please be patient...")
-    time.sleep(sleep_time)
-
-    progress_bar.progress(0.10, "📄 Extracting text from PDF...")
-    time.sleep(sleep_time)
-    pdf_content: str = get_pdf_content(st.session_state["pdf_file_path"])
+@st.cache_resource
+def get_checkpoint_store() -> CheckpointStore:
+    # Runs can be resumed as long as their upload is kept.
+    return CheckpointStore(
+        CHECKPOINT_DIR, max_age=UPLOAD_STORE_MAX_AGE_DAYS * 24 * 60 * 60
+    )
 
-    page_count: int = len(pdf_content.split("\n\n"))
-    progress_bar.progress(0.25, f"📜 Extracted {page_count} pages from PDF")
-    time.sleep(sleep_time)
 
-    quotation_items: QuotationItems = PipelineV2.extract_quotation_items_from_pdf(
-        pdf_content=pdf_content,
-        openrouter_api_key=OPENROUTER_API_KEY,
-        progress_bar=progress_bar,
+@st.cache_resource
+def get_sku_catalog() -> SkuCatalog:
+    # Seeded from the keyword rules and extended by every corrected item.
+    catalog: SkuCatalog = SkuCatalog.from_keywords(SKU_KEYWORDS, SKU_NAMES)
+    catalog.load(SKU_CATALOG_PATH)
+    return catalog
+
+
+@st.cache_resource
+def get_classification_memo() -> ClassificationMemo:
+    return ClassificationMemo(CLASSIFICATION_MEMO_PATH, get_pipeline().PROMPT_VERSION)
+
+
+@st.cache_resource
+def get_metrics_server() -> ThreadingHTTPServer | None:
+    # A single endpoint per process serves the metrics of all sessions.
+    try:
+        return start_metrics_server(METRICS_PORT)
+    except OSError:
+        return None
+
+
+@st.cache_resource
+def get_job_manager() -> JobManager:
+    # Jobs and their results live outside of the sessions, so a reloaded page
+    # can reconnect to its analysis.
+    return JobManager(max_workers=MAX_CONCURRENT_ANALYSES)
+
+
+def analyze_pdf(
+    context: JobContext,
+    upload: UploadHandle,
+    upload_store: UploadStore,
+    cache: ResultCache,
+    catalog: SkuCatalog,
+    memo: ClassificationMemo,
+    checkpoint: RunCheckpoint,
+    previous: PreviousAnalysis | None = None,
+) -> QuotationItems:
+    """
+    Runs in a worker thread of the job manager and must not call Streamlit.
+    """
+    try:
+        quotation_items: QuotationItems = _analyze_pdf(
+            context, upload, upload_store, cache, catalog, memo, checkpoint, previous
+        )
+    except BaseException as error:
+        checkpoint.mark_failed(f"{type(error).__name__}: {error}")
+        raise
+    checkpoint.mark_done()
+    return quotation_items
+
+
+def finish_checkpoint(checkpoint: RunCheckpoint, status: JobStatus) -> None:
+    if status.state == JobState.DONE:
+        checkpoint.mark_done()
+    else:
+        checkpoint.mark_failed(status.error or "Cancelled")
+
+
+def _analyze_pdf(
+    context: JobContext,
+    upload: UploadHandle,
+    upload_store: UploadStore,
+    cache: ResultCache,
+    catalog: SkuCatalog,
+    memo: ClassificationMemo,
+    checkpoint: RunCheckpoint,
+    previous: PreviousAnalysis | None,
+) -> QuotationItems:
+
+    def report_progress(event: PipelineEvent) -> None:
+        if event.kind != "progress":
+            return
+        start, end = PROGRESS_STAGES[event.stage]
+        text: str = event.message
+        if event.stage == "pipeline" and event.total_steps > 2:
+            text += f" ({event.completed_steps}/{event.total_steps} steps)"
+        context.report_progress(start + (end - start) * event.fraction, text)
+
+    tracer: Tracer = Tracer(run_id=checkpoint.run_id, on_event=report_progress)
+    upload_path: Path = upload_store.path(upload)
+    pipeline = get_pipeline()
+
+    # Items are previewed while the model is still writing its answer.
+    if upload.suffix in GAEB_SUFFIXES:
+        quotation_items: QuotationItems = pipeline.extract_quotation_items_from_gaeb(
+            gaeb_path=upload_path,
+            openrouter_api_key=OPENROUTER_API_KEY,
+            tracer=tracer,
+            cache=cache,
+            on_item=context.add_item,
+            catalog=catalog,
+            memo=memo,
+            previous=previous,
+            checkpoint=checkpoint,
+        )
+    else:
+        stored_pdf_content: str | None = checkpoint.get("pdf", upload.digest)
+        if stored_pdf_content is not None:
+            pdf_content: PdfContent = PdfContent.model_validate_json(stored_pdf_content)
+        else:
+            pdf_content = read_pdf_content(upload_path, tracer=tracer)
+            checkpoint.set("pdf", upload.digest, pdf_content.model_dump_json())
+        quotation_items = pipeline.extract_quotation_items_from_pdf(
+            pdf_content=pdf_content.text,
+            openrouter_api_key=OPENROUTER_API_KEY,
+            tracer=tracer,
+            cache=cache,
+            on_item=context.add_item,
+            chunked=True,
+            catalog=catalog,
+            memo=memo,
+            previous=previous,
+            checkpoint=checkpoint,
+            quantity_lines=pdf_content.quantity_lines,
+        )
+    tracer.write_trace(TRACE_DIR)
+    return quotation_items
+
+
+def submit_analysis(
+    owner: str,
+    upload: UploadHandle,
+    customer_id: str,
+    previous_analysis: PreviousAnalysis | None = None,
+    run_id: str | None = None,
+) -> JobStatus:
+    """
+    Starts an analysis, or resumes the run `run_id` from its checkpoints. The
+    run ID doubles as the job ID, so the URL of the page stays valid.
+    """
+    metadata: dict[str, str] = {
+        "upload": upload.model_dump_json(),
+        "customer_id": customer_id,
+        "owner": owner,
+    }
+    run_id = run_id or uuid.uuid4().hex
+    checkpoint_store: CheckpointStore = get_checkpoint_store()
+    checkpoint: RunCheckpoint = checkpoint_store.create(run_id, metadata)
+    if previous_analysis is not None:
+        checkpoint.set(
+            "input", "previous_analysis", previous_analysis.model_dump_json()
+        )
+    # Estimators uploading the same tender at the same time share one
+    # analysis. Revisions depend on the edits of the session and run on
+    # their own.
+    coalesce_key: str | None = (
+        content_hash(
+            upload.digest,
+            upload.suffix,
+            get_pipeline().__name__,
+            get_pipeline().MODEL,
+            get_pipeline().PROMPT_VERSION,
+        )
+        if previous_analysis is None
+        else None
     )
-
-    progress_bar.progress(
-        0.99, f"📦 Found {len(quotation_items.items)} quotation items"
+    # A shared analysis keeps its checkpoints under the coalesce key, so
+    # every submitter resumes from them, whichever of them started it. The
+    # submitter's own run only records its state.
+    run_checkpoint: RunCheckpoint = (
+        checkpoint_store.create(coalesce_key, {"upload": metadata["upload"]})
+        if coalesce_key is not None
+        else checkpoint
+    )
+    upload_store: UploadStore = get_upload_store()
+    return get_job_manager().submit(
+        owner=owner,
+        function=functools.partial(
+            analyze_pdf,
+            upload=upload,
+            upload_store=upload_store,
+            cache=get_result_cache(),
+            catalog=get_sku_catalog(),
+            memo=get_classification_memo(),
+            checkpoint=run_checkpoint,
+            previous=previous_analysis,
+        ),
+        metadata=metadata,
+        coalesce_key=coalesce_key,
+        job_id=run_id,
+        on_finish=(
+            functools.partial(finish_checkpoint, checkpoint)
+            if run_checkpoint is not checkpoint
+            else None
+        ),
     )
-    time.sleep(sleep_time)
 
-    progress_bar.progress(1.0, "✅ PDF analysis completed")
-    time.sleep(sleep_time)
 
-    st.session_state["quotation_items"] = quotation_items
-    st.session_state["analyzed"] = True
-    st.session_state["show_analysis_success_toast"] = True
+def resume_analysis(run_id: str, owner: str) -> JobStatus | None:
+    """
+    Restarts a run that failed or was lost in a restart of the server. LLM
+    calls finished before are taken from its checkpoints.
+    """
+    checkpoint: RunCheckpoint | None = get_checkpoint_store().open(run_id)
+    if checkpoint is None or checkpoint.manifest.metadata.get("owner") != owner:
+        return None
+    metadata: dict[str, str] = checkpoint.manifest.metadata
+    previous_analysis: str | None = checkpoint.get("input", "previous_analysis")
+    try:
+        return submit_analysis(
+            owner,
+            UploadHandle.model_validate_json(metadata["upload"]),
+            metadata["customer_id"],
+            (
+                PreviousAnalysis.model_validate_json(previous_analysis)
+                if previous_analysis is not None
+                else None
+            ),
+            run_id=run_id,
+        )
+    except JobQueueFullError:
+        return None
+
+
+def reset_analysis() -> None:
+    for key in [
+        "job_id",
+        "upload",
+        "quotation_items",
+        "item_edits",
+        "item_filter",
+        "item_page",
+        "xml_export_cache",
+        "analyzed",
+        "previous_analysis",
+        "revision_diff",
+    ]:
+        st.session_state.pop(key, None)
+    st.query_params.pop("job", None)
+
+
+def start_revision() -> None:
+    """
+    Starts over with a revised version of the document, which is compared to
+    the current items including the user's edits.
+    """
+    quotation_items: QuotationItems = st.session_state["quotation_items"]
+    item_edits: QuotationItemEdits = st.session_state["item_edits"]
+    previous_analysis: PreviousAnalysis = PreviousAnalysis(
+        position_fingerprints=quotation_items.position_fingerprints,
+        quotation_items=item_edits.apply(quotation_items).items,
+    )
+    reset_analysis()
+    st.session_state["previous_analysis"] = previous_analysis
+
+
+@st.fragment(run_every=1.0)
+def render_analysis_job() -> None:
+    job_manager: JobManager = get_job_manager()
+    job_id: str = st.session_state["job_id"]
+    job_status: JobStatus | None = job_manager.status(job_id)
+    if job_status is None:
+        # The job expired or the server was restarted.
+        job_status = resume_analysis(job_id, st.query_params["client"])
+    if job_status is None:
+        reset_analysis()
+        st.rerun()
 
+    if job_status.state == JobState.DONE:
+        quotation_items: QuotationItems = job_manager.result(job_id)
+        previous_analysis: PreviousAnalysis | None = st.session_state.pop(
+            "previous_analysis", None
+        )
+        if previous_analysis is not None:
+            st.session_state["revision_diff"] = diff_positions(
+                previous_analysis.position_fingerprints,
+                quotation_items.position_fingerprints,
+            )
+        st.session_state["quotation_items"] = quotation_items
+        st.session_state["item_edits"] = QuotationItemEdits()
+        st.session_state["analyzed"] = True
+        st.session_state["show_analysis_success_toast"] = True
+        st.rerun()
 
-def render_quotation_items(quotation_items: QuotationItems) -> None:
-    for i, quotation_item in enumerate(quotation_items.items):
-        with st.expander(
-            label=(
-                f"**{quotation_item.commission.replace('LV-POS. ','')}** {quotation_item.name}"
+    st.markdown(
+        "<h3 style='text-align: center'>Analyzing PDF</h3>", unsafe_allow_html=True
+    )
+    if job_status.state in (JobState.FAILED, JobState.CANCELLED):
+        st.error(
+            (
+                f"The analysis failed: {job_status.error}"
+                if job_status.state == JobState.FAILED
+                else "The analysis was cancelled."
             ),
-            expanded=True,
+            icon="🚨",
+        )
+        if job_status.state == JobState.FAILED and st.button(
+            label="Resume analysis",
+            type="primary",
+            icon="▶️",
+            help="Retries the failed parts, the finished ones are kept.",
         ):
-            col0, col1 = st.columns([9, 1])
-            with col0:
-                st.markdown(f"#### {quotation_item.name}")
+            resume_analysis(job_id, st.query_params["client"])
+            st.rerun()
+        if st.button(label="Start over", type="secondary", icon="🔄"):
+            reset_analysis()
+            st.rerun()
+        return
+
+    if job_status.state == JobState.QUEUED:
+        st.progress(
+            0.0,
+            text=f"⏳ Waiting for a free worker ({job_status.queue_position}"
+            " analyses ahead)...",
+        )
+    else:
+        st.progress(
+            job_status.progress,
+            text=job_status.message or "Loading PDF. Please be patient...",
+        )
+    if st.button(label="Cancel", type="secondary", icon="✖️"):
+        job_manager.cancel(job_id)
+
+    # Only the latest items are previewed, so a poll costs the same for any LV.
+    start: int = max(0, job_status.streamed_item_count - ITEMS_PER_PAGE)
+    with st.container(height=400, border=False):
+        for i, quotation_item in enumerate(
+            job_manager.streamed_items(job_id, start=start), start=start
+        ):
+            render_quotation_item(i, quotation_item, editable=False)
+
+
+def render_item_filter(quotation_items: QuotationItems) -> ItemFilter:
+    col0, col1, col2 = st.columns([1, 1, 1])
+    with col0:
+        sku: str = st.text_input(
+            label="SKU:",
+            placeholder=f"SKU, {MISSING_SKU} for none",
+            key="filter-sku",
+        )
+    with col1:
+        confidence_bands: list[str] = st.multiselect(
+            label="Confidence:",
+            options=list(CONFIDENCE_BANDS),
+            key="filter-confidence",
+        )
+    with col2:
+        chapters: list[str] = st.multiselect(
+            label="Chapter:",
+            options=list(
+                dict.fromkeys(
+                    get_chapter(quotation_item.commission)
+                    for quotation_item in quotation_items.items
+                )
+            ),
+            key="filter-chapter",
+        )
+    return ItemFilter(sku=sku, confidence_bands=confidence_bands, chapters=chapters)
+
+
+def set_item_page(page: int) -> None:
+    st.session_state["item_page"] = page
+
+
+def render_quotation_items(
+    quotation_items: QuotationItems, item_edits: QuotationItemEdits
+) -> None:
+    """
+    Renders a single page of the filtered items, so the number of widgets
+    doesn't grow with the size of the LV.
+    """
+    item_filter: ItemFilter = render_item_filter(quotation_items)
+    indices: list[int] = [
+        i
+        for i in range(len(quotation_items.items))
+        if item_filter.matches(item_edits.get(quotation_items, i))
+    ]
+    if st.session_state.get("item_filter") != item_filter:
+        st.session_state["item_filter"] = item_filter
+        st.session_state["item_page"] = 0
+    page_count: int = max(1, -(-len(indices) // ITEMS_PER_PAGE))
+    page: int = min(st.session_state.get("item_page", 0), page_count - 1)
+
+    with st.container(border=False, height=440):
+        if not indices and quotation_items.items:
+            st.info("No quotation items match the filter.", icon="🔎")
+        for i in indices[page * ITEMS_PER_PAGE : (page + 1) * ITEMS_PER_PAGE]:
+            render_quotation_item(i, item_edits.get(quotation_items, i))
+
+    col0, col1, col2 = st.columns([1, 2, 1])
+    with col0:
+        st.button(
+            label="Previous",
+            icon="⬅️",
+            disabled=page == 0,
+            on_click=set_item_page,
+            args=(page - 1,),
+            use_container_width=True,
+        )
+    with col1:
+        st.markdown(
+            f"<p style='text-align: center'>Page {page + 1} of {page_count}"
+            f" ({len(indices)} items)</p>",
+            unsafe_allow_html=True,
+        )
+    with col2:
+        st.button(
+            label="Next",
+            icon="➡️",
+            disabled=page >= page_count - 1,
+            on_click=set_item_page,
+            args=(page + 1,),
+            use_container_width=True,
+        )
+
+
+def render_quotation_item(
+    i: int, quotation_item: QuotationItem, editable: bool = True
+) -> None:
+    with st.expander(
+        label=(
+            f"**{quotation_item.commission.replace('LV-POS. ','')}** {quotation_item.name}"
+        ),
+        expanded=True,
+    ):
+        col0, col1 = st.columns([9, 1])
+        with col0:
+            st.markdown(f"#### {quotation_item.name}")
+        if editable:
             with col1:
                 edit_button = st.button(
                     label="", key=f"edit-{i}", type="secondary", icon="✏️"
@@ -67,32 +507,30 @@ def render_quotation_items(quotation_items: QuotationItems) -> None:
                 if edit_button:
                     render_edit_quotation_item(i, quotation_item)
 
-            is_high_confidence: bool = quotation_item.is_door_product_confidence >= 0.75
-            is_medium_confidence: bool = (
-                quotation_item.is_door_product_confidence >= 0.5
-                and quotation_item.is_door_product_confidence < 0.75
-            )
-            is_low_confidence: bool = quotation_item.is_door_product_confidence < 0.5
-
-            confidence_color, confidence_icon = (
-                ("green", ":material/check:")
-                if is_high_confidence
-                else (
-                    ("orange", ":material/warning:")
-                    if is_medium_confidence
-                    else ("red", ":material/report:")
-                )
+        is_high_confidence: bool = quotation_item.is_door_product_confidence >= 0.75
+        is_medium_confidence: bool = (
+            quotation_item.is_door_product_confidence >= 0.5
+            and quotation_item.is_door_product_confidence < 0.75
+        )
+        is_low_confidence: bool = quotation_item.is_door_product_confidence < 0.5
+
+        confidence_color, confidence_icon = (
+            ("green", ":material/check:")
+            if is_high_confidence
+            else (
+                ("orange", ":material/warning:")
+                if is_medium_confidence
+                else ("red", ":material/report:")
             )
+        )
 
-            st.markdown(
-                f"""
-                :gray-badge[:material/format_align_right: {quotation_item.commission}]
-                :{'red' if quotation_item.sku is None else 'gray'}-badge[:material/barcode: SKU: {quotation_item.sku}]
-                :gray-badge[:material/confirmation_number: Quantity: {quotation_item.quantity} {quotation_item.quantity_unit}]
-                :{confidence_color}-badge[{confidence_icon} Confidence: {quotation_item.is_door_product_confidence*100:.0f} %]
-                """
-            )
-            st.markdown(quotation_item.text, unsafe_allow_html=True)
+        st.markdown(f"""
+            :gray-badge[:material/format_align_right: {quotation_item.commission}]
+            :{'red' if quotation_item.sku is None else 'gray'}-badge[:material/barcode: SKU: {quotation_item.sku}]
+            :gray-badge[:material/confirmation_number: Quantity: {quotation_item.quantity} {quotation_item.quantity_unit}]
+            :{confidence_color}-badge[{confidence_icon} Confidence: {quotation_item.is_door_product_confidence*100:.0f} %]
+            """)
+        st.markdown(quotation_item.text, unsafe_allow_html=True)
 
 
 @st.dialog("Edit Quotation Item")
@@ -137,13 +575,29 @@ def render_edit_quotation_item(index: int, quotation_item: QuotationItem) -> Non
         key=f"save-{index}",
         icon="💾",
     ):
-        quotation_item.sku = edited_sku
-        quotation_item.name = edited_name
-        quotation_item.commission = edited_commission
-        quotation_item.text = edited_text
-        quotation_item.quantity = edited_quantity
-        quotation_item.quantity_unit = edited_quantity_unit
-        st.session_state["quotation_items"].items[index] = quotation_item
+        edited_item: QuotationItem = quotation_item.model_copy(
+            update={
+                "sku": edited_sku,
+                "name": edited_name,
+                "commission": edited_commission,
+                "text": edited_text,
+                "quantity": edited_quantity,
+                "quantity_unit": edited_quantity_unit,
+            }
+        )
+        st.session_state["item_edits"].save(
+            st.session_state["quotation_items"], index, edited_item
+        )
+        # Similar positions of later analyses get the corrected SKU.
+        sku_catalog: SkuCatalog = get_sku_catalog()
+        sku_catalog.add_quotation_item(edited_item)
+        sku_catalog.save(SKU_CATALOG_PATH)
+        # The same position text in later tenders is decided without the LLM.
+        memo_entry: tuple[str, MemoEntry] | None = get_confirmed_memo_entry(
+            st.session_state["quotation_items"], index, edited_item
+        )
+        if memo_entry is not None:
+            get_classification_memo().set_many([memo_entry], source="confirmed")
         st.session_state["show_quotation_item_update_toast"] = True
         st.rerun()
 
@@ -154,6 +608,26 @@ def main():
         page_icon="👨‍🍳",
         layout="wide",
     )
+    get_metrics_server()
+    job_manager: JobManager = get_job_manager()
+    if "client" not in st.query_params:
+        st.query_params["client"] = uuid.uuid4().hex
+
+    # A reloaded page starts a new session; the job ID in the URL reconnects it
+    # to the analysis it started.
+    if "job_id" not in st.session_state and "job" in st.query_params:
+        job_status: JobStatus | None = job_manager.status(
+            st.query_params["job"]
+        ) or resume_analysis(st.query_params["job"], st.query_params["client"])
+        if job_status is not None and job_status.owner == st.query_params["client"]:
+            st.session_state["job_id"] = job_status.job_id
+            st.session_state["upload"] = UploadHandle.model_validate_json(
+                job_status.metadata["upload"]
+            )
+            st.session_state["customer_id"] = job_status.metadata["customer_id"]
+        else:
+            del st.query_params["job"]
+
     st.markdown(
         "<h1 style='text-align: center'>👨‍🍳 ByteCook</h1>", unsafe_allow_html=True
     )
@@ -167,7 +641,7 @@ def main():
         st.session_state["show_analysis_success_toast"] = False
 
     # PDF upload
-    if not st.session_state.get("pdf", None):
+    if not st.session_state.get("upload", None):
         col0 = st.columns([1, 1, 1])[1]
         with col0:
             customer_id = st.text_input(
@@ -176,9 +650,20 @@ def main():
             )
             st.session_state["customer_id"] = customer_id
 
+            previous_analysis: PreviousAnalysis | None = st.session_state.get(
+                "previous_analysis"
+            )
+            if previous_analysis is not None:
+                st.info(
+                    "Upload the revised version of the document. Only new and"
+                    " changed positions are analyzed again, all other items are"
+                    " carried over with your edits.",
+                    icon="♻️",
+                )
+
             pdf_upload: UploadedFile | None = st.file_uploader(
-                label="Service specification document (PDF):",
-                type=["pdf"],
+                label="Service specification document (PDF or GAEB X83/X84):",
+                type=["pdf", *(suffix.lstrip(".") for suffix in GAEB_SUFFIXES)],
                 accept_multiple_files=False,
             )
 
@@ -189,21 +674,33 @@ def main():
             )
 
             if customer_id and pdf_upload and analyze_button:
-                st.session_state.pdf = pdf_upload
-                upload_path = Path(Path(__file__).parents[1] / "uploads")
-                upload_path.mkdir(parents=True, exist_ok=True)
-                pdf_file_path = Path(upload_path / pdf_upload.name).resolve()
-                pdf_file_path.write_bytes(pdf_upload.getvalue())
-                st.session_state["pdf_uploaded"] = True
-                st.session_state["pdf_file_path"] = pdf_file_path
-
-                analyze_pdf()
+                upload: UploadHandle = get_upload_store().put(
+                    pdf_upload.name, pdf_upload
+                )
 
-                # Closes the dialog
+                try:
+                    job_status = submit_analysis(
+                        st.query_params["client"],
+                        upload,
+                        customer_id,
+                        previous_analysis,
+                    )
+                except JobQueueFullError as error:
+                    st.error(str(error), icon="🚨")
+                    return
+                st.session_state["job_id"] = job_status.job_id
+                st.session_state["upload"] = upload
+                st.query_params["job"] = job_status.job_id
                 st.rerun()
 
         return
 
+    if not st.session_state.get("analyzed", False):
+        col0 = st.columns([1, 2, 1])[1]
+        with col0:
+            render_analysis_job()
+        return
+
     pdf_column, quotation_items_column = st.columns([2, 3])
 
     with pdf_column:
@@ -213,46 +710,92 @@ def main():
                 unsafe_allow_html=True,
             )
             with st.container(border=True):
-                pdf_viewer(
-                    st.session_state.pdf.getvalue(),
-                    height=600,
-                )
+                if st.session_state["upload"].suffix in GAEB_SUFFIXES:
+                    st.info(
+                        f"{st.session_state['upload'].name} is a GAEB file,"
+                        " which has no preview.",
+                        icon="ℹ️",
+                    )
+                else:
+                    try:
+                        # The viewer reads the stored file itself, so the
+                        # session doesn't hold a copy of it.
+                        pdf_viewer(
+                            get_upload_store().path(st.session_state["upload"]),
+                            height=600,
+                        )
+                    except UploadNotFoundError as error:
+                        st.warning(str(error), icon="⚠️")
+            if st.button(
+                label="Analyze another PDF",
+                type="secondary",
+                icon="📄",
+                use_container_width=True,
+            ):
+                reset_analysis()
+                st.rerun()
+            if st.button(
+                label="Analyze revised version",
+                type="secondary",
+                icon="♻️",
+                use_container_width=True,
+                disabled=not st.session_state["quotation_items"].position_fingerprints,
+                help="Re-analyzes only the positions that changed in a new version"
+                " of this document (e.g. an amendment) and keeps all other items"
+                " including your edits.",
+            ):
+                start_revision()
+                st.rerun()
 
     with quotation_items_column:
         with st.container(border=True, height=740):
-            if not st.session_state.get("analyzed", False):
-                st.rerun()
-
             quotation_items: QuotationItems = st.session_state["quotation_items"]
+            item_edits: QuotationItemEdits = st.session_state.setdefault(
+                "item_edits", QuotationItemEdits()
+            )
 
             st.markdown(
                 f"<h3 style='text-align: center'>{len(quotation_items.items)} Quotation Items</h3>",
                 unsafe_allow_html=True,
             )
 
+            revision_diff: RevisionDiff | None = st.session_state.get("revision_diff")
+            if revision_diff is not None:
+                st.info(
+                    f"Compared to the previous version: {revision_diff}.", icon="♻️"
+                )
+                with st.expander("Changed positions"):
+                    for label, ordnungszahlen in [
+                        ("Added", revision_diff.added),
+                        ("Changed", revision_diff.changed),
+                        ("New quantity", revision_diff.requantified),
+                        ("Removed", revision_diff.removed),
+                    ]:
+                        if ordnungszahlen:
+                            st.markdown(f"**{label}:** {', '.join(ordnungszahlen)}")
+
             if not quotation_items.items:
                 st.error("No quotation items found in the PDF.", icon="🚨")
 
-            if st.session_state.get("quotation_items_expansion", None) is None:
-                st.session_state["quotation_items_expansion"] = [
-                    False for _ in enumerate(quotation_items.items)
-                ]
-
-            with st.container(border=False, height=580):
-                render_quotation_items(quotation_items)
+            render_quotation_items(quotation_items, item_edits)
 
             # XML export button
             xml_file_name: str = (
                 datetime.now().strftime("%Y-%d-%m-%H-%M-%S")
                 + "-output-"
-                + Path(st.session_state["pdf_file_path"]).name
+                + st.session_state["upload"].name
                 + ".xml"
             )
             st.download_button(
                 label="Export as XML",
-                data=generate_xml_export(
-                    quotation_items=quotation_items,
-                    customer_id=st.session_state["customer_id"],
+                # Generated when clicked, and only if something changed since
+                # the last download.
+                data=functools.partial(
+                    st.session_state.setdefault(
+                        "xml_export_cache", XmlExportCache()
+                    ).get,
+                    item_edits.apply(quotation_items),
+                    st.session_state["customer_id"],
                 ),
                 file_name=xml_file_name,
                 mime="application/xml",
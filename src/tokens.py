@@ -0,0 +1,123 @@
+import math
+from typing import Callable, TypeVar
+
+from pydantic import BaseModel, Field
+
+T = TypeVar("T")
+
+# Tokens of the JSON structure around each quotation item in a model answer.
+OUTPUT_TOKENS_PER_ITEM: int = 60
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough offline estimate of the number of tokens in `text`.
+    """
+    return math.ceil(len(text) / 4)
+
+
+class TokenBudget(BaseModel):
+    max_input_tokens: int = Field(
+        description="Prompt tokens per request, including the instructions."
+    )
+    max_output_tokens: int = Field(
+        description="Completion tokens per request, including reasoning tokens."
+    )
+    input_cost_per_million: float = Field(
+        default=0.0, description="USD per million prompt tokens."
+    )
+    output_cost_per_million: float = Field(
+        default=0.0, description="USD per million completion tokens."
+    )
+
+    def fits(self, input_tokens: int, output_tokens: int) -> bool:
+        return (
+            input_tokens <= self.max_input_tokens
+            and output_tokens <= self.max_output_tokens
+        )
+
+    def get_cost(self, input_tokens: int, output_tokens: int) -> float:
+        return (
+            input_tokens * self.input_cost_per_million
+            + output_tokens * self.output_cost_per_million
+        ) / 1_000_000
+
+
+# Budgets per request stay well below the context windows, so answers don't
+# get cut off and reasoning models keep room for their reasoning tokens.
+MODEL_TOKEN_BUDGETS: dict[str, TokenBudget] = {
+    "openai/gpt-4o-mini": TokenBudget(
+        max_input_tokens=100_000,
+        max_output_tokens=16_000,
+        input_cost_per_million=0.15,
+        output_cost_per_million=0.60,
+    ),
+    "o4-mini-2025-04-16": TokenBudget(
+        max_input_tokens=24_000,
+        max_output_tokens=16_000,
+        input_cost_per_million=1.10,
+        output_cost_per_million=4.40,
+    ),
+}
+DEFAULT_TOKEN_BUDGET: TokenBudget = TokenBudget(
+    max_input_tokens=24_000, max_output_tokens=8_000
+)
+
+
+def get_token_budget(model: str) -> TokenBudget:
+    return MODEL_TOKEN_BUDGETS.get(model, DEFAULT_TOKEN_BUDGET)
+
+
+class RequestPlan(BaseModel):
+    calls: int = Field(default=0, description="Planned LLM requests.")
+    input_tokens: int = Field(default=0, description="Estimated prompt tokens.")
+    output_tokens: int = Field(default=0, description="Estimated completion tokens.")
+    cost: float = Field(default=0.0, description="Estimated cost in USD.")
+
+    def add_request(
+        self, budget: TokenBudget, input_tokens: int, output_tokens: int
+    ) -> None:
+        self.calls += 1
+        self.input_tokens += input_tokens
+        self.output_tokens += output_tokens
+        self.cost += budget.get_cost(input_tokens, output_tokens)
+
+    def __add__(self, other: "RequestPlan") -> "RequestPlan":
+        return RequestPlan(
+            **{
+                name: getattr(self, name) + getattr(other, name)
+                for name in RequestPlan.model_fields
+            }
+        )
+
+
+def pack_by_tokens(
+    items: list[T],
+    get_input_tokens: Callable[[T], int],
+    get_output_tokens: Callable[[T], int],
+    prefix_tokens: int,
+    budget: TokenBudget,
+) -> list[list[T]]:
+    """
+    Groups consecutive items into requests whose prompt, including the fixed
+    prefix of `prefix_tokens`, and expected answer stay within `budget`. An
+    item exceeding the budget on its own is sent alone.
+    """
+    requests: list[list[T]] = []
+    request: list[T] = []
+    input_tokens: int = prefix_tokens
+    output_tokens: int = 0
+    for item in items:
+        item_input_tokens: int = get_input_tokens(item)
+        item_output_tokens: int = get_output_tokens(item)
+        if request and not budget.fits(
+            input_tokens + item_input_tokens, output_tokens + item_output_tokens
+        ):
+            requests.append(request)
+            request, input_tokens, output_tokens = [], prefix_tokens, 0
+        request.append(item)
+        input_tokens += item_input_tokens
+        output_tokens += item_output_tokens
+    if request:
+        requests.append(request)
+    return requests
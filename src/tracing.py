@@ -0,0 +1,305 @@
+import bisect
+import contextvars
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Iterator, Literal
+
+from pydantic import BaseModel, Field
+
+DURATION_BUCKETS: list[float] = [
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    120.0,
+]
+
+
+class Span(BaseModel):
+    name: str
+    span_id: str = Field(default_factory=lambda: uuid.uuid4().hex[:16])
+    parent_id: str | None = Field(default=None)
+    start: float = Field(default=0.0, description="Seconds since the run started.")
+    duration: float = Field(default=0.0, description="Seconds.")
+    attributes: dict[str, Any] = Field(default_factory=dict)
+    error: str | None = Field(default=None)
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def increment(self, attribute: str, value: int = 1) -> None:
+        self.attributes[attribute] = self.attributes.get(attribute, 0) + value
+
+
+class PipelineEvent(BaseModel):
+    run_id: str
+    kind: Literal["span", "progress"]
+    stage: str = Field(default="", description="The stage reporting progress.")
+    message: str = Field(default="")
+    completed_steps: int = Field(default=0)
+    total_steps: int = Field(default=0)
+    span: Span | None = Field(default=None, description="The span that ended.")
+
+    @property
+    def fraction(self) -> float:
+        return self.completed_steps / self.total_steps if self.total_steps else 0.0
+
+
+class Trace(BaseModel):
+    run_id: str
+    started_at: datetime
+    duration: float
+    spans: list[Span]
+
+
+class MetricsRegistry:
+    """
+    Process-wide counters and histograms rendered in the Prometheus text
+    format, so no client library is needed.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counters: dict[str, dict[tuple, float]] = {}
+        self._histograms: dict[str, dict[tuple, list[float]]] = {}
+        self._help: dict[str, str] = {}
+
+    def increment(
+        self, name: str, value: float = 1.0, help: str = "", **labels: str
+    ) -> None:
+        key: tuple = tuple(sorted(labels.items()))
+        with self._lock:
+            self._help.setdefault(name, help)
+            series: dict[tuple, float] = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, help: str = "", **labels: str) -> None:
+        key: tuple = tuple(sorted(labels.items()))
+        with self._lock:
+            self._help.setdefault(name, help)
+            series: dict[tuple, list[float]] = self._histograms.setdefault(name, {})
+            # Bucket counts, followed by the sum and count of all observations.
+            values: list[float] = series.setdefault(
+                key, [0.0] * (len(DURATION_BUCKETS) + 2)
+            )
+            for i in range(
+                bisect.bisect_left(DURATION_BUCKETS, value), len(DURATION_BUCKETS)
+            ):
+                values[i] += 1
+            values[-2] += value
+            values[-1] += 1
+
+    @staticmethod
+    def _format_labels(labels: tuple) -> str:
+        if not labels:
+            return ""
+        return (
+            "{"
+            + ",".join(
+                f'{name}="{str(value).replace(chr(34), chr(39))}"'
+                for name, value in labels
+            )
+            + "}"
+        )
+
+    def render(self) -> str:
+        lines: list[str] = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines += [f"# HELP {name} {self._help[name]}", f"# TYPE {name} counter"]
+                for labels, value in sorted(series.items()):
+                    lines.append(f"{name}{self._format_labels(labels)} {value:g}")
+            for name, series in sorted(self._histograms.items()):
+                lines += [
+                    f"# HELP {name} {self._help[name]}",
+                    f"# TYPE {name} histogram",
+                ]
+                for labels, values in sorted(series.items()):
+                    for bucket, count in zip(DURATION_BUCKETS, values):
+                        bucket_labels: tuple = labels + (("le", f"{bucket:g}"),)
+                        lines.append(
+                            f"{name}_bucket{self._format_labels(bucket_labels)}"
+                            f" {count:g}"
+                        )
+                    inf_labels: tuple = labels + (("le", "+Inf"),)
+                    lines.append(
+                        f"{name}_bucket{self._format_labels(inf_labels)} {values[-1]:g}"
+                    )
+                    lines.append(
+                        f"{name}_sum{self._format_labels(labels)} {values[-2]:g}"
+                    )
+                    lines.append(
+                        f"{name}_count{self._format_labels(labels)} {values[-1]:g}"
+                    )
+        return "\n".join(lines) + "\n"
+
+
+METRICS: MetricsRegistry = MetricsRegistry()
+
+_current_span: contextvars.ContextVar[Span | None] = contextvars.ContextVar(
+    "current_span", default=None
+)
+
+
+def _record_span_metrics(span: Span) -> None:
+    METRICS.observe(
+        "bytecook_span_duration_seconds",
+        span.duration,
+        help="Duration of pipeline spans.",
+        span=span.name,
+    )
+    if span.error is not None:
+        METRICS.increment(
+            "bytecook_span_errors_total",
+            help="Pipeline spans that raised an error.",
+            span=span.name,
+        )
+    if span.name != "llm_call":
+        return
+
+    model: str = str(span.attributes.get("model", ""))
+    stage: str = str(span.attributes.get("stage", ""))
+    METRICS.increment(
+        "bytecook_llm_requests_total", help="LLM requests.", model=model, stage=stage
+    )
+    METRICS.observe(
+        "bytecook_llm_request_duration_seconds",
+        span.duration,
+        help="Latency of LLM requests including retries.",
+        model=model,
+        stage=stage,
+    )
+    for token_type in ["prompt", "completion"]:
+        METRICS.increment(
+            "bytecook_llm_tokens_total",
+            span.attributes.get(f"{token_type}_tokens", 0),
+            help="Tokens sent to and received from the LLM.",
+            model=model,
+            type=token_type,
+        )
+    METRICS.increment(
+        "bytecook_llm_retries_total",
+        span.attributes.get("retries", 0),
+        help="LLM requests retried after a rate limit.",
+        model=model,
+    )
+
+
+class Tracer:
+    """
+    Records the spans of one pipeline run and hands span and progress events
+    to `on_event`. Spans started within another span, also in tasks created
+    inside it, become its children.
+    """
+
+    def __init__(
+        self,
+        on_event: Callable[[PipelineEvent], None] | None = None,
+        run_id: str | None = None,
+    ) -> None:
+        self.run_id: str = run_id or uuid.uuid4().hex[:12]
+        self.on_event: Callable[[PipelineEvent], None] | None = on_event
+        self.started_at: datetime = datetime.now()
+        self.spans: list[Span] = []
+        self._started: float = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def _emit(self, event: PipelineEvent) -> None:
+        if self.on_event is not None:
+            self.on_event(event)
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Span]:
+        parent: Span | None = _current_span.get()
+        span: Span = Span(
+            name=name,
+            parent_id=parent.span_id if parent is not None else None,
+            start=time.perf_counter() - self._started,
+            attributes=attributes,
+        )
+        token: contextvars.Token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as error:
+            span.error = f"{type(error).__name__}: {error}"
+            raise
+        finally:
+            span.duration = time.perf_counter() - self._started - span.start
+            _current_span.reset(token)
+            with self._lock:
+                self.spans.append(span)
+            _record_span_metrics(span)
+            self._emit(PipelineEvent(run_id=self.run_id, kind="span", span=span))
+
+    def progress(
+        self, stage: str, completed_steps: int, total_steps: int, message: str
+    ) -> None:
+        self._emit(
+            PipelineEvent(
+                run_id=self.run_id,
+                kind="progress",
+                stage=stage,
+                message=message,
+                completed_steps=completed_steps,
+                total_steps=total_steps,
+            )
+        )
+
+    def to_trace(self) -> Trace:
+        with self._lock:
+            spans: list[Span] = sorted(self.spans, key=lambda span: span.start)
+        return Trace(
+            run_id=self.run_id,
+            started_at=self.started_at,
+            duration=time.perf_counter() - self._started,
+            spans=spans,
+        )
+
+    def write_trace(self, trace_dir: Path) -> Path:
+        trace_dir.mkdir(parents=True, exist_ok=True)
+        trace_path: Path = trace_dir / f"{self.run_id}.json"
+        trace_path.write_text(self.to_trace().model_dump_json(indent=2), "utf-8")
+        return trace_path
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body: bytes = METRICS.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """
+    Serves `METRICS` at http://<host>:<port>/metrics from a daemon thread.
+    """
+    server: ThreadingHTTPServer = ThreadingHTTPServer(
+        (host, port), _MetricsRequestHandler
+    )
+    threading.Thread(
+        target=server.serve_forever, name="metrics-server", daemon=True
+    ).start()
+    return server
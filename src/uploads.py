@@ -0,0 +1,116 @@
+import hashlib
+import mmap
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Iterator
+
+from pydantic import BaseModel, Field
+
+
+class UploadHandle(BaseModel):
+    digest: str = Field(description="SHA-256 of the file content.")
+    name: str = Field(description="The original file name.")
+    size: int = Field(description="Bytes.")
+
+    @property
+    def suffix(self) -> str:
+        return Path(self.name).suffix.lower()
+
+
+class UploadNotFoundError(Exception):
+    pass
+
+
+class UploadStore:
+    """
+    Stores uploaded files on disk by content hash, so identical tenders
+    uploaded by several sessions or under different names are kept once.
+
+    Sessions and jobs only hold an `UploadHandle` and read the files from
+    their path or through memory maps. Files are evicted once they weren't
+    accessed for `max_age` seconds or, least recently used first, when the
+    store exceeds `max_bytes`.
+    """
+
+    def __init__(
+        self,
+        upload_dir: Path,
+        max_bytes: int = 1024 * 1024 * 1024,
+        max_age: float = 7 * 24 * 60 * 60,
+    ) -> None:
+        self.upload_dir: Path = Path(upload_dir)
+        self.max_bytes: int = max_bytes
+        self.max_age: float = max_age
+        self._lock = threading.Lock()
+        self.upload_dir.mkdir(parents=True, exist_ok=True)
+
+    def _entry_path(self, digest: str, suffix: str) -> Path:
+        return self.upload_dir / digest[:2] / f"{digest}{suffix}"
+
+    def put(self, name: str, file: BinaryIO) -> UploadHandle:
+        file.seek(0)
+        digest: str = hashlib.file_digest(file, "sha256").hexdigest()
+        size: int = file.seek(0, os.SEEK_END)
+        handle: UploadHandle = UploadHandle(digest=digest, name=name, size=size)
+
+        entry_path: Path = self._entry_path(digest, handle.suffix)
+        if entry_path.exists():
+            # The modification time doubles as the LRU access time.
+            os.utime(entry_path)
+        else:
+            entry_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path: Path = entry_path.with_suffix(f".{threading.get_ident()}.tmp")
+            file.seek(0)
+            with tmp_path.open("wb") as tmp_file:
+                shutil.copyfileobj(file, tmp_file)
+            os.replace(tmp_path, entry_path)
+        self.evict(keep=entry_path)
+        return handle
+
+    def path(self, handle: UploadHandle) -> Path:
+        entry_path: Path = self._entry_path(handle.digest, handle.suffix)
+        try:
+            os.utime(entry_path)
+        except FileNotFoundError:
+            raise UploadNotFoundError(
+                f"{handle.name} was removed from the upload store, please upload"
+                " it again."
+            ) from None
+        return entry_path
+
+    @contextmanager
+    def open(self, handle: UploadHandle) -> Iterator[mmap.mmap]:
+        """
+        Maps the file read-only, so its pages are shared through the OS page
+        cache instead of being copied into every session.
+        """
+        with self.path(handle).open("rb") as file:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                yield mapped
+
+    def evict(self, keep: Path | None = None) -> None:
+        with self._lock:
+            entries: list[tuple[float, int, Path]] = []
+            for entry_path in self.upload_dir.glob("*/*"):
+                if entry_path.suffix == ".tmp" or entry_path == keep:
+                    continue
+                try:
+                    stat = entry_path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry_path))
+
+            expired_before: float = time.time() - self.max_age
+            total_bytes: int = sum(size for _, size, _ in entries)
+            if keep is not None and keep.exists():
+                total_bytes += keep.stat().st_size
+            for accessed, size, entry_path in sorted(entries):
+                if total_bytes <= self.max_bytes and accessed >= expired_before:
+                    break
+                # Open memory maps stay valid after the file is unlinked.
+                entry_path.unlink(missing_ok=True)
+                total_bytes -= size
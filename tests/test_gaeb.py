@@ -0,0 +1,43 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parents[1] / "src"))
+
+from gaeb import GaebChapter, GaebDocument, iter_gaeb, read_gaeb  # noqa: E402
+from models import LvPosition  # noqa: E402
+
+GAEB_PATH: Path = Path(__file__).parent / "fixtures" / "lv.x84"
+
+POSITIONS: list[LvPosition] = [
+    # The long text repeats the short text, which is kept only once.
+    LvPosition(
+        ordnungszahl="1.2.10",
+        beschreibung="\n".join(
+            ["Innentür Holz, einflügelig", "Lichtes Rohbaumaß", "0,885 x 2,135 m"]
+        ),
+        quantity=2.0,
+        quantity_unit="Stk",
+    ),
+    LvPosition(
+        ordnungszahl="1.2.20",
+        beschreibung="Zargendichtung\nDichtung umlaufend,\nFarbe grau",
+        quantity=12.5,
+        quantity_unit="m",
+    ),
+    # Unit price positions have neither a quantity nor a unit.
+    LvPosition(ordnungszahl="1.2.30", beschreibung="Türstopper, Nur Einh.-Pr."),
+]
+
+
+def test_iter_gaeb_reads_chapters_and_positions() -> None:
+    assert list(iter_gaeb(GAEB_PATH)) == [
+        GaebChapter(ordnungszahl="1", title="Innentüren"),
+        GaebChapter(ordnungszahl="1.2", title="Holztüren"),
+        *POSITIONS,
+    ]
+
+
+def test_read_gaeb_splits_positions_into_chunks() -> None:
+    document: GaebDocument = read_gaeb(GAEB_PATH, max_chunk_chars=80)
+    assert document.chapter_titles == {"1": "innentüren", "1.2": "holztüren"}
+    assert document.chunks == [POSITIONS[:1], POSITIONS[1:]]
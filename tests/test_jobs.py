@@ -0,0 +1,70 @@
+import sys
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parents[1] / "src"))
+
+from jobs import JobContext, JobManager, JobState, JobStatus  # noqa: E402
+from models import QuotationItem, QuotationItems  # noqa: E402
+
+
+def test_coalesced_job_finishes_after_first_submitter_cancels() -> None:
+    started: threading.Event = threading.Event()
+    release: threading.Event = threading.Event()
+    finished: dict[str, JobStatus] = {}
+    all_finished: threading.Event = threading.Event()
+    calls: list[str] = []
+
+    def analyze(name: str, context: JobContext) -> QuotationItems:
+        calls.append(name)
+        started.set()
+        release.wait(5)
+        return QuotationItems(
+            items=[
+                QuotationItem(
+                    sku="620001",
+                    name="Holztür",
+                    text="Innentür",
+                    quantity=1,
+                    quantity_unit="Stk",
+                    commission="LV-POS. 1.1.10",
+                    is_door_product_confidence=0.9,
+                )
+            ]
+        )
+
+    def on_finish(status: JobStatus) -> None:
+        finished[status.job_id] = status
+        if len(finished) == 2:
+            all_finished.set()
+
+    manager: JobManager = JobManager(max_workers=1)
+    first: JobStatus = manager.submit(
+        "a",
+        lambda context: analyze("first", context),
+        coalesce_key="tender",
+        job_id="first",
+        on_finish=on_finish,
+    )
+    started.wait(5)
+    second: JobStatus = manager.submit(
+        "b",
+        lambda context: analyze("second", context),
+        coalesce_key="tender",
+        job_id="second",
+        on_finish=on_finish,
+    )
+    assert manager.coalesced_jobs == 1
+
+    assert manager.cancel(first.job_id)
+    assert finished["first"].state == JobState.CANCELLED
+    assert manager.status(second.job_id).state == JobState.RUNNING
+
+    release.set()
+    assert all_finished.wait(5)
+    assert calls == ["first"]
+    assert finished["second"].state == JobState.DONE
+    assert manager.status(first.job_id).state == JobState.CANCELLED
+    result: QuotationItems | None = manager.result(second.job_id)
+    assert result is not None and result.items[0].sku == "620001"
+    assert manager.result(first.job_id) is None
@@ -0,0 +1,171 @@
+import json
+import sys
+from pathlib import Path
+from typing import Any
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import Field
+
+sys.path.insert(0, str(Path(__file__).parents[1] / "src"))
+
+from llm import set_chat_model_factory  # noqa: E402
+from lv_parser import MIN_PARSER_CONFIDENCE, LvParseResult  # noqa: E402
+from lv_parser import parse_lv_lines, parse_lv_text  # noqa: E402
+from lv_parser import words_to_quantity_lines  # noqa: E402
+from models import LvLine, LvPosition  # noqa: E402
+from pipelines import PipelineV2  # noqa: E402
+
+LV_TEXT: str = """Druckdatum: 12.05.2025
+Ordnungszahl Leistungsbeschreibung Menge ME Einheitspreis Gesamtbetrag
+1. Innentüren
+1.1. Holztüren
+1.1.10 Innentür nach Wahl des AG
+Einbauort: EG
+2,000 Stk ......................... .........................
+1.1.20 Türstopper Boden 1.250,5 m ......................... Nur Einh.-Pr.
+Seite: 1 von 2
+
+1.1.30 Innentür Sonderbau
+Einbauort: OG
+Summe 1.1. Holztüren
+"""
+
+
+class RecordingChatModel(BaseChatModel):
+    extraction_output: str = Field(default="[]")
+    prompts: list[str] = Field(default_factory=list)
+
+    @property
+    def _llm_type(self) -> str:
+        return "recording"
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        prompt: str = "\n".join(str(message.content) for message in messages)
+        self.prompts.append(prompt)
+        output: str = (
+            self.extraction_output
+            if "Extraktion von Daten" in prompt
+            else json.dumps({"items": []})
+        )
+        return ChatResult(
+            generations=[ChatGeneration(message=AIMessage(content=output))]
+        )
+
+
+def test_parse_lv_text_reads_quantity_lines() -> None:
+    parse_result: LvParseResult = parse_lv_text(LV_TEXT)
+    assert parse_result.positions == [
+        LvPosition(
+            ordnungszahl="1.1.10",
+            beschreibung="Innentür nach Wahl des AG\nEinbauort: EG",
+            quantity=2.0,
+            quantity_unit="Stk",
+        ),
+        # The quantity line may end the description on the same line.
+        LvPosition(
+            ordnungszahl="1.1.20",
+            beschreibung="Türstopper Boden",
+            quantity=1250.5,
+            quantity_unit="m",
+        ),
+        # Ended by the sum line without a quantity; the ignored page number,
+        # the blank line and the print date don't become description lines.
+        LvPosition(
+            ordnungszahl="1.1.30",
+            beschreibung="Innentür Sonderbau\nEinbauort: OG",
+        ),
+    ]
+    assert parse_result.confidence == 2 / 3
+
+
+def test_parse_lv_lines_skips_ignored_lines() -> None:
+    parse_result: LvParseResult = parse_lv_lines(
+        [
+            LvLine(text="1.1.10 Innentür"),
+            LvLine(text="Seite: 3 von 40"),
+            LvLine(text="Druckdatum: 12.05.2025"),
+            LvLine(text="Ordnungszahl Leistungsbeschreibung Menge ME"),
+            LvLine(text="Stahlzarge", quantity=4, quantity_unit="Stk"),
+        ]
+    )
+    assert parse_result.positions == [
+        LvPosition(
+            ordnungszahl="1.1.10",
+            beschreibung="Innentür\nStahlzarge",
+            quantity=4,
+            quantity_unit="Stk",
+        )
+    ]
+    assert parse_result.confidence == 1.0
+
+
+def _word(text: str, x0: float, top: float) -> dict:
+    return {"text": text, "x0": x0, "top": top}
+
+
+def test_quantity_columns_are_read_from_word_positions() -> None:
+    words: list[dict] = [
+        _word("1.1.10", 50, 100),
+        _word("Innentür", 90, 100),
+        _word("Einbauort", 90, 114),
+        _word("EG", 140, 114),
+        # Quantity and unit in their columns, without the dotted price columns
+        # the text pattern needs.
+        _word("12", 400, 115),
+        _word("Stk", 430, 114.5),
+        # A dimension in the description column isn't a quantity.
+        _word("Breite", 90, 128),
+        _word("1,01", 130, 128),
+        _word("m", 155, 128),
+    ]
+    quantity_lines: dict[str, LvLine] = words_to_quantity_lines(words, 595)
+    assert quantity_lines == {
+        "Einbauort EG 12 Stk": LvLine(
+            text="Einbauort EG", quantity=12, quantity_unit="Stk"
+        )
+    }
+
+    text: str = "1.1.10 Innentür\nEinbauort EG 12 Stk\nBreite 1,01 m\n"
+    assert parse_lv_text(text).confidence == 0.0
+    parse_result: LvParseResult = parse_lv_text(text, quantity_lines)
+    assert parse_result.positions == [
+        LvPosition(
+            ordnungszahl="1.1.10",
+            beschreibung="Innentür\nEinbauort EG",
+            quantity=12,
+            quantity_unit="Stk",
+        )
+    ]
+    assert parse_result.confidence == 1.0
+
+
+def test_low_confidence_falls_back_to_llm_extraction() -> None:
+    assert parse_lv_text(LV_TEXT).confidence < MIN_PARSER_CONFIDENCE
+    model: RecordingChatModel = RecordingChatModel(
+        extraction_output=json.dumps(
+            [{"ordnungszahl": "1.1.10", "beschreibung": "Innentür nach Wahl des AG"}]
+        )
+    )
+    set_chat_model_factory(lambda openrouter_api_key, model_name: model)
+    try:
+        PipelineV2.extract_quotation_items_from_pdf(LV_TEXT, "offline")
+        assert sum("Extraktion von Daten" in prompt for prompt in model.prompts) == 1
+
+        # A confident parse is used as the extraction output directly.
+        model.prompts.clear()
+        confident_text: str = LV_TEXT.replace(
+            "Einbauort: OG", "Einbauort: OG\n1,000 Stk ......................."
+        )
+        assert parse_lv_text(confident_text).confidence >= MIN_PARSER_CONFIDENCE
+        PipelineV2.extract_quotation_items_from_pdf(confident_text, "offline")
+        assert not any("Extraktion von Daten" in prompt for prompt in model.prompts)
+    finally:
+        set_chat_model_factory(None)
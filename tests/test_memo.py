@@ -0,0 +1,106 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parents[1] / "src"))
+
+from memo import ClassificationMemo, MemoEntry, get_confirmed_memo_entry  # noqa: E402
+from memo import normalize_position_text  # noqa: E402
+from models import LvPosition, QuotationItem, QuotationItems  # noqa: E402
+from models import get_fake_quotation_items  # noqa: E402
+from prefilter import PrefilterResult, prefilter_positions  # noqa: E402
+
+DOOR_TEXT: str = (
+    "1.1.10 Innentür Holz, einflügelig<br/>"
+    "Lichtes Rohbaumaß {size}<br/>"
+    "{quantity} Stk ......................... ........................."
+)
+
+
+def test_normalize_position_text_keeps_dimensions() -> None:
+    assert normalize_position_text(
+        DOOR_TEXT.format(size="0,885 x 2,135 m", quantity="2,000")
+    ) != normalize_position_text(
+        DOOR_TEXT.format(size="1,010 x 2,135 m", quantity="2,000")
+    )
+
+
+def test_normalize_position_text_drops_quantity_line() -> None:
+    assert normalize_position_text(
+        DOOR_TEXT.format(size="0,885 x 2,135 m", quantity="2,000")
+    ) == normalize_position_text(
+        DOOR_TEXT.format(size="0,885 x 2,135 m", quantity="14,000").replace(
+            "1.1.10", "3.2.40"
+        )
+    )
+
+
+def test_door_sizes_do_not_share_memo_entry(tmp_path: Path) -> None:
+    memo = ClassificationMemo(tmp_path / "memo.sqlite3", "v1")
+    memo.set_many(
+        [
+            (
+                DOOR_TEXT.format(size="0,885 x 2,135 m", quantity="2,000"),
+                MemoEntry(is_door_related=True, sku="TD-885", name="Tür 885"),
+            )
+        ]
+    )
+    entries: list[MemoEntry | None] = memo.get_many(
+        [
+            DOOR_TEXT.format(size="0,885 x 2,135 m", quantity="1,000"),
+            DOOR_TEXT.format(size="1,010 x 2,135 m", quantity="2,000"),
+        ]
+    )
+    memo.close()
+    assert entries[0] is not None and entries[0].sku == "TD-885"
+    assert entries[1] is None
+
+
+def test_confirmed_entry_is_found_by_position_text(tmp_path: Path) -> None:
+    position: LvPosition = LvPosition(
+        ordnungszahl="1.1.10",
+        beschreibung=DOOR_TEXT.format(size="0,885 x 2,135 m", quantity="2,000"),
+        quantity=2,
+        quantity_unit="Stk",
+    )
+    # The model rewrites the text of its items.
+    quotation_items: QuotationItems = QuotationItems(
+        items=[
+            QuotationItem(
+                sku=None,
+                name="Innentür",
+                text="Innentür Holz, einflügelig, 0,885 x 2,135 m",
+                quantity=2,
+                quantity_unit="Stk",
+                commission="LV-POS. 1.1.10",
+                is_door_product_confidence=0.5,
+            )
+        ]
+    )
+    quotation_items.position_texts[position.ordnungszahl] = position.beschreibung
+    edited_item: QuotationItem = quotation_items.items[0].model_copy(
+        update={"sku": "620001", "name": "Holztür 885"}
+    )
+    memo = ClassificationMemo(tmp_path / "memo.sqlite3", "v1")
+    memo_entry: tuple[str, MemoEntry] | None = get_confirmed_memo_entry(
+        quotation_items, 0, edited_item
+    )
+    assert memo_entry is not None
+    memo.set_many([memo_entry], source="confirmed")
+
+    result: PrefilterResult = prefilter_positions(
+        [position.model_copy(update={"ordnungszahl": "3.2.40"})],
+        {"3": "innentüren"},
+        memo=memo,
+    )
+    memo.close()
+    assert result.report.memo_positions == 1
+    assert [(item.sku, item.name) for item in result.preassigned_items] == [
+        ("620001", "Holztür 885")
+    ]
+
+
+def test_confirmed_entry_needs_parsed_positions() -> None:
+    quotation_items: QuotationItems = get_fake_quotation_items()
+    assert (
+        get_confirmed_memo_entry(quotation_items, 0, quotation_items.items[0]) is None
+    )
@@ -0,0 +1,49 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parents[1] / "src"))
+
+from models import LvPosition  # noqa: E402
+from prefilter import PrefilterResult, get_chapter_titles  # noqa: E402
+from prefilter import prefilter_positions  # noqa: E402
+
+LV_TEXT: str = "1. Ausbau\n1.3. Beschläge\n"
+
+
+def test_door_hardware_without_door_keyword_is_not_dropped() -> None:
+    positions: list[LvPosition] = [
+        LvPosition(
+            ordnungszahl="1.3.10",
+            beschreibung="Drückergarnitur Edelstahl, Rosette",
+            quantity=12,
+            quantity_unit="Stk",
+        ),
+        LvPosition(
+            ordnungszahl="1.3.20",
+            beschreibung="Profilzylinder 30/35, gleichschließend",
+            quantity=12,
+            quantity_unit="Stk",
+        ),
+        LvPosition(
+            ordnungszahl="1.3.30",
+            beschreibung="Scharnier 3D verstellbar",
+            quantity=24,
+            quantity_unit="Stk",
+        ),
+    ]
+    result: PrefilterResult = prefilter_positions(
+        positions, get_chapter_titles(LV_TEXT)
+    )
+    assert result.report.dropped_positions == 0
+    assert result.llm_positions == positions
+
+
+def test_position_without_door_reference_is_dropped() -> None:
+    positions: list[LvPosition] = [
+        LvPosition(ordnungszahl="1.3.40", beschreibung="Fensterbank Aluminium")
+    ]
+    result: PrefilterResult = prefilter_positions(
+        positions, get_chapter_titles(LV_TEXT)
+    )
+    assert result.report.dropped_positions == 1
+    assert result.llm_positions == []
@@ -0,0 +1,99 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parents[1] / "src"))
+
+from models import LvPosition, QuotationItem  # noqa: E402
+from prefilter import PrefilterResult, prefilter_positions  # noqa: E402
+from references import ReferenceResolution, get_referenced_ordnungszahl  # noqa: E402
+from references import inherit_quotation_items, resolve_references  # noqa: E402
+
+BASE: LvPosition = LvPosition(
+    ordnungszahl="1.1.10",
+    beschreibung="Innentür Holz, Holzzarge\nb = 0,885 m",
+    quantity=4,
+    quantity_unit="Stk",
+)
+DELTA: LvPosition = LvPosition(
+    ordnungszahl="1.1.20",
+    beschreibung="Wie Pos. 1.1.10, jedoch b = 1,01 m",
+    quantity=2,
+    quantity_unit="Stk",
+)
+BASE_ITEM: QuotationItem = QuotationItem(
+    sku="620001",
+    name="Holztür",
+    text="Innentür Holz, Holzzarge<br/>b = 0,885 m",
+    quantity=4,
+    quantity_unit="Stk",
+    commission="LV-POS. 1.1.10",
+    is_door_product_confidence=0.9,
+)
+
+
+def test_get_referenced_ordnungszahl() -> None:
+    assert get_referenced_ordnungszahl(DELTA.beschreibung) == (
+        "1.1.10",
+        "b = 1,01 m",
+    )
+    assert get_referenced_ordnungszahl("wie Position 2.3.40. aber in Eiche") == (
+        "2.3.40",
+        "in Eiche",
+    )
+    assert get_referenced_ordnungszahl(BASE.beschreibung) is None
+
+
+def test_delta_inherits_base_in_same_chunk() -> None:
+    chained_delta: LvPosition = LvPosition(
+        ordnungszahl="1.1.30", beschreibung="Wie Pos. 1.1.20, jedoch h = 2,26 m"
+    )
+    positions: list[LvPosition] = [BASE, DELTA, chained_delta]
+    resolution: ReferenceResolution = resolve_references(positions)
+    # Chains resolve to their first position.
+    assert resolution.base_ordnungszahlen == {"1.1.20": "1.1.10", "1.1.30": "1.1.10"}
+    assert resolution.reviewed_positions == 0
+
+    inherited_items: list[QuotationItem] = inherit_quotation_items(
+        resolution, positions, [BASE_ITEM]
+    )
+    assert inherited_items == [
+        BASE_ITEM.model_copy(
+            update={
+                "name": "Wie Pos. 1.1.10, jedoch b = 1,01 m",
+                "text": "Wie Pos. 1.1.10, jedoch b = 1,01 m",
+                "quantity": 2,
+                "commission": "LV-POS. 1.1.20",
+            }
+        ),
+        BASE_ITEM.model_copy(
+            update={
+                "name": "Wie Pos. 1.1.20, jedoch h = 2,26 m",
+                "text": "Wie Pos. 1.1.20, jedoch h = 2,26 m",
+                "commission": "LV-POS. 1.1.30",
+            }
+        ),
+    ]
+
+
+def test_delta_of_base_in_other_chunk_is_not_inherited() -> None:
+    # Each chunk is resolved on its own, and the base is in an earlier chunk.
+    resolution: ReferenceResolution = resolve_references([DELTA])
+    assert resolution.base_ordnungszahlen == {}
+    assert inherit_quotation_items(resolution, [DELTA], [BASE_ITEM]) == []
+
+    result: PrefilterResult = prefilter_positions([DELTA], {"1.1": "innentüren"})
+    assert result.report.inherited_positions == 0
+    assert result.llm_positions == [DELTA]
+
+
+def test_delta_changing_material_is_reviewed() -> None:
+    steel_delta: LvPosition = LvPosition(
+        ordnungszahl="1.1.20",
+        beschreibung="Wie Pos. 1.1.10, jedoch als Stahltür mit Stahlzarge",
+        quantity=1,
+        quantity_unit="Stk",
+    )
+    resolution: ReferenceResolution = resolve_references([BASE, steel_delta])
+    assert resolution.base_ordnungszahlen == {}
+    assert resolution.reviewed_positions == 1
+    assert inherit_quotation_items(resolution, [BASE, steel_delta], [BASE_ITEM]) == []
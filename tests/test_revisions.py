@@ -0,0 +1,158 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parents[1] / "src"))
+
+from item_view import QuotationItemEdits  # noqa: E402
+from models import LvPosition, PositionFingerprint  # noqa: E402
+from models import QuotationItem, QuotationItems  # noqa: E402
+from revisions import PreviousAnalysis, RevisionDiff, carry_over_items  # noqa: E402
+from revisions import diff_positions, get_position_fingerprint  # noqa: E402
+
+PREVIOUS_POSITIONS: list[LvPosition] = [
+    LvPosition(
+        ordnungszahl="1.1.10",
+        beschreibung="Innentür Holz\nRohbaumaß 0,885 x 2,135 m",
+        quantity=4,
+        quantity_unit="Stk",
+    ),
+    LvPosition(
+        ordnungszahl="1.1.20",
+        beschreibung="Stahlzarge für Innentür",
+        quantity=4,
+        quantity_unit="Stk",
+    ),
+    LvPosition(
+        ordnungszahl="1.1.30",
+        beschreibung="Türschließer mit Gleitschiene",
+        quantity=2,
+        quantity_unit="Stk",
+    ),
+    LvPosition(
+        ordnungszahl="1.1.40",
+        beschreibung="Türstopper Boden",
+        quantity=6,
+        quantity_unit="Stk",
+    ),
+]
+CURRENT_POSITIONS: list[LvPosition] = [
+    # Only reflowed.
+    LvPosition(
+        ordnungszahl="1.1.10",
+        beschreibung="Innentür Holz Rohbaumaß\n0,885 x 2,135 m",
+        quantity=4,
+        quantity_unit="Stk",
+    ),
+    LvPosition(
+        ordnungszahl="1.1.20",
+        beschreibung="Stahlzarge für Innentür",
+        quantity=6,
+        quantity_unit="Stk",
+    ),
+    LvPosition(
+        ordnungszahl="1.1.30",
+        beschreibung="Türschließer mit Gleitschiene und Feststellung",
+        quantity=2,
+        quantity_unit="Stk",
+    ),
+    LvPosition(
+        ordnungszahl="1.1.50",
+        beschreibung="Türdichtung umlaufend",
+        quantity=4,
+        quantity_unit="Stk",
+    ),
+]
+
+
+def _to_quotation_item(position: LvPosition, sku: str) -> QuotationItem:
+    return QuotationItem(
+        sku=sku,
+        name=position.beschreibung.split("\n", 1)[0],
+        text=position.beschreibung.replace("\n", "<br/>"),
+        quantity=round(position.quantity),
+        quantity_unit=position.quantity_unit,
+        commission=f"LV-POS. {position.ordnungszahl}",
+        is_door_product_confidence=0.9,
+    )
+
+
+def _get_fingerprints(positions: list[LvPosition]) -> dict[str, PositionFingerprint]:
+    return {
+        position.ordnungszahl: get_position_fingerprint(position)
+        for position in positions
+    }
+
+
+def _get_previous_analysis() -> PreviousAnalysis:
+    quotation_items: QuotationItems = QuotationItems(
+        items=[
+            _to_quotation_item(position, sku)
+            for position, sku in zip(
+                PREVIOUS_POSITIONS, ["620001", "670001", "290001", "240001"]
+            )
+        ]
+    )
+    item_edits: QuotationItemEdits = QuotationItemEdits()
+    for index, name in [(0, "Holztür 885 (geprüft)"), (1, "Stahlzarge (geprüft)")]:
+        item_edits.save(
+            quotation_items,
+            index,
+            quotation_items.items[index].model_copy(update={"name": name}),
+        )
+    return PreviousAnalysis(
+        position_fingerprints=_get_fingerprints(PREVIOUS_POSITIONS),
+        quotation_items=item_edits.apply(quotation_items).items,
+    )
+
+
+def test_diff_positions() -> None:
+    diff: RevisionDiff = diff_positions(
+        _get_fingerprints(PREVIOUS_POSITIONS), _get_fingerprints(CURRENT_POSITIONS)
+    )
+    assert diff == RevisionDiff(
+        added=["1.1.50"],
+        changed=["1.1.30"],
+        requantified=["1.1.20"],
+        removed=["1.1.40"],
+        unchanged=1,
+    )
+    assert str(diff) == (
+        "1 added, 1 changed, 1 with new quantities, 1 removed and 1 unchanged"
+        " positions"
+    )
+
+
+def test_carry_over_items_keeps_edits_of_unchanged_positions() -> None:
+    carried_items, changed_positions = carry_over_items(
+        _get_previous_analysis(), CURRENT_POSITIONS
+    )
+    assert [(item.commission, item.name, item.quantity) for item in carried_items] == [
+        ("LV-POS. 1.1.10", "Holztür 885 (geprüft)", 4),
+        # The revision's quantity is taken over, the edit is kept.
+        ("LV-POS. 1.1.20", "Stahlzarge (geprüft)", 6),
+    ]
+    # The changed and the added position are categorized again, the removed
+    # position's item is dropped.
+    assert changed_positions == [CURRENT_POSITIONS[2], CURRENT_POSITIONS[3]]
+
+
+def test_item_edits_mark_items_changed() -> None:
+    quotation_items: QuotationItems = QuotationItems(
+        items=[_to_quotation_item(PREVIOUS_POSITIONS[0], "620001")]
+    )
+    item_edits: QuotationItemEdits = QuotationItemEdits()
+    edited_item: QuotationItem = quotation_items.items[0].model_copy(
+        update={"sku": "670001"}
+    )
+    item_edits.save(quotation_items, 0, edited_item)
+    assert quotation_items.revision == 1
+    # Saving the same edit again isn't a change.
+    item_edits.save(quotation_items, 0, edited_item)
+    assert quotation_items.revision == 1
+    edited_items: QuotationItems = item_edits.apply(quotation_items)
+    assert edited_items.items == [edited_item]
+    assert edited_items.revision == quotation_items.revision
+    assert item_edits.apply(quotation_items) is edited_items
+    item_edits.save(quotation_items, 0, quotation_items.items[0])
+    assert quotation_items.revision == 2
+    assert item_edits.apply(quotation_items) is quotation_items
@@ -0,0 +1,103 @@
+import json
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parents[1] / "src"))
+
+from models import QuotationItem  # noqa: E402
+from streaming import IncrementalQuotationItemParser  # noqa: E402
+
+ITEMS: list[QuotationItem] = [
+    QuotationItem(
+        sku="620001",
+        name='Holztür "Optima" {Typ A}',
+        text="Innentür 875 x 2.125 mm<br/>Zarge: [Stahl-U]",
+        quantity=2,
+        quantity_unit="Stk",
+        commission="LV-POS. 1.1.10",
+        is_door_product_confidence=0.9,
+    ),
+    QuotationItem(
+        sku=None,
+        name="Türschließer\\Gleitschiene",
+        text='Obentürschließer "OTS" mit } und { im Text',
+        quantity=4,
+        quantity_unit="Stk",
+        commission="LV-POS. 1.1.20",
+        is_door_product_confidence=0.6,
+    ),
+    QuotationItem(
+        sku="360001",
+        name="Schloss – Einsteckschloss",
+        text="Profilzylinder 30/35, gleichschließend ÄÖÜ",
+        quantity=12,
+        quantity_unit="Stk",
+        commission="LV-POS. 1.3.20",
+        is_door_product_confidence=0.95,
+    ),
+]
+
+
+def _answer(ensure_ascii: bool) -> str:
+    # Nested objects and arrays before and after the items must be skipped.
+    return json.dumps(
+        {
+            "meta": {"notes": ["}", "{", "]"]},
+            "items": [item.model_dump() for item in ITEMS],
+            "summary": {"count": len(ITEMS)},
+        },
+        ensure_ascii=ensure_ascii,
+    )
+
+
+def _feed(chunks: list[str]) -> list[QuotationItem]:
+    parser: IncrementalQuotationItemParser = IncrementalQuotationItemParser()
+    emitted: list[QuotationItem] = []
+    for chunk in chunks:
+        emitted.extend(parser.feed(chunk))
+    return emitted
+
+
+def test_emits_complete_items_at_any_split() -> None:
+    for ensure_ascii in [False, True]:
+        answer: str = _answer(ensure_ascii)
+        for split in range(len(answer) + 1):
+            assert _feed([answer[:split], answer[split:]]) == ITEMS
+
+
+def test_emits_items_once_in_order_for_single_characters() -> None:
+    # `\u` escapes and escaped quotes and backslashes arrive piece by piece.
+    answer: str = _answer(ensure_ascii=True)
+    assert "\\u00c4" in answer and '\\"' in answer and "\\\\" in answer
+    assert _feed(list(answer)) == ITEMS
+
+
+def test_emits_items_as_soon_as_they_are_complete() -> None:
+    answer: str = _answer(ensure_ascii=False)
+    parser: IncrementalQuotationItemParser = IncrementalQuotationItemParser()
+    first_item_end: int = answer.index("}", answer.index('"LV-POS. 1.1.10"')) + 1
+    assert parser.feed(answer[: first_item_end - 1]) == []
+    assert parser.feed(answer[first_item_end - 1 : first_item_end]) == ITEMS[:1]
+    assert parser.feed(answer[first_item_end:]) == ITEMS[1:]
+
+
+def test_emits_items_for_random_chunks() -> None:
+    answer: str = _answer(ensure_ascii=True)
+    generator: random.Random = random.Random(7)
+    for _ in range(200):
+        splits: list[int] = sorted(
+            generator.sample(range(1, len(answer)), generator.randint(1, 40))
+        )
+        chunks: list[str] = [
+            answer[start:end]
+            for start, end in zip([0, *splits], [*splits, len(answer)])
+        ]
+        assert _feed(chunks) == ITEMS
+
+
+def test_skips_invalid_items() -> None:
+    answer: str = json.dumps(
+        {"items": [{"sku": "1"}, ITEMS[0].model_dump()]}, ensure_ascii=False
+    )
+    assert _feed(list(answer)) == ITEMS[:1]